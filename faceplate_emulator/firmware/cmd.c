@@ -9,6 +9,7 @@
 #include "leds.h"
 #include "main.h"
 #include "faceplate.h"
+#include "hitkeys.h"
 #include "radio_spi.h"
 #include "radio_state.h"
 #include "uart.h"
@@ -227,6 +228,47 @@ static void _do_emulated_upd_load_key_data(void)
     _send_empty_reply(CMD_ERROR_OK);
 }
 
+/* Command: Read uPD16432B Emulator Display Changes
+ * Arguments: none
+ * Returns: <error> <dirty flags> [<display ram bytes>]
+ *
+ * Returns the RAM areas of the uPD16432B emulator that have changed since
+ * this command was last sent (UPD_DIRTY_* flags) and clears them.  If the
+ * display RAM has changed, its contents follow the flags.  This lets the
+ * client watch the display without dumping the whole state.
+ */
+static void _do_emulated_upd_read_display_changes(void)
+{
+    if (cmd_buf_index != 1)
+    {
+        _send_empty_reply(CMD_ERROR_BAD_ARGS_LENGTH);
+        return;
+    }
+
+    uint8_t dirty_flags = emulated_upd_state.host_dirty_flags;
+    emulated_upd_state.host_dirty_flags = UPD_DIRTY_NONE;
+
+    uint8_t size = 1 + // error byte
+                   1;  // dirty flags
+    if (dirty_flags & UPD_DIRTY_DISPLAY)
+    {
+        size += UPD_DISPLAY_RAM_SIZE;
+    }
+
+    uart_put(size); // number of bytes to follow
+    uart_put(CMD_ERROR_OK);
+    uart_put(dirty_flags);
+
+    if (dirty_flags & UPD_DIRTY_DISPLAY)
+    {
+        uint8_t i;
+        for (i=0; i<UPD_DISPLAY_RAM_SIZE; i++)
+        {
+            uart_put(emulated_upd_state.display_ram[i]);
+        }
+    }
+}
+
 /* Command: Radio State Reset
  * Arguments: none
  * Returns: <error>
@@ -777,6 +819,78 @@ static void _do_load_keys(void)
     _send_empty_reply(CMD_ERROR_OK);
 }
 
+/* Command: Hit keys on the emulated faceplate with timing kept by the AVR
+ * Arguments: <press ms lo> <press ms hi> <release ms lo> <release ms hi>
+ *            <repeat> <keycode0> <keycode1> ... <keycodeN>
+ * Returns: <error> <busy>
+ *
+ * Hit each key code (KEY_ constants) <repeat> times, in order.  Each hit
+ * holds the key for <press ms> and then releases all keys for <release ms>.
+ * Up to HITKEYS_MAX_KEYS key codes may be sent.  The reply is sent as soon
+ * as the hits have been scheduled; the keys are hit by the main loop.
+ *
+ * <busy> is 1 while hits are still in progress.  Sending no key codes
+ * starts nothing and only returns <busy>, so the host can poll it to find
+ * out when the hits are done.  If key codes are sent while hits are still
+ * in progress, CMD_ERROR_BUSY is returned and nothing is changed.
+ */
+static void _do_hit_keys(void)
+{
+    // command byte + 2 press bytes + 2 release bytes + repeat byte + keys
+    if ((cmd_buf_index < 6) || (cmd_buf_index > 6 + HITKEYS_MAX_KEYS))
+    {
+        _send_empty_reply(CMD_ERROR_BAD_ARGS_LENGTH);
+        return;
+    }
+
+    // can't hit keys while key passthru is enabled because the
+    // key data would be immediately overwritten by passthru
+    if (auto_key_passthru)
+    {
+        _send_empty_reply(CMD_ERROR_BLOCKED_BY_PASSTHRU);
+        return;
+    }
+
+    uint8_t num_keys = cmd_buf_index - 6;
+    if (num_keys != 0)
+    {
+        if (hitkeys_busy)
+        {
+            _send_empty_reply(CMD_ERROR_BUSY);
+            return;
+        }
+
+        uint16_t press_ms = cmd_buf[1] + (cmd_buf[2] << 8);
+        uint16_t release_ms = cmd_buf[3] + (cmd_buf[4] << 8);
+        uint8_t repeat = cmd_buf[5];
+        if (repeat == 0)
+        {
+            _send_empty_reply(CMD_ERROR_BAD_ARGS_VALUE);
+            return;
+        }
+
+        // convert each key code to four uPD16432B key data bytes
+        uint8_t key_data[HITKEYS_MAX_KEYS][4];
+        uint8_t i;
+        for (i=0; i<num_keys; i++)
+        {
+            uint8_t success = convert_code_to_upd_key_data(
+                cmd_buf[6+i], key_data[i]);
+            if (! success) // bad key code
+            {
+                _send_empty_reply(CMD_ERROR_BAD_ARGS_VALUE);
+                return;
+            }
+        }
+
+        hitkeys_start(key_data, num_keys, repeat, press_ms, release_ms);
+    }
+
+    uart_put(2); // number of bytes to follow
+    uart_put(CMD_ERROR_OK);
+    uart_put(hitkeys_busy);
+}
+
 /* Dispatch a command.  A complete command packet has been received.  The
  * command buffer has one or more bytes.  The first byte is the command byte.
  * Dispatch to a handler, or return an error if the command is unrecognized.
@@ -824,6 +938,9 @@ static void _cmd_dispatch(void)
         case CMD_EMULATED_UPD_LOAD_KEY_DATA:
             _do_emulated_upd_load_key_data();
             break;
+        case CMD_EMULATED_UPD_READ_DISPLAY_CHANGES:
+            _do_emulated_upd_read_display_changes();
+            break;
 
         case CMD_FACEPLATE_UPD_DUMP_STATE:
             _do_faceplate_upd_dump_state();
@@ -857,6 +974,9 @@ static void _cmd_dispatch(void)
         case CMD_LOAD_KEYS:
             _do_load_keys();
             break;
+        case CMD_HIT_KEYS:
+            _do_hit_keys();
+            break;
 
         default:
             _send_empty_reply(CMD_ERROR_BAD_COMMAND);
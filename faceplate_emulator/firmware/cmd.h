@@ -12,6 +12,7 @@
 #define CMD_EMULATED_UPD_SEND_COMMAND 0x11
 #define CMD_EMULATED_UPD_RESET 0x12
 #define CMD_EMULATED_UPD_LOAD_KEY_DATA 0x13
+#define CMD_EMULATED_UPD_READ_DISPLAY_CHANGES 0x14
 
 #define CMD_FACEPLATE_UPD_DUMP_STATE 0x20
 #define CMD_FACEPLATE_UPD_SEND_COMMAND 0x21
@@ -28,6 +29,7 @@
 #define CMD_CONVERT_CODE_TO_UPD_PICTOGRAPH_DATA 0x43
 #define CMD_READ_KEYS 0x44
 #define CMD_LOAD_KEYS 0x45
+#define CMD_HIT_KEYS 0x46
 
 #define CMD_ARG_GREEN_LED 0x00
 #define CMD_ARG_RED_LED 0x01
@@ -38,6 +40,7 @@
 #define CMD_ERROR_BAD_ARGS_LENGTH 0x03
 #define CMD_ERROR_BAD_ARGS_VALUE 0x04
 #define CMD_ERROR_BLOCKED_BY_PASSTHRU 0x05
+#define CMD_ERROR_BUSY 0x06
 
 uint8_t cmd_buf[256];
 uint8_t cmd_buf_index;
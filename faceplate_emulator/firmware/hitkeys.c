@@ -0,0 +1,159 @@
+#include <stdint.h>
+#include <avr/io.h>
+#include <avr/interrupt.h>
+#include "hitkeys.h"
+#include "main.h"
+
+/*************************************************************************
+ * Timed Key Hits
+ *
+ * Presses and releases keys on the emulated faceplate with millisecond
+ * timing kept by the AVR instead of the host.  The sequence runs from the
+ * main loop so the radio's SPI commands and the UART are still serviced
+ * while keys are held.
+ *************************************************************************/
+
+static uint8_t _key_data[HITKEYS_MAX_KEYS][4];
+static uint8_t _num_keys;
+static uint8_t _key_index;
+static uint8_t _repeat;
+static uint8_t _hits_left; // for the current key, including this one
+static uint16_t _press_ms;
+static uint16_t _release_ms;
+static uint8_t _pressed;
+
+// milliseconds until the next press or release, counted down by timer2
+static volatile uint16_t _ms_left;
+
+void hitkeys_init(void)
+{
+    hitkeys_busy = 0;
+    _ms_left = 0;
+}
+
+/* Start timer2 to interrupt every 1 ms.
+ */
+static void _start_timer(void)
+{
+    // set timer2 CTC mode
+    TCCR2A = (1 << WGM21);
+    // prescaler 128 (CS22=1, CS21=0, CS20=1)
+    TCCR2B = (1 << CS22) | (0 << CS21) | (1 << CS20);
+    // set compare value (1.00 ms at 20 MHz)
+    OCR2A = 155;
+    // set initial count
+    TCNT2 = 0;
+    // enable timer2 compare interrupt
+    TIMSK2 = (1 << OCIE2A);
+}
+
+static void _stop_timer(void)
+{
+    // stop timer2
+    TCCR2B = 0;
+    // disable timer2 compare interrupt
+    TIMSK2 = 0;
+}
+
+ISR(TIMER2_COMPA_vect)
+{
+    if (_ms_left != 0)
+    {
+        _ms_left--;
+    }
+}
+
+static void _set_key_data(uint8_t *key_data)
+{
+    uint8_t i;
+    for (i=0; i<sizeof(upd_tx_key_data); i++)
+    {
+        upd_tx_key_data[i] = key_data[i];
+    }
+}
+
+// _ms_left is 16 bits so it can't be read or written atomically
+static void _set_ms_left(uint16_t ms)
+{
+    cli();
+    _ms_left = ms;
+    sei();
+}
+
+static uint16_t _get_ms_left(void)
+{
+    cli();
+    uint16_t ms = _ms_left;
+    sei();
+    return ms;
+}
+
+/* Hit each of +num_keys+ key data entries +repeat+ times, in order.  Each
+ * hit holds the key for +press_ms+ and then releases all keys for
+ * +release_ms+.  Any sequence in progress is replaced.
+ */
+void hitkeys_start(uint8_t key_data[][4], uint8_t num_keys, uint8_t repeat,
+                   uint16_t press_ms, uint16_t release_ms)
+{
+    uint8_t i, j;
+    for (i=0; i<num_keys; i++)
+    {
+        for (j=0; j<4; j++)
+        {
+            _key_data[i][j] = key_data[i][j];
+        }
+    }
+    _num_keys = num_keys;
+    _repeat = repeat;
+    _press_ms = press_ms;
+    _release_ms = release_ms;
+
+    _key_index = 0;
+    _hits_left = repeat;
+    _pressed = 0;
+    _set_ms_left(0);
+    hitkeys_busy = (num_keys != 0) && (repeat != 0);
+    if (hitkeys_busy)
+    {
+        _start_timer();
+    }
+}
+
+/* Press or release the next key when its time has come.  Call this from
+ * the main loop.
+ */
+void hitkeys_service(void)
+{
+    if ((! hitkeys_busy) || (_get_ms_left() != 0))
+    {
+        return;
+    }
+
+    if (_pressed) // release after the hit
+    {
+        uint8_t no_keys[4] = {0, 0, 0, 0};
+        _set_key_data(no_keys);
+        _pressed = 0;
+        _set_ms_left(_release_ms);
+
+        _hits_left--;
+        if (_hits_left == 0)
+        {
+            _key_index++;
+            _hits_left = _repeat;
+        }
+        return;
+    }
+
+    if (_key_index == _num_keys) // last release is over
+    {
+        _stop_timer();
+        hitkeys_busy = 0;
+        return;
+    }
+
+    // start the next hit
+    _set_key_data(_key_data[_key_index]);
+    _pressed = 1;
+    _set_ms_left(_press_ms);
+}
@@ -0,0 +1,14 @@
+#pragma once
+
+#include <stdint.h>
+
+// maximum number of key codes in one CMD_HIT_KEYS
+#define HITKEYS_MAX_KEYS 16
+
+// true while a sequence of key hits is being sent to the radio
+volatile uint8_t hitkeys_busy;
+
+void hitkeys_init(void);
+void hitkeys_start(uint8_t key_data[][4], uint8_t num_keys, uint8_t repeat,
+                   uint16_t press_ms, uint16_t release_ms);
+void hitkeys_service(void);
@@ -6,6 +6,7 @@
 
 #include "cmd.h"
 #include "faceplate.h"
+#include "hitkeys.h"
 #include "leds.h"
 #include "radio_spi.h"
 #include "radio_state.h"
@@ -34,6 +35,7 @@ int main(void)
     led_init();
     uart_init();
     cmd_init();
+    hitkeys_init();
     radio_spi_init();
     upd_init(&emulated_upd_state);
     upd_init(&faceplate_upd_state);
@@ -49,6 +51,9 @@ int main(void)
             cmd_receive_byte(c);
         }
 
+        // press or release keys for CMD_HIT_KEYS
+        hitkeys_service();
+
         if (run_mode == RUN_MODE_STOPPED)
         {
             continue;
@@ -13,6 +13,7 @@ void upd_init(upd_state_t *state)
     state->address = 0;
     state->increment = UPD_INCREMENT_OFF;
     state->dirty_flags = UPD_DIRTY_NONE;
+    state->host_dirty_flags = UPD_DIRTY_NONE;
 
     memset(state->display_ram, 0, UPD_DISPLAY_RAM_SIZE);
     memset(state->pictograph_ram, 0, UPD_PICTOGRAPH_RAM_SIZE);
@@ -37,6 +38,7 @@ static void _write_data_byte(upd_state_t *state, uint8_t b)
             {
                 state->display_ram[state->address] = b;
                 state->dirty_flags |= UPD_DIRTY_DISPLAY;
+                state->host_dirty_flags |= UPD_DIRTY_DISPLAY;
             }
             break;
 
@@ -45,6 +47,7 @@ static void _write_data_byte(upd_state_t *state, uint8_t b)
             {
                 state->pictograph_ram[state->address] = b;
                 state->dirty_flags |= UPD_DIRTY_PICTOGRAPH;
+                state->host_dirty_flags |= UPD_DIRTY_PICTOGRAPH;
             }
             break;
 
@@ -53,6 +56,7 @@ static void _write_data_byte(upd_state_t *state, uint8_t b)
             {
                 state->chargen_ram[state->address] = b;
                 state->dirty_flags |= UPD_DIRTY_CHARGEN;
+                state->host_dirty_flags |= UPD_DIRTY_CHARGEN;
             }
             break;
 
@@ -61,6 +65,7 @@ static void _write_data_byte(upd_state_t *state, uint8_t b)
             {
                 state->led_ram[state->address] = b;
                 state->dirty_flags |= UPD_DIRTY_LED;
+                state->host_dirty_flags |= UPD_DIRTY_LED;
             }
             break;
 
@@ -35,6 +35,7 @@ typedef struct
     uint8_t address;     // Current address in that area
     uint8_t increment;   // Address increment mode on/off
     uint8_t dirty_flags; // Bitfield of which RAM areas have changed
+    uint8_t host_dirty_flags; // Same, but only cleared when read by the host
 
     uint8_t display_ram[UPD_DISPLAY_RAM_SIZE];
     uint8_t pictograph_ram[UPD_PICTOGRAPH_RAM_SIZE];
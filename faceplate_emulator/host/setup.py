@@ -3,8 +3,8 @@ __version__ = '0.1.0.dev0'
 import sys
 from setuptools import setup, find_packages
 
-if sys.version_info[:2] < (3, 4):
-    raise RuntimeError('vwradio requires Python 3.4 or later')
+if sys.version_info[:2] < (3, 7):
+    raise RuntimeError('vwradio requires Python 3.7 or later')
 
 CLASSIFIERS = [
     'Development Status :: 3 - Alpha',
@@ -28,7 +28,7 @@ setup(
     maintainer_email="mike@naberezny.com",
     packages=find_packages(),
     install_requires=['pyserial'],
-    extras_require={},
+    extras_require={'numpy': ['numpy']},
     tests_require=[],
     include_package_data=True,
     zip_safe=False,
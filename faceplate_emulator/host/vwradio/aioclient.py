@@ -0,0 +1,340 @@
+'''An asyncio client for the AVR.
+
+AsyncClient has the same high level methods as avrclient.Client, but as
+coroutines.  Any number of tasks can send commands at once over one serial
+link.  Commands are written as soon as the AVR's UART buffers have room for
+them and their replies, and the AVR replies in the order that commands
+were received, so each reply is matched to the oldest command waiting.
+'''
+
+import asyncio
+import collections
+
+from vwradio import avrclient
+from vwradio import faceplates
+from vwradio.avrclient import (
+    CMD_SET_LED, CMD_ECHO, CMD_SET_RUN_MODE, CMD_SET_AUTO_DISPLAY_PASSTHRU,
+    CMD_SET_AUTO_KEY_PASSTHRU, CMD_EMULATED_UPD_DUMP_STATE,
+    CMD_EMULATED_UPD_SEND_COMMAND, CMD_EMULATED_UPD_RESET,
+    CMD_EMULATED_UPD_LOAD_KEY_DATA, CMD_EMULATED_UPD_READ_DISPLAY_CHANGES,
+    CMD_CONVERT_CODE_TO_UPD_KEY_DATA, CMD_CONVERT_UPD_KEY_DATA_TO_CODES,
+    CMD_CONVERT_CODE_TO_UPD_PICTOGRAPH_DATA,
+    CMD_CONVERT_UPD_PICTOGRAPH_DATA_TO_CODES, CMD_FACEPLATE_UPD_DUMP_STATE,
+    CMD_FACEPLATE_UPD_SEND_COMMAND, CMD_FACEPLATE_UPD_CLEAR_DISPLAY,
+    CMD_FACEPLATE_UPD_READ_KEY_DATA, CMD_RADIO_STATE_DUMP,
+    CMD_RADIO_STATE_PARSE, CMD_RADIO_STATE_RESET, CMD_READ_KEYS,
+    CMD_LOAD_KEYS, CMD_HIT_KEYS, ERROR_OK, HIT_KEYS_MAX_KEYS,
+    HIT_KEYS_POLL_INTERVAL, PIPELINE_MAX_BYTES, UPD_DIRTY_DISPLAY,
+    RadioState, UpdEmulatorState)
+
+DEFAULT_TIMEOUT = 2.0 # seconds
+
+
+class AsyncClient(object):
+    def __init__(self, ser, timeout=DEFAULT_TIMEOUT, loop=None,
+                 faceplate=None):
+        '''+ser+ is a serial.Serial or any object with fileno(), read(),
+        write(), and in_waiting.  It is switched to non-blocking reads
+        and is read when the event loop finds bytes waiting on it.  The
+        client binds to +loop+, or if it is None, to the loop running the
+        first command.  +faceplate+ is the faceplates.Faceplate used to
+        read the LCD, Premium4 by default.'''
+        self.serial = ser
+        self.timeout = timeout
+        if hasattr(ser, 'timeout'):
+            ser.timeout = 0 # non-blocking
+        if faceplate is None:
+            faceplate = faceplates.Premium4()
+        self.faceplate = faceplate
+        self._decode_lcd = avrclient._make_lcd_decoder(faceplate)
+        self._loop = None
+        self._rx_buf = bytearray()
+        self._pending = collections.deque() # (future, tx_size, rx_size)
+        self._tx_in_flight = 0
+        self._rx_in_flight = 0
+        self._space = None # future set when a reply frees buffer space
+        if loop is not None:
+            self._bind_loop(loop)
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.remove_reader(self.serial.fileno())
+            self._loop = None
+        self._fail_pending(Exception("Client closed"))
+
+    # High level ==============================================================
+
+    async def echo(self, data):
+        rx_bytes = await self.command(bytearray([CMD_ECHO]) + bytearray(data))
+        return rx_bytes[1:]
+
+    async def set_run_mode(self, mode):
+        await self.command([CMD_SET_RUN_MODE, int(mode)])
+
+    async def set_auto_display_passthru(self, enabled):
+        await self.command([CMD_SET_AUTO_DISPLAY_PASSTHRU, int(enabled)])
+
+    async def set_auto_key_passthru(self, enabled):
+        await self.command([CMD_SET_AUTO_KEY_PASSTHRU, int(enabled)])
+
+    async def set_led(self, led_num, led_state):
+        await self.command([CMD_SET_LED, led_num, int(led_state)])
+
+    async def emulated_upd_reset(self):
+        await self.command([CMD_EMULATED_UPD_RESET])
+
+    async def emulated_upd_dump_state(self):
+        data = await self.command([CMD_EMULATED_UPD_DUMP_STATE])
+        return UpdEmulatorState(data[1:])
+
+    async def emulated_upd_send_command(self, spi_bytes):
+        data = bytearray([CMD_EMULATED_UPD_SEND_COMMAND]) + bytearray(spi_bytes)
+        await self.command(data)
+
+    async def emulated_upd_load_key_data(self, key_bytes):
+        data = bytearray([CMD_EMULATED_UPD_LOAD_KEY_DATA]) + bytearray(key_bytes)
+        await self.command(data)
+
+    async def emulated_upd_read_display_changes(self):
+        '''Return the UPD_DIRTY_* flags of the RAM areas that changed
+        since the last call, and the display RAM if it changed or None'''
+        rx_bytes = await self.command([CMD_EMULATED_UPD_READ_DISPLAY_CHANGES])
+        dirty_flags = rx_bytes[1]
+        display_ram = None
+        if dirty_flags & UPD_DIRTY_DISPLAY:
+            display_ram = rx_bytes[2:]
+        return dirty_flags, display_ram
+
+    async def convert_upd_key_data_to_codes(self, key_data):
+        data = (bytearray([CMD_CONVERT_UPD_KEY_DATA_TO_CODES]) +
+                bytearray(key_data))
+        rx_bytes = await self.command(data)
+        num_keys_pressed = rx_bytes[1]
+        return list(rx_bytes[2:2+num_keys_pressed])
+
+    async def convert_code_to_upd_key_data(self, key_code):
+        rx_bytes = await self.command([CMD_CONVERT_CODE_TO_UPD_KEY_DATA,
+                                       key_code])
+        return list(rx_bytes[1:])
+
+    async def convert_upd_pictograph_data_to_codes(self, pictograph_data):
+        data = (bytearray([CMD_CONVERT_UPD_PICTOGRAPH_DATA_TO_CODES]) +
+                bytearray(pictograph_data))
+        rx_bytes = await self.command(data)
+        num_pictographs_displayed = rx_bytes[1]
+        return list(rx_bytes[2:2+num_pictographs_displayed])
+
+    async def convert_code_to_upd_pictograph_data(self, pictograph_code):
+        rx_bytes = await self.command([CMD_CONVERT_CODE_TO_UPD_PICTOGRAPH_DATA,
+                                       pictograph_code])
+        return list(rx_bytes[1:])
+
+    async def faceplate_upd_send_command(self, spi_bytes):
+        data = bytearray([CMD_FACEPLATE_UPD_SEND_COMMAND]) + bytearray(spi_bytes)
+        await self.command(data)
+
+    async def faceplate_upd_send_commands(self, spi_commands):
+        '''Send several SPI commands to the faceplate without waiting for
+        each reply before sending the next command'''
+        await asyncio.gather(*[ self.faceplate_upd_send_command(spi_bytes)
+                                for spi_bytes in spi_commands ])
+
+    async def faceplate_upd_dump_state(self):
+        data = await self.command([CMD_FACEPLATE_UPD_DUMP_STATE])
+        return UpdEmulatorState(data[1:])
+
+    async def faceplate_upd_clear_display(self):
+        await self.command([CMD_FACEPLATE_UPD_CLEAR_DISPLAY])
+
+    async def faceplate_upd_read_key_data(self):
+        data = await self.command([CMD_FACEPLATE_UPD_READ_KEY_DATA])
+        return data[1:]
+
+    async def radio_state_reset(self):
+        await self.command([CMD_RADIO_STATE_RESET])
+
+    async def radio_state_dump(self):
+        data = await self.command([CMD_RADIO_STATE_DUMP])
+        return RadioState(data[1:])
+
+    async def radio_state_parse(self, display):
+        data = bytearray([CMD_RADIO_STATE_PARSE]) + bytearray(display)
+        await self.command(data)
+
+    async def read_keys(self):
+        '''Read keys pressed on the real faceplate and return a list of
+        key codes (KEY_ constants)'''
+        rx_bytes = await self.command([CMD_READ_KEYS])
+        num_keys_pressed = rx_bytes[1]
+        return list(rx_bytes[2:2+num_keys_pressed])
+
+    async def load_keys(self, key_codes):
+        '''send key presses to the radio'''
+        count = len(key_codes)
+        if count > 2:
+            raise ValueError(
+                'Tried to press %d keys, but only 0, 1, or 2 keys '
+                'can be pressed at once' % count
+                )
+        data = [CMD_LOAD_KEYS, count, 0, 0]
+        data[2:2+count] = key_codes
+        await self.command(data)
+
+    async def read_lcd(self):
+        display_ram = (await self.emulated_upd_dump_state()).display_ram
+        return self._decode_lcd(display_ram)
+
+    async def watch_lcd(self, interval=0.05):
+        '''Asynchronously yield the text on the LCD, then yield it again
+        each time it changes, like avrclient.Client.watch_lcd()'''
+        await self.emulated_upd_read_display_changes() # forget earlier changes
+        text = await self.read_lcd()
+        yield text
+
+        loop = asyncio.get_running_loop()
+        next_poll = loop.time()
+        while True:
+            next_poll += interval
+            delay = next_poll - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else: # fell behind, don't try to catch up
+                next_poll = loop.time()
+
+            dirty_flags, display_ram = \
+                await self.emulated_upd_read_display_changes()
+            if display_ram is not None:
+                new_text = self._decode_lcd(display_ram)
+                if new_text != text:
+                    text = new_text
+                    yield text
+
+    async def hit_key(self, key, secs=0.15, repeat=1):
+        await self.hit_keys([key], secs, secs, repeat)
+
+    async def hit_keys(self, key_codes, press_secs=0.15, release_secs=0.15,
+                       repeat=1, wait=True):
+        '''Hit keys with the timing kept by the AVR, like
+        avrclient.Client.hit_keys()'''
+        commands = avrclient._hit_keys_commands(
+            key_codes, press_secs, release_secs, repeat)
+        if (len(commands) > 1) and (not wait):
+            raise ValueError("Only %d keys can be hit without waiting" %
+                HIT_KEYS_MAX_KEYS)
+        for data in commands:
+            await self.command(data)
+            if wait:
+                num_hits = (len(data) - 6) * repeat
+                await asyncio.sleep(num_hits * (press_secs + release_secs))
+                while await self.hit_keys_busy():
+                    await asyncio.sleep(HIT_KEYS_POLL_INTERVAL)
+
+    async def hit_keys_busy(self):
+        rx_bytes = await self.command([CMD_HIT_KEYS, 0, 0, 0, 0, 0])
+        return bool(rx_bytes[1])
+
+    # Low level ===============================================================
+
+    async def command(self, data, ignore_error=False, timeout=None):
+        '''Send a command and return its reply.  Raises an exception if no
+        reply is received within +timeout+ seconds (default self.timeout)
+        or if the reply is a NAK, unless +ignore_error+.'''
+        if self._loop is None:
+            self._bind_loop(asyncio.get_running_loop())
+        data = list(data)
+        tx_size, rx_size = avrclient._frame_sizes(data)
+        while not self._has_space(tx_size, rx_size):
+            if self._space is None:
+                self._space = self._loop.create_future()
+            await self._space
+
+        if not self._pending:
+            # nothing outstanding, so anything received is stale
+            self._rx_buf.clear()
+        future = self._loop.create_future()
+        self._pending.append((future, tx_size, rx_size))
+        self._tx_in_flight += tx_size
+        self._rx_in_flight += rx_size
+        self.serial.write(bytearray([len(data)] + data))
+
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            # shield so a timeout doesn't cancel the future before it is
+            # taken out of the queue by _resync()
+            rx_bytes = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self._resync()
+            raise Exception("Timeout: No reply received to %r" %
+                            bytearray(data))
+
+        if (rx_bytes[0] != ERROR_OK) and (not ignore_error):
+            raise Exception("Received NAK response: %r" % rx_bytes)
+        return rx_bytes
+
+    def _bind_loop(self, loop):
+        self._loop = loop
+        self._loop.add_reader(self.serial.fileno(), self._on_readable)
+
+    def _resync(self):
+        '''Called when a command times out.  The AVR drops a command it
+        doesn't reply to, so the replies still to come can't be matched to
+        the commands waiting.  Fail every command waiting and discard
+        anything received so the next command starts in sync.'''
+        self._fail_pending(Exception(
+            "Resync: Reply lost after an earlier command timed out"))
+        self._rx_buf.clear()
+        while self.serial.read(max(1, self.serial.in_waiting)):
+            pass
+
+    def _fail_pending(self, exc):
+        for future, tx_size, rx_size in self._pending:
+            if not future.done():
+                future.set_exception(exc)
+                future.exception() # retrieved here if no one is waiting
+        self._pending.clear()
+        self._tx_in_flight = 0
+        self._rx_in_flight = 0
+        if (self._space is not None) and (not self._space.done()):
+            self._space.set_result(None)
+        self._space = None
+
+    def _has_space(self, tx_size, rx_size):
+        if not self._pending:
+            return True
+        return ((self._tx_in_flight + tx_size <= PIPELINE_MAX_BYTES) and
+                (self._rx_in_flight + rx_size <= PIPELINE_MAX_BYTES))
+
+    def _on_readable(self):
+        self._rx_buf += self.serial.read(max(1, self.serial.in_waiting))
+        while self._rx_buf:
+            expected_num_bytes = self._rx_buf[0]
+            if len(self._rx_buf) < 1 + expected_num_bytes:
+                break # wait for the rest of the reply
+            rx_bytes = self._rx_buf[1:1+expected_num_bytes]
+            del self._rx_buf[:1+expected_num_bytes]
+            self._reply_received(rx_bytes)
+
+    def _reply_received(self, rx_bytes):
+        if not self._pending:
+            return # unexpected extra data
+        future, tx_size, rx_size = self._pending.popleft()
+        self._tx_in_flight -= tx_size
+        self._rx_in_flight -= rx_size
+        if not future.done():
+            if len(rx_bytes) == 0:
+                future.set_exception(Exception(
+                    "Invalid: Reply had header byte but not ack/nak"))
+            else:
+                future.set_result(rx_bytes)
+
+        if (self._space is not None) and (not self._space.done()):
+            self._space.set_result(None)
+        self._space = None
+
+
+def make_client(serial=None, timeout=DEFAULT_TIMEOUT, loop=None,
+                faceplate=None):
+    if serial is None:
+        serial = avrclient.make_serial()
+    return AsyncClient(serial, timeout=timeout, loop=loop, faceplate=faceplate)
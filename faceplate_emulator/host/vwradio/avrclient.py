@@ -1,6 +1,9 @@
+import operator
+import os
 import struct
 import time
 import serial # pyserial
+from vwradio import faceplates
 
 CMD_SET_LED = 0x01
 CMD_ECHO = 0x02
@@ -11,6 +14,7 @@ CMD_EMULATED_UPD_DUMP_STATE = 0x10
 CMD_EMULATED_UPD_SEND_COMMAND = 0x11
 CMD_EMULATED_UPD_RESET = 0x12
 CMD_EMULATED_UPD_LOAD_KEY_DATA = 0x13
+CMD_EMULATED_UPD_READ_DISPLAY_CHANGES = 0x14
 CMD_FACEPLATE_UPD_DUMP_STATE =  0x20
 CMD_FACEPLATE_UPD_SEND_COMMAND = 0x21
 CMD_FACEPLATE_UPD_CLEAR_DISPLAY = 0x22
@@ -24,6 +28,7 @@ CMD_CONVERT_UPD_PICTOGRAPH_DATA_TO_CODES = 0x42
 CMD_CONVERT_CODE_TO_UPD_PICTOGRAPH_DATA = 0x43
 CMD_READ_KEYS = 0x44
 CMD_LOAD_KEYS = 0x45
+CMD_HIT_KEYS = 0x46
 
 ERROR_OK = 0x00
 ERROR_NO_COMMAND = 0x01
@@ -31,6 +36,7 @@ ERROR_BAD_COMMAND = 0x02
 ERROR_BAD_ARGS_LENGTH = 0x03
 ERROR_BAD_ARGS_VALUE = 0x04
 ERROR_BLOCKED_BY_PASSTHRU = 0x05
+ERROR_BUSY = 0x06
 
 RUN_MODE_STOPPED = 0
 RUN_MODE_RUNNING = 1
@@ -49,10 +55,38 @@ UPD_DIRTY_PICTOGRAPH = 1<<UPD_RAM_PICTOGRAPH
 UPD_DIRTY_CHARGEN = 1<<UPD_RAM_CHARGEN
 UPD_DIRTY_LED = 1<<UPD_RAM_LED
 
+HIT_KEYS_MAX_KEYS = 16 # key codes in one CMD_HIT_KEYS
+HIT_KEYS_MAX_REPEAT = 255 # repeat count is sent in one byte
+HIT_KEYS_POLL_INTERVAL = 0.01 # seconds between checks for hits done
+DISPLAY_POLL_INTERVAL = 0.02 # seconds between checks for display changes
+
+# The AVR's UART ring buffers hold 256 bytes with 8-bit indexes, so at most
+# 255 bytes can be waiting in either direction.  Pipelined commands are
+# written in groups that fit in this many bytes both ways.
+PIPELINE_MAX_BYTES = 255
+
+# Longest reply (including the length byte) to each command that can reply
+# with more than a few bytes.  CMD_ECHO replies with as many bytes as sent.
+_MAX_REPLY_SIZES = {
+    CMD_EMULATED_UPD_DUMP_STATE: 153,
+    CMD_EMULATED_UPD_READ_DISPLAY_CHANGES: 28,
+    CMD_FACEPLATE_UPD_DUMP_STATE: 153,
+    CMD_RADIO_STATE_DUMP: 54,
+    CMD_CONVERT_UPD_PICTOGRAPH_DATA_TO_CODES: 10,
+    CMD_CONVERT_CODE_TO_UPD_PICTOGRAPH_DATA: 10,
+    }
+_DEFAULT_MAX_REPLY_SIZE = 6
+
 
 class Client(object):
-    def __init__(self, ser):
+    def __init__(self, ser, faceplate=None):
+        '''+faceplate+ is the faceplates.Faceplate used to read the LCD,
+        Premium4 by default'''
         self.serial = ser
+        if faceplate is None:
+            faceplate = faceplates.Premium4()
+        self.faceplate = faceplate
+        self._decode_lcd = _make_lcd_decoder(faceplate)
 
     # High level ==============================================================
 
@@ -91,6 +125,11 @@ class Client(object):
         data = bytearray([CMD_FACEPLATE_UPD_SEND_COMMAND]) + bytearray(spi_bytes)
         self.command(data)
 
+    def faceplate_upd_send_commands(self, spi_commands):
+        '''Send several SPI commands to the faceplate in one pipeline'''
+        self.pipeline([ bytearray([CMD_FACEPLATE_UPD_SEND_COMMAND]) +
+                        bytearray(spi_bytes) for spi_bytes in spi_commands ])
+
     def faceplate_upd_dump_state(self):
         data = self.command([CMD_FACEPLATE_UPD_DUMP_STATE])
         return UpdEmulatorState(data[1:])
@@ -159,25 +198,76 @@ class Client(object):
                 )
         self.command(data)
 
-    def hit_key(self, key, secs=0.15):
-        '''TODO implement this on the AVR side instead'''
-        self.load_keys([key]) # hit key
-        time.sleep(secs)
-        self.load_keys([]) # release all keys
-        time.sleep(secs)
+    def hit_key(self, key, secs=0.15, repeat=1):
+        '''Hold a key for +secs+ then release it for +secs+, +repeat+
+        times'''
+        self.hit_keys([key], secs, secs, repeat)
+
+    def hit_keys(self, key_codes, press_secs=0.15, release_secs=0.15,
+                 repeat=1, wait=True):
+        '''Hit each key in +key_codes+ +repeat+ times, in order.  Each
+        hit holds the key for +press_secs+ then releases all keys for
+        +release_secs+.  The timing is kept by the AVR.  If +wait+, returns
+        once the last key has been released for +release_secs+.'''
+        commands = _hit_keys_commands(key_codes, press_secs, release_secs,
+                                      repeat)
+        if (len(commands) > 1) and (not wait):
+            raise ValueError("Only %d keys can be hit without waiting" %
+                HIT_KEYS_MAX_KEYS)
+        for data in commands:
+            self.command(data)
+            if wait:
+                num_hits = (len(data) - 6) * repeat
+                time.sleep(num_hits * (press_secs + release_secs))
+                while self.hit_keys_busy():
+                    time.sleep(HIT_KEYS_POLL_INTERVAL)
+
+    def hit_keys_busy(self):
+        '''Return True while keys from hit_keys() are still being hit'''
+        rx_bytes = self.command([CMD_HIT_KEYS, 0, 0, 0, 0, 0])
+        return bool(rx_bytes[1])
+
+    def emulated_upd_read_display_changes(self):
+        '''Return the UPD_DIRTY_* flags of the RAM areas that changed
+        since the last call, and the display RAM if it changed or None'''
+        rx_bytes = self.command([CMD_EMULATED_UPD_READ_DISPLAY_CHANGES])
+        dirty_flags = rx_bytes[1]
+        display_ram = None
+        if dirty_flags & UPD_DIRTY_DISPLAY:
+            display_ram = rx_bytes[2:]
+        return dirty_flags, display_ram
 
     def read_lcd(self):
-        '''TODO implement this on the AVR side instead'''
-        from vwradio.faceplates import Premium4 # XXX hack, premium 4 only
-        faceplate = Premium4()
+        '''Return the text on the LCD, decoded from the emulated uPD16432B's
+        display RAM with the character set of the configured faceplate.
+        Character codes the faceplate has no character for are shown
+        as '?'.'''
         display_ram = self.emulated_upd_dump_state().display_ram
-        text = ''
-
-        for addr in faceplate.VISIBLE_DISPLAY_ADDRESSES:
-            char_code = display_ram[addr]
-            char = faceplate.CHARACTERS[char_code]
-            text += char
-        return text
+        return self._decode_lcd(display_ram)
+
+    def watch_lcd(self, interval=0.05):
+        '''Yield the text on the LCD, then yield it again each time it
+        changes.  The AVR is polled at most once per +interval+ seconds and
+        sends the display RAM only when it has changed.'''
+        self.emulated_upd_read_display_changes() # forget earlier changes
+        text = self.read_lcd()
+        yield text
+
+        next_poll = time.monotonic()
+        while True:
+            next_poll += interval
+            delay = next_poll - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else: # fell behind, don't try to catch up
+                next_poll = time.monotonic()
+
+            dirty_flags, display_ram = self.emulated_upd_read_display_changes()
+            if display_ram is not None:
+                new_text = self._decode_lcd(display_ram)
+                if new_text != text:
+                    text = new_text
+                    yield text
 
     # Low level ===============================================================
 
@@ -186,21 +276,54 @@ class Client(object):
         self.send(data)
         return self.receive(ignore_error)
 
+    def pipeline(self, commands, ignore_error=False):
+        '''Send several commands and return a list of their replies in the
+        same order.  Commands are written together, as many at a time as
+        the AVR's UART buffers can hold, instead of waiting for the reply
+        to each one before sending the next.  All replies are read, then
+        if any were NAKs, PipelineError is raised unless +ignore_error+.'''
+        self._flush_rx() # discard rx if a previous command was interrupted
+        replies = []
+        for group in _pipeline_groups(commands):
+            framed = bytearray()
+            for data in group:
+                framed += bytearray([len(data)] + list(data))
+            self.serial.write(framed)
+            self._flush_tx()
+            for data in group:
+                replies.append(self._receive_reply(pipelined=True))
+
+        if not ignore_error:
+            for rx_bytes in replies:
+                if rx_bytes[0] != ERROR_OK:
+                    raise PipelineError(commands, replies)
+        return replies
+
     def send(self, data):
         self.serial.write(bytearray([len(data)] + list(data)))
         self._flush_tx()
 
     def receive(self, ignore_error=False):
+        rx_bytes = self._receive_reply(pipelined=False)
+
+        # check error code byte
+        if (rx_bytes[0] != ERROR_OK) and (not ignore_error):
+            raise Exception("Received NAK response: %r" % rx_bytes)
+
+        return rx_bytes
+
+    def _receive_reply(self, pipelined):
         # read number of bytes to expect
         head = self.serial.read(1)
         if len(head) == 0:
             raise Exception("Timeout: No reply header byte received")
         expected_num_bytes = ord(head)
 
-        # read bytes expected, or more if available
+        # read bytes expected, or more if available.  replies to the next
+        # commands follow when pipelined, so only read the bytes expected.
         num_bytes_to_read = expected_num_bytes
-        if self.serial.in_waiting > num_bytes_to_read: # unexpected extra data
-            num_bytes_to_read = self.serial.in_waiting
+        if (not pipelined) and (self.serial.in_waiting > num_bytes_to_read):
+            num_bytes_to_read = self.serial.in_waiting # unexpected extra data
         rx_bytes = bytearray(self.serial.read(num_bytes_to_read))
 
         # sanity checks on reply length
@@ -217,10 +340,6 @@ class Client(object):
         elif len(rx_bytes) == 0:
             raise Exception("Invalid: Reply had header byte but not ack/nak")
 
-        # check error code byte
-        if (rx_bytes[0] != ERROR_OK) and (not ignore_error):
-            raise Exception("Received NAK response: %r" % rx_bytes)
-
         return rx_bytes
 
     def _flush_rx(self):
@@ -232,70 +351,192 @@ class Client(object):
         self.serial.flush()
 
 
-class UpdEmulatorState(object):
-    def __init__(self, data):
-        assert len(data) == 151
-        self.ram_area = data[0]
-        self.ram_size = data[1]
-        self.address = data[2]
-        self.increment = bool(data[3])
-        self.dirty_flags = data[4]
-        self.display_ram = data[5:30]
-        self.pictograph_ram = data[30:38]
-        self.chargen_ram = data[38:150]
-        self.led_ram = data[150:151]
+class PipelineError(Exception):
+    '''Raised by Client.pipeline when one or more commands received a NAK.
+    +replies+ has the reply to every command, in order, and +failed+ has
+    the indexes of the commands that received NAKs.'''
+
+    def __init__(self, commands, replies):
+        self.commands = commands
+        self.replies = replies
+        self.failed = [ i for i, rx_bytes in enumerate(replies)
+                        if rx_bytes[0] != ERROR_OK ]
+        naks = [ "command %d %r: %r" % (i, bytearray(commands[i]), replies[i])
+                 for i in self.failed ]
+        super(PipelineError, self).__init__(
+            "Received NAK response to %s" % ", ".join(naks))
+
+
+def _pipeline_groups(commands):
+    '''Split +commands+ into lists that can be written at once without
+    overflowing the AVR's UART buffers'''
+    group = []
+    tx_size = rx_size = 0
+    for data in commands:
+        data = list(data)
+        cmd_tx_size, cmd_rx_size = _frame_sizes(data)
+        if group and ((tx_size + cmd_tx_size > PIPELINE_MAX_BYTES) or
+                      (rx_size + cmd_rx_size > PIPELINE_MAX_BYTES)):
+            yield group
+            group = []
+            tx_size = rx_size = 0
+        group.append(data)
+        tx_size += cmd_tx_size
+        rx_size += cmd_rx_size
+    if group:
+        yield group
+
+
+def _frame_sizes(data):
+    '''Return the number of bytes sent for command +data+ and the most
+    bytes that its reply can have, both including the length byte'''
+    if len(data) >= PIPELINE_MAX_BYTES:
+        raise ValueError("Command too long: %d bytes" % len(data))
+    if not data:
+        rx_size = 2 # error for zero length command
+    elif data[0] == CMD_ECHO:
+        rx_size = len(data) + 1
+    else:
+        rx_size = _MAX_REPLY_SIZES.get(data[0], _DEFAULT_MAX_REPLY_SIZE)
+    return len(data) + 1, rx_size
+
+
+# Reply to CMD_EMULATED_UPD_DUMP_STATE or CMD_FACEPLATE_UPD_DUMP_STATE
+# after the error byte: ram_area ... led_ram
+UPD_EMULATOR_STATE = struct.Struct('<BBBBB25s8s112s1s')
+
+# Reply to CMD_RADIO_STATE_DUMP after the error byte: operation_mode ...
+# test_signal_strength
+RADIO_STATE = struct.Struct('<BBBHbbbbbBBBHHBB11sBBBB7s7sHH')
+
+
+class _Record(object):
+    '''Base for the states decoded from a reply.  Fields are listed in
+    __slots__ in the order they are unpacked.'''
+    __slots__ = ()
+
+    def _asdict(self):
+        return dict([ (name, getattr(self, name)) for name in self.__slots__ ])
 
     def __repr__(self):
-        return '<%s: %s> ' % (self.__class__.__name__, repr(self.__dict__))
+        return '<%s: %s> ' % (self.__class__.__name__, repr(self._asdict()))
 
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        return (isinstance(other, _Record) and
+                self._asdict() == other._asdict())
 
 
-class RadioState(object):
+class UpdEmulatorState(_Record):
+    __slots__ = ('ram_area', 'ram_size', 'address', 'increment',
+                 'dirty_flags', 'display_ram', 'pictograph_ram',
+                 'chargen_ram', 'led_ram')
+
     def __init__(self, data):
-        assert len(data) == 52
-        self.operation_mode = data[0]
-        self.display_mode = data[1]
-        self.safe_tries = data[2]
-        self.safe_code = (data[3] + (data[4] << 8))
-        self.sound_bass =     struct.unpack('b', bytearray([data[5]]))[0]
-        self.sound_treble =   struct.unpack('b', bytearray([data[6]]))[0]
-        self.sound_midrange = struct.unpack('b', bytearray([data[7]]))[0]
-        self.sound_balance =  struct.unpack('b', bytearray([data[8]]))[0]
-        self.sound_fade =     struct.unpack('b', bytearray([data[9]]))[0]
-        self.tape_side = data[10]
-        self.cd_disc = data[11]
-        self.cd_track = data[12]
-        self.cd_track_pos = (data[13] + (data[14] << 8))
-        self.tuner_freq = (data[15] + (data[16] << 8))
-        self.tuner_preset = data[17]
-        self.tuner_band = data[18]
-        self.display = data[19:30]
-        self.option_on_vol = data[30]
-        self.option_cd_mix = data[31]
-        self.option_tape_skip = data[32]
-        self.test_fern = data[33]
-        self.test_rad = data[34:41]
-        self.test_ver = data[41:48]
-        self.test_signal_freq = (data[48] + (data[49] << 8))
-        self.test_signal_strength = (data[50] + (data[51] << 8))
+        (self.ram_area, self.ram_size, self.address, increment,
+            self.dirty_flags, self.display_ram, self.pictograph_ram,
+            self.chargen_ram, self.led_ram) = UPD_EMULATOR_STATE.unpack(data)
+        self.increment = bool(increment)
 
-    def __repr__(self):
-        return '<%s: %s> ' % (self.__class__.__name__, repr(self.__dict__))
 
-    def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+class RadioState(_Record):
+    __slots__ = ('operation_mode', 'display_mode', 'safe_tries', 'safe_code',
+                 'sound_bass', 'sound_treble', 'sound_midrange',
+                 'sound_balance', 'sound_fade', 'tape_side', 'cd_disc',
+                 'cd_track', 'cd_track_pos', 'tuner_freq', 'tuner_preset',
+                 'tuner_band', 'display', 'option_on_vol', 'option_cd_mix',
+                 'option_tape_skip', 'test_fern', 'test_rad', 'test_ver',
+                 'test_signal_freq', 'test_signal_strength')
 
+    def __init__(self, data):
+        (self.operation_mode, self.display_mode, self.safe_tries,
+            self.safe_code, self.sound_bass, self.sound_treble,
+            self.sound_midrange, self.sound_balance, self.sound_fade,
+            self.tape_side, self.cd_disc, self.cd_track, self.cd_track_pos,
+            self.tuner_freq, self.tuner_preset, self.tuner_band,
+            self.display, self.option_on_vol, self.option_cd_mix,
+            self.option_tape_skip, self.test_fern, self.test_rad,
+            self.test_ver, self.test_signal_freq,
+            self.test_signal_strength) = RADIO_STATE.unpack(data)
+
+
+def _make_lcd_decoder(faceplate):
+    '''Return a function that decodes display RAM to the text on the LCD
+    of +faceplate+'''
+    # visible display ram bytes in the order they appear on the lcd
+    lcd_addresses = operator.itemgetter(*faceplate.VISIBLE_DISPLAY_ADDRESSES)
+    # char code as index, char as value, for str.translate()
+    lcd_chars = ''.join([ faceplate.CHARACTERS.get(code, '?')
+                          for code in range(256) ])
+
+    def decode_lcd(display_ram):
+        char_codes = bytes(lcd_addresses(display_ram))
+        return char_codes.decode('latin-1').translate(lcd_chars)
+    return decode_lcd
+
+def _hit_keys_command(key_codes, press_secs, release_secs, repeat):
+    '''Return the CMD_HIT_KEYS command to hit +key_codes+'''
+    press_ms = int(round(press_secs * 1000))
+    release_ms = int(round(release_secs * 1000))
+    for ms in (press_ms, release_ms):
+        if ms not in range(0x10000):
+            raise ValueError("Time %d ms is not 0-65535 ms" % ms)
+    if repeat not in range(1, HIT_KEYS_MAX_REPEAT + 1):
+        raise ValueError("Repeat count %r is not 1-%d" %
+            (repeat, HIT_KEYS_MAX_REPEAT))
+    if len(key_codes) > HIT_KEYS_MAX_KEYS:
+        raise ValueError("Tried to hit %d keys, but only %d keys can be "
+            "hit in one command" % (len(key_codes), HIT_KEYS_MAX_KEYS))
+    return ([CMD_HIT_KEYS, press_ms & 0xFF, press_ms >> 8,
+             release_ms & 0xFF, release_ms >> 8, repeat] + list(key_codes))
+
+def _hit_keys_commands(key_codes, press_secs, release_secs, repeat):
+    '''Return the CMD_HIT_KEYS commands to hit +key_codes+, split into
+    as few commands as the AVR can take'''
+    return [ _hit_keys_command(key_codes[i:i+HIT_KEYS_MAX_KEYS],
+                               press_secs, release_secs, repeat)
+             for i in range(0, max(len(key_codes), 1), HIT_KEYS_MAX_KEYS) ]
+
+def wait_for_display_change(client, timeout, clock=time.monotonic,
+                            sleep=time.sleep):
+    '''Return True once the display RAM of the emulated uPD16432B changes,
+    or False after +timeout+ seconds without a change'''
+    deadline = clock() + timeout
+    while clock() < deadline:
+        dirty_flags, display_ram = client.emulated_upd_read_display_changes()
+        if dirty_flags & UPD_DIRTY_DISPLAY:
+            return True
+        sleep(DISPLAY_POLL_INTERVAL)
+    return False
+
+def wait_for_radio_state(client, predicate, timeout=None,
+                         clock=time.monotonic, sleep=time.sleep):
+    '''Wait until predicate(RadioState) is true and return the state,
+    or return None after +timeout+ seconds (forever if None).  The radio
+    state is only dumped when the display has changed.'''
+    client.emulated_upd_read_display_changes() # forget old changes
+    state = client.radio_state_dump()
+    deadline = None if timeout is None else clock() + timeout
+    while not predicate(state):
+        if (deadline is not None) and (clock() >= deadline):
+            return None
+        sleep(DISPLAY_POLL_INTERVAL)
+        dirty_flags, display_ram = client.emulated_upd_read_display_changes()
+        if dirty_flags & UPD_DIRTY_DISPLAY:
+            state = client.radio_state_dump()
+    return state
 
 def make_serial():
-    from serial.tools.list_ports import comports
-    names = [ x.device for x in comports() if 'Bluetooth' not in x.device ]
-    if not names:
-        raise Exception("No serial port found")
-    return serial.Serial(port=names[0], baudrate=115200, timeout=2)
-
-def make_client(serial=None):
+    # AVR_SERIAL_PORT can name a port such as the pty of a simulated AVR
+    port = os.environ.get('AVR_SERIAL_PORT')
+    if port is None:
+        from serial.tools.list_ports import comports
+        names = [ x.device for x in comports() if 'Bluetooth' not in x.device ]
+        if not names:
+            raise Exception("No serial port found")
+        port = names[0]
+    return serial.Serial(port=port, baudrate=115200, timeout=2)
+
+def make_client(serial=None, faceplate=None):
     if serial is None:
         serial = make_serial()
-    return Client(serial)
+    return Client(serial, faceplate=faceplate)
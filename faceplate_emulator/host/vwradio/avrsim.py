@@ -0,0 +1,573 @@
+'''A simulated AVR that speaks the same serial protocol as the firmware.
+
+SimulatedAvr implements the commands in firmware/cmd.c.  The emulated and
+faceplate uPD16432Bs are decode.Upd16432b instances and the radio state is
+a radios.Radio.  There is no radio or faceplate hardware: SPI commands from
+a radio can be fed in with radio_send_command() and keys held down on the
+faceplate can be set in faceplate_key_data.
+
+A Client can be attached with an in-memory SimulatedSerial, or to a pty
+from open_pty() that any program can open as a serial port.  Scripts that
+use avrclient.make_client() can be pointed at the simulated AVR with:
+
+  python -m vwradio.avrsim   # prints the pty name
+  AVR_SERIAL_PORT=<pty name> python vwradio/scripts/readlcd.py
+'''
+
+import collections
+import os
+import sys
+import threading
+import time
+import tty
+
+from vwradio.avrclient import (
+    CMD_SET_LED, CMD_ECHO, CMD_SET_RUN_MODE, CMD_SET_AUTO_DISPLAY_PASSTHRU,
+    CMD_SET_AUTO_KEY_PASSTHRU, CMD_EMULATED_UPD_DUMP_STATE,
+    CMD_EMULATED_UPD_SEND_COMMAND, CMD_EMULATED_UPD_RESET,
+    CMD_EMULATED_UPD_LOAD_KEY_DATA, CMD_EMULATED_UPD_READ_DISPLAY_CHANGES,
+    CMD_FACEPLATE_UPD_DUMP_STATE,
+    CMD_FACEPLATE_UPD_SEND_COMMAND, CMD_FACEPLATE_UPD_CLEAR_DISPLAY,
+    CMD_FACEPLATE_UPD_READ_KEY_DATA, CMD_RADIO_STATE_DUMP,
+    CMD_RADIO_STATE_PARSE, CMD_RADIO_STATE_RESET,
+    CMD_CONVERT_UPD_KEY_DATA_TO_CODES, CMD_CONVERT_CODE_TO_UPD_KEY_DATA,
+    CMD_CONVERT_UPD_PICTOGRAPH_DATA_TO_CODES,
+    CMD_CONVERT_CODE_TO_UPD_PICTOGRAPH_DATA, CMD_READ_KEYS, CMD_LOAD_KEYS,
+    CMD_HIT_KEYS,
+    ERROR_OK, ERROR_NO_COMMAND, ERROR_BAD_COMMAND, ERROR_BAD_ARGS_LENGTH,
+    ERROR_BAD_ARGS_VALUE, ERROR_BLOCKED_BY_PASSTHRU, ERROR_BUSY,
+    HIT_KEYS_MAX_KEYS, RUN_MODE_STOPPED,
+    RUN_MODE_RUNNING, LED_GREEN, LED_RED, UPD_RAM_NONE, UPD_RAM_DISPLAY,
+    UPD_RAM_PICTOGRAPH, UPD_RAM_CHARGEN, UPD_RAM_LED, UPD_DIRTY_NONE,
+    UPD_DIRTY_DISPLAY, RADIO_STATE)
+from vwradio import decode
+from vwradio import faceplates
+from vwradio import radios
+
+COMMAND_TIMEOUT = 2.0 # seconds, like the timer in firmware/cmd.c
+MAX_SPI_COMMAND_SIZE = 32 # size of upd_command_t data
+
+
+class SimulatedAvr(object):
+    def __init__(self, faceplate=None):
+        if faceplate is None:
+            faceplate = faceplates.Premium4() # like radio_model in main.c
+        self.faceplate = faceplate
+        self.run_mode = RUN_MODE_RUNNING
+        self.auto_display_passthru = True
+        self.auto_key_passthru = True
+        self.leds = {LED_GREEN: 0, LED_RED: 0}
+        self.emulated_upd = decode.Upd16432b(verbose=False)
+        self.emulated_upd_host_dirty_flags = UPD_DIRTY_NONE
+        self.faceplate_upd = decode.Upd16432b(verbose=False)
+        self.faceplate_key_data = bytearray(4) # keys held on the faceplate
+        self.upd_tx_key_data = bytearray(4) # key data sent to the radio
+        self.radio = radios.Radio()
+
+        self._radio_spi_commands = collections.deque()
+        # (press time, release time, end time, key data) of each key hit
+        # scheduled by CMD_HIT_KEYS
+        self._hits = collections.deque()
+        self._cmd_buf = bytearray()
+        self._cmd_expected_length = 0
+        self._last_rx_time = 0
+        self._pictograph_byte_bits = {}
+        for byte_bit, pictograph in sorted(faceplate.PICTOGRAPHS.items()):
+            self._pictograph_byte_bits.setdefault(pictograph, byte_bit)
+
+        self._handlers = {
+            CMD_SET_LED: self._do_set_led,
+            CMD_ECHO: self._do_echo,
+            CMD_SET_RUN_MODE: self._do_set_run_mode,
+            CMD_SET_AUTO_DISPLAY_PASSTHRU: self._do_set_auto_display_passthru,
+            CMD_SET_AUTO_KEY_PASSTHRU: self._do_set_auto_key_passthru,
+            CMD_RADIO_STATE_DUMP: self._do_radio_state_dump,
+            CMD_RADIO_STATE_PARSE: self._do_radio_state_parse,
+            CMD_RADIO_STATE_RESET: self._do_radio_state_reset,
+            CMD_EMULATED_UPD_DUMP_STATE: self._do_emulated_upd_dump_state,
+            CMD_EMULATED_UPD_SEND_COMMAND: self._do_emulated_upd_send_command,
+            CMD_EMULATED_UPD_RESET: self._do_emulated_upd_reset,
+            CMD_EMULATED_UPD_LOAD_KEY_DATA:
+                self._do_emulated_upd_load_key_data,
+            CMD_EMULATED_UPD_READ_DISPLAY_CHANGES:
+                self._do_emulated_upd_read_display_changes,
+            CMD_FACEPLATE_UPD_DUMP_STATE: self._do_faceplate_upd_dump_state,
+            CMD_FACEPLATE_UPD_SEND_COMMAND:
+                self._do_faceplate_upd_send_command,
+            CMD_FACEPLATE_UPD_CLEAR_DISPLAY:
+                self._do_faceplate_upd_clear_display,
+            CMD_FACEPLATE_UPD_READ_KEY_DATA:
+                self._do_faceplate_upd_read_key_data,
+            CMD_CONVERT_UPD_KEY_DATA_TO_CODES:
+                self._do_convert_upd_key_data_to_codes,
+            CMD_CONVERT_CODE_TO_UPD_KEY_DATA:
+                self._do_convert_code_to_upd_key_data,
+            CMD_CONVERT_UPD_PICTOGRAPH_DATA_TO_CODES:
+                self._do_convert_upd_pictograph_data_to_codes,
+            CMD_CONVERT_CODE_TO_UPD_PICTOGRAPH_DATA:
+                self._do_convert_code_to_upd_pictograph_data,
+            CMD_READ_KEYS: self._do_read_keys,
+            CMD_LOAD_KEYS: self._do_load_keys,
+            CMD_HIT_KEYS: self._do_hit_keys,
+            }
+
+    # Serial link =============================================================
+
+    def receive(self, data):
+        '''Receive bytes from the serial port and return the bytes of any
+        replies to commands they completed'''
+        replies = bytearray()
+        for c in bytearray(data):
+            now = time.monotonic()
+            if (self._cmd_expected_length and
+                    (now - self._last_rx_time) > COMMAND_TIMEOUT):
+                self._cmd_init() # incomplete command timed out
+            self._last_rx_time = now
+
+            if self._cmd_expected_length == 0:
+                if c == 0: # command length must be 1 byte or longer
+                    replies += _empty_reply(ERROR_NO_COMMAND)
+                else:
+                    self._cmd_expected_length = c
+            else:
+                self._cmd_buf.append(c)
+                if len(self._cmd_buf) == self._cmd_expected_length:
+                    replies += self._dispatch(bytes(self._cmd_buf))
+                    self._cmd_init()
+                    self.service()
+        return bytes(replies)
+
+    def _cmd_init(self):
+        self._cmd_buf = bytearray()
+        self._cmd_expected_length = 0
+
+    def _dispatch(self, cmd):
+        handler = self._handlers.get(cmd[0])
+        if handler is None:
+            return _empty_reply(ERROR_BAD_COMMAND)
+        return handler(cmd)
+
+    # Radio and faceplate =====================================================
+
+    def radio_send_command(self, spi_bytes):
+        '''Receive an SPI command from the radio'''
+        self._radio_spi_commands.append(bytes(spi_bytes))
+        self.service()
+
+    def service(self):
+        '''Do the work of the firmware's main loop until it is idle'''
+        self._service_hit_keys()
+        if self.run_mode == RUN_MODE_STOPPED:
+            return
+        while True:
+            if self._radio_spi_commands:
+                spi_bytes = self._radio_spi_commands.popleft()
+                self._process_emulated_upd_command(spi_bytes)
+
+            if self.auto_key_passthru:
+                self.upd_tx_key_data[:] = self.faceplate_key_data
+
+            self._update_radio_state_if_dirty()
+            if self.auto_display_passthru:
+                self._update_faceplate_if_dirty()
+            self.emulated_upd.dirty_flags = decode.UPD_DIRTY_NONE
+
+            if not self._radio_spi_commands:
+                break
+
+    def _service_hit_keys(self):
+        now = time.monotonic()
+        while self._hits and (self._hits[0][2] <= now):
+            self._hits.popleft()
+            self.upd_tx_key_data[:] = bytearray(4)
+        if self._hits:
+            press_time, release_time, end_time, key_data = self._hits[0]
+            if press_time <= now < release_time:
+                self.upd_tx_key_data[:] = key_data
+            elif now >= release_time:
+                self.upd_tx_key_data[:] = bytearray(4)
+
+    def _process_emulated_upd_command(self, spi_bytes):
+        # the firmware keeps a second set of dirty flags for the host that
+        # only CMD_EMULATED_UPD_READ_DISPLAY_CHANGES clears
+        upd = self.emulated_upd
+        dirty_flags = upd.dirty_flags
+        upd.dirty_flags = UPD_DIRTY_NONE
+        upd.process(spi_bytes)
+        self.emulated_upd_host_dirty_flags |= upd.dirty_flags
+        upd.dirty_flags |= dirty_flags
+
+    def _update_radio_state_if_dirty(self):
+        if (self.emulated_upd.dirty_flags & decode.UPD_DIRTY_DISPLAY) == 0:
+            return
+        display = bytearray()
+        for address in self.faceplate.VISIBLE_DISPLAY_ADDRESSES:
+            code = self.emulated_upd.display_ram[address]
+            char = self.faceplate.CHARACTERS.get(code)
+            if char is None:
+                display.append(code)
+            else:
+                display += char.encode('latin-1', 'replace')
+        self._parse_display(bytes(display))
+
+    def _parse_display(self, display):
+        try:
+            self.radio.parse(display)
+        except ValueError:
+            pass # unknown displays are ignored
+
+    def _update_faceplate_if_dirty(self):
+        upd = self.emulated_upd
+        if upd.dirty_flags:
+            self._prepare_faceplate_display()
+        if upd.dirty_flags & decode.UPD_DIRTY_DISPLAY:
+            self._write_faceplate_ram(0x40, 0, upd.display_ram)
+        if upd.dirty_flags & decode.UPD_DIRTY_PICTOGRAPH:
+            self._write_faceplate_ram(0x41, 0, upd.pictograph_ram)
+        if upd.dirty_flags & decode.UPD_DIRTY_CHARGEN:
+            for charnum in range(0x10):
+                self._write_faceplate_ram(0x4a, charnum,
+                    upd.chargen_ram[charnum * 7:(charnum + 1) * 7])
+        if upd.dirty_flags & decode.UPD_DIRTY_LED:
+            self._write_faceplate_ram(0x4b, 0, upd.led_ram)
+
+    def _prepare_faceplate_display(self):
+        self.faceplate_upd.process([0x04]) # display setting command
+        self.faceplate_upd.process([0xcf]) # status command
+
+    def _write_faceplate_ram(self, data_setting_cmd, address, data):
+        self.faceplate_upd.process([data_setting_cmd])
+        self.faceplate_upd.process(bytearray([0x80 + address]) + data)
+
+    # Commands ================================================================
+
+    def _do_set_led(self, cmd):
+        if len(cmd) != 3:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        led_num, led_state = cmd[1], cmd[2]
+        if led_num not in (LED_GREEN, LED_RED):
+            return _empty_reply(ERROR_BAD_ARGS_VALUE)
+        self.leds[led_num] = int(bool(led_state))
+        return _empty_reply(ERROR_OK)
+
+    def _do_echo(self, cmd):
+        return _reply(ERROR_OK, cmd[1:])
+
+    def _do_set_run_mode(self, cmd):
+        if len(cmd) != 2:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        if cmd[1] not in (RUN_MODE_RUNNING, RUN_MODE_STOPPED):
+            return _empty_reply(ERROR_BAD_ARGS_VALUE)
+        self.run_mode = cmd[1]
+        return _empty_reply(ERROR_OK)
+
+    def _do_set_auto_display_passthru(self, cmd):
+        if len(cmd) != 2:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        if cmd[1] not in (0, 1):
+            return _empty_reply(ERROR_BAD_ARGS_VALUE)
+        self.auto_display_passthru = bool(cmd[1])
+        # returning control of the faceplate to the emulated upd forces
+        # an update of the faceplate
+        if self.auto_display_passthru:
+            self.emulated_upd.dirty_flags = (decode.UPD_DIRTY_DISPLAY |
+                                             decode.UPD_DIRTY_PICTOGRAPH |
+                                             decode.UPD_DIRTY_CHARGEN)
+        return _empty_reply(ERROR_OK)
+
+    def _do_set_auto_key_passthru(self, cmd):
+        if len(cmd) != 2:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        if cmd[1] not in (0, 1):
+            return _empty_reply(ERROR_BAD_ARGS_VALUE)
+        self.auto_key_passthru = bool(cmd[1])
+        return _empty_reply(ERROR_OK)
+
+    def _do_radio_state_dump(self, cmd):
+        if len(cmd) != 1:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        r = self.radio
+        data = RADIO_STATE.pack(
+            r.operation_mode, r.display_mode, r.safe_tries, r.safe_code,
+            r.sound_bass, r.sound_treble, r.sound_midrange,
+            r.sound_balance, r.sound_fade, r.tape_side, r.cd_disc,
+            r.cd_track, r.cd_track_pos, r.tuner_freq, r.tuner_preset,
+            r.tuner_band,
+            bytes(11), # radio_state.display is never set by the firmware
+            r.option_on_vol, r.option_cd_mix, r.option_tape_skip,
+            r.test_fern, r.test_rad, r.test_ver, r.test_signal_freq,
+            r.test_signal_strength)
+        return _reply(ERROR_OK, data)
+
+    def _do_radio_state_parse(self, cmd):
+        display = cmd[1:]
+        if (len(display) < 11) or (len(display) > len(self.emulated_upd.display_ram)):
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        self._parse_display(display[:11])
+        return _empty_reply(ERROR_OK)
+
+    def _do_radio_state_reset(self, cmd):
+        if len(cmd) != 1:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        self.radio = radios.Radio()
+        return _empty_reply(ERROR_OK)
+
+    def _do_emulated_upd_dump_state(self, cmd):
+        return self._dump_upd_state(cmd, self.emulated_upd)
+
+    def _do_emulated_upd_send_command(self, cmd):
+        if len(cmd) - 1 > MAX_SPI_COMMAND_SIZE:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        self._process_emulated_upd_command(cmd[1:])
+        return _empty_reply(ERROR_OK)
+
+    def _do_emulated_upd_reset(self, cmd):
+        if len(cmd) != 1:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        self.emulated_upd = decode.Upd16432b(verbose=False)
+        self.emulated_upd_host_dirty_flags = UPD_DIRTY_NONE
+        return _empty_reply(ERROR_OK)
+
+    def _do_emulated_upd_load_key_data(self, cmd):
+        if len(cmd) != 5:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        # loaded data would be immediately overwritten by passthru
+        if self.auto_key_passthru:
+            return _empty_reply(ERROR_BLOCKED_BY_PASSTHRU)
+        self.upd_tx_key_data[:] = cmd[1:5]
+        return _empty_reply(ERROR_OK)
+
+    def _do_emulated_upd_read_display_changes(self, cmd):
+        if len(cmd) != 1:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        dirty_flags = self.emulated_upd_host_dirty_flags
+        self.emulated_upd_host_dirty_flags = UPD_DIRTY_NONE
+        data = bytearray([dirty_flags])
+        if dirty_flags & UPD_DIRTY_DISPLAY:
+            data += self.emulated_upd.display_ram
+        return _reply(ERROR_OK, data)
+
+    def _do_faceplate_upd_dump_state(self, cmd):
+        return self._dump_upd_state(cmd, self.faceplate_upd)
+
+    def _do_faceplate_upd_send_command(self, cmd):
+        if len(cmd) - 1 > MAX_SPI_COMMAND_SIZE:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        if len(cmd) > 1:
+            self.faceplate_upd.process(cmd[1:])
+        return _empty_reply(ERROR_OK)
+
+    def _do_faceplate_upd_clear_display(self, cmd):
+        if len(cmd) != 1:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        self._prepare_faceplate_display()
+        self._write_faceplate_ram(0x41, 0, bytearray(8))
+        self._write_faceplate_ram(0x40, 0, bytearray(b' ' * 0x19))
+        return _empty_reply(ERROR_OK)
+
+    def _do_faceplate_upd_read_key_data(self, cmd):
+        if len(cmd) != 1:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        return _reply(ERROR_OK, self.faceplate_key_data)
+
+    def _do_convert_upd_key_data_to_codes(self, cmd):
+        if len(cmd) != 5:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        codes = self._decode(cmd[1:], self.faceplate.KEYS, 2)
+        return _reply(ERROR_OK, [len(codes)] + codes + [0] * (2 - len(codes)))
+
+    def _do_convert_code_to_upd_key_data(self, cmd):
+        if len(cmd) != 2:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        key_data = self._encode_key(cmd[1])
+        if key_data is None:
+            return _empty_reply(ERROR_BAD_ARGS_VALUE)
+        return _reply(ERROR_OK, key_data)
+
+    def _do_convert_upd_pictograph_data_to_codes(self, cmd):
+        if len(cmd) != 9:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        codes = self._decode(cmd[1:], self.faceplate.PICTOGRAPHS, 7)
+        return _reply(ERROR_OK, [len(codes)] + codes + [0] * (7 - len(codes)))
+
+    def _do_convert_code_to_upd_pictograph_data(self, cmd):
+        if len(cmd) != 2:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        byte_bit = self._pictograph_byte_bits.get(cmd[1])
+        if byte_bit is None:
+            return _empty_reply(ERROR_BAD_ARGS_VALUE)
+        pictograph_data = [0] * 8
+        bytenum, bitnum = byte_bit
+        pictograph_data[bytenum] |= 1 << bitnum
+        return _reply(ERROR_OK, pictograph_data)
+
+    def _do_read_keys(self, cmd):
+        if len(cmd) != 1:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        codes = self._decode(self.faceplate_key_data, self.faceplate.KEYS, 2)
+        return _reply(ERROR_OK, [len(codes)] + codes + [0] * (2 - len(codes)))
+
+    def _do_load_keys(self, cmd):
+        if len(cmd) != 4:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        # loaded data would be immediately overwritten by passthru
+        if self.auto_key_passthru:
+            return _empty_reply(ERROR_BLOCKED_BY_PASSTHRU)
+        num_pressed = cmd[1]
+        if num_pressed > 2:
+            return _empty_reply(ERROR_BAD_ARGS_VALUE)
+        key_data = [0, 0, 0, 0]
+        for key_code in cmd[2:2+num_pressed]:
+            one_key_data = self._encode_key(key_code)
+            if one_key_data is None:
+                return _empty_reply(ERROR_BAD_ARGS_VALUE)
+            key_data = [ a | b for a, b in zip(key_data, one_key_data) ]
+        self.upd_tx_key_data[:] = bytearray(key_data)
+        return _empty_reply(ERROR_OK)
+
+    def _do_hit_keys(self, cmd):
+        if not (6 <= len(cmd) <= 6 + HIT_KEYS_MAX_KEYS):
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        # key data would be immediately overwritten by passthru
+        if self.auto_key_passthru:
+            return _empty_reply(ERROR_BLOCKED_BY_PASSTHRU)
+        self._service_hit_keys()
+        key_codes = cmd[6:]
+        if key_codes:
+            if self._hits:
+                return _empty_reply(ERROR_BUSY)
+            press_secs = (cmd[1] + (cmd[2] << 8)) / 1000.0
+            release_secs = (cmd[3] + (cmd[4] << 8)) / 1000.0
+            repeat = cmd[5]
+            if repeat == 0:
+                return _empty_reply(ERROR_BAD_ARGS_VALUE)
+            key_datas = [ self._encode_key(key_code) for key_code in key_codes ]
+            if None in key_datas:
+                return _empty_reply(ERROR_BAD_ARGS_VALUE)
+
+            press_time = time.monotonic()
+            for key_data in key_datas:
+                for i in range(repeat):
+                    release_time = press_time + press_secs
+                    end_time = release_time + release_secs
+                    self._hits.append((press_time, release_time, end_time,
+                                       bytearray(key_data)))
+                    press_time = end_time
+            self._service_hit_keys()
+        return _reply(ERROR_OK, [int(bool(self._hits))])
+
+    def _dump_upd_state(self, cmd, upd):
+        if len(cmd) != 1:
+            return _empty_reply(ERROR_BAD_ARGS_LENGTH)
+        ram_areas = ((upd.display_ram, UPD_RAM_DISPLAY),
+                     (upd.pictograph_ram, UPD_RAM_PICTOGRAPH),
+                     (upd.chargen_ram, UPD_RAM_CHARGEN),
+                     (upd.led_ram, UPD_RAM_LED))
+        ram_area, ram_size = UPD_RAM_NONE, 0
+        for ram, area in ram_areas:
+            if upd.current_ram is ram:
+                ram_area, ram_size = area, len(ram)
+        data = bytearray([ram_area, ram_size, upd.address,
+                          int(upd.increment), upd.dirty_flags])
+        data += (upd.display_ram + upd.pictograph_ram + upd.chargen_ram +
+                 upd.led_ram)
+        return _reply(ERROR_OK, data)
+
+    def _encode_key(self, key_code):
+        try:
+            return list(self.faceplate.encode_keys([key_code]))
+        except ValueError: # key code not found
+            return None
+
+    def _decode(self, data, byte_bits, max_codes):
+        '''Decode uPD16432B key or pictograph data to at most +max_codes+
+        codes in the order the firmware finds them'''
+        codes = []
+        for bytenum, byte in enumerate(data):
+            for bitnum in range(8):
+                if byte & (1 << bitnum):
+                    code = byte_bits.get((bytenum, bitnum))
+                    if (code is not None) and (len(codes) < max_codes):
+                        codes.append(code)
+        return codes
+
+
+def _reply(error_code, data=()):
+    data = bytearray([error_code]) + bytearray(data)
+    return bytearray([len(data)]) + data
+
+def _empty_reply(error_code):
+    return _reply(error_code)
+
+
+class SimulatedSerial(object):
+    '''An in-memory serial port connected to a SimulatedAvr.  It has the
+    parts of the serial.Serial interface used by avrclient.Client.'''
+
+    def __init__(self, avr=None):
+        if avr is None:
+            avr = SimulatedAvr()
+        self.avr = avr
+        self.timeout = 2
+        self._rx = bytearray()
+
+    def write(self, data):
+        self._rx += self.avr.receive(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    @property
+    def in_waiting(self):
+        return len(self._rx)
+
+    def read(self, size=1):
+        data, self._rx = self._rx[:size], self._rx[size:]
+        return bytes(data)
+
+    def close(self):
+        pass
+
+
+def open_pty(avr=None):
+    '''Serve a SimulatedAvr on a new pty from a daemon thread and return
+    the name of the pty device to open as a serial port'''
+    if avr is None:
+        avr = SimulatedAvr()
+    master_fd, slave_fd = os.openpty()
+    tty.setraw(slave_fd)
+    name = os.ttyname(slave_fd)
+
+    def serve():
+        while True:
+            try:
+                data = os.read(master_fd, 256)
+            except OSError: # closed
+                break
+            if not data:
+                break
+            replies = avr.receive(data)
+            if replies:
+                os.write(master_fd, replies)
+
+    thread = threading.Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+    return name
+
+
+def main():
+    name = open_pty()
+    sys.stdout.write("Simulated AVR on %s\n" % name)
+    sys.stdout.write("Use it with: export AVR_SERIAL_PORT=%s\n" % name)
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
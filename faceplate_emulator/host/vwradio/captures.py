@@ -0,0 +1,258 @@
+'''Reads logic analyzer captures.
+
+Captures are exported from the logic analyzer as CSV files (optionally
+gzipped) with a timestamp column followed by one column per channel.  They
+can be converted to a compact binary format (.vwcap) that is much faster
+to read.  A .vwcap file is laid out as:
+
+  header     HEADER struct: magic, version, time exponent, number of
+             channels, number of samples, timestamp of the first sample
+  names      for each channel: length byte, name encoded as utf-8,
+             padded with zeros to a multiple of 4 bytes
+  deltas     for each sample: uint32 ticks since the previous sample
+  channels   for each channel: one bit per sample, packed MSB first,
+             padded with zeros to a whole byte
+
+Timestamps are in ticks of 10**exponent seconds.  All numbers are little
+endian.  The file is memory mapped when read.
+'''
+
+import array
+import csv
+import gzip
+import itertools
+import mmap
+import struct
+import sys
+
+try:
+    import numpy
+except ImportError: # optional, speeds up reading captures
+    numpy = None
+
+MAGIC = b'VWCAPTUR'
+VERSION = 1
+HEADER = struct.Struct('<8sHbxIQq')
+MAX_DELTA = 0xFFFFFFFF
+FINEST_EXPONENT = -9 # nanoseconds
+EXTENSIONS = ('.csv', '.csv.gz', '.vwcap')
+
+
+def read_rows(filename, names):
+    '''Read a capture (.csv, .csv.gz, or .vwcap) and yield a tuple of ints
+    for each sample with the values of the channels named in +names+.
+    Samples are read as the file is decompressed, so memory use does not
+    depend on the size of the capture.'''
+    if is_binary_capture(filename):
+        with BinaryCapture(filename) as capture:
+            for row in capture.read_rows(names):
+                yield row
+    else:
+        with _open_csv(filename) as f:
+            columns = _find_columns(f, names)
+            for row in csv.reader(f):
+                yield tuple([ int(row[column]) for column in columns ])
+
+
+def read_chunks(filename, names, chunk_size):
+    '''Read a capture like read_rows but yield NumPy arrays of up to
+    +chunk_size+ samples, one column per name.  Requires NumPy.'''
+    if is_binary_capture(filename):
+        with BinaryCapture(filename) as capture:
+            for chunk in capture.read_chunks(names, chunk_size):
+                yield chunk
+    else:
+        with _open_csv(filename) as f:
+            columns = _find_columns(f, names)
+            while True:
+                lines = list(itertools.islice(f, chunk_size))
+                if not lines:
+                    break
+                yield numpy.loadtxt(lines, delimiter=',', usecols=columns,
+                                    dtype=numpy.int8, ndmin=2)
+
+
+def is_binary_capture(filename):
+    return filename.endswith('.vwcap')
+
+
+class BinaryCapture(object):
+    '''A capture in the .vwcap format, memory mapped for reading'''
+
+    def __init__(self, filename):
+        self._file = open(filename, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        except ValueError: # empty file cannot be mapped
+            self._file.close()
+            raise ValueError("Not a binary capture: %r" % filename)
+        try:
+            self._parse(filename)
+        except Exception:
+            self.close()
+            raise
+
+    def _parse(self, filename):
+        if len(self._mmap) < HEADER.size:
+            raise ValueError("Not a binary capture: %r" % filename)
+        (magic, version, self.exponent, num_channels, self.num_samples,
+            self.first_tick) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a binary capture: %r" % filename)
+        if version != VERSION:
+            raise ValueError("Unsupported binary capture version %d: %r" %
+                (version, filename))
+
+        offset = HEADER.size
+        self.channel_names = []
+        for i in range(num_channels):
+            length = self._mmap[offset]
+            name = self._mmap[offset+1:offset+1+length]
+            self.channel_names.append(name.decode('utf-8'))
+            offset += 1 + length
+        offset = _pad4(offset)
+
+        self._deltas_offset = offset
+        offset += self.num_samples * 4
+        self._plane_size = (self.num_samples + 7) // 8
+        self._planes_offset = offset
+        offset += self._plane_size * num_channels
+        if len(self._mmap) != offset:
+            raise ValueError("Truncated binary capture: %r" % filename)
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def resolution(self):
+        '''Seconds per tick'''
+        return 10 ** self.exponent
+
+    def read_timestamps(self):
+        '''Yield the timestamp of each sample in seconds'''
+        deltas = memoryview(self._mmap)[
+            self._deltas_offset:self._deltas_offset + (self.num_samples * 4)]
+        tick = self.first_tick
+        try:
+            for delta, in struct.iter_unpack('<I', deltas):
+                tick += delta
+                yield tick * self.resolution
+        finally:
+            deltas.release()
+
+    def read_rows(self, names):
+        '''Yield a tuple of ints for each sample with the values of the
+        channels named in +names+'''
+        planes = [ self._read_plane(name) for name in names ]
+        for i in range(self.num_samples):
+            index, shift = i >> 3, 7 - (i & 7)
+            yield tuple([ (plane[index] >> shift) & 1 for plane in planes ])
+
+    def read_chunks(self, names, chunk_size):
+        '''Yield NumPy arrays of up to +chunk_size+ samples, one column
+        per name.  Requires NumPy.'''
+        chunk_bytes = max(1, chunk_size // 8)
+        offsets = [ self._plane_offset(name) for name in names ]
+        for start in range(0, self._plane_size, chunk_bytes):
+            count = min(chunk_bytes, self._plane_size - start)
+            num_samples = min(count * 8, self.num_samples - (start * 8))
+            columns = [ numpy.unpackbits(numpy.frombuffer(self._mmap,
+                            numpy.uint8, count, offset + start))[:num_samples]
+                        for offset in offsets ]
+            yield numpy.stack(columns, axis=1).astype(numpy.int8)
+
+    def _read_plane(self, name):
+        offset = self._plane_offset(name)
+        return self._mmap[offset:offset + self._plane_size]
+
+    def _plane_offset(self, name):
+        index = self.channel_names.index(name)
+        return self._planes_offset + (index * self._plane_size)
+
+
+def convert(csv_filename, binary_filename):
+    '''Convert a capture from the logic analyzer's CSV format to the
+    binary format.  The CSV file is read twice: first to find the number
+    of samples and the time resolution, then to convert it.'''
+    num_samples = 0
+    max_delta = 0.0
+    last_time = None
+    with _open_csv(csv_filename) as f:
+        names = [ col.strip() for col in f.readline().split(',') ][1:]
+        for row in csv.reader(f):
+            time = float(row[0])
+            if last_time is not None:
+                if time < last_time:
+                    raise ValueError("Timestamps not in order at sample %d" %
+                        num_samples)
+                max_delta = max(max_delta, time - last_time)
+            last_time = time
+            num_samples += 1
+
+    # use the finest resolution where every delta fits
+    exponent = FINEST_EXPONENT
+    while (max_delta / (10 ** exponent)) + 1 > MAX_DELTA:
+        exponent += 1
+    ticks_per_second = 10 ** -exponent
+
+    planes = [ bytearray((num_samples + 7) // 8) for name in names ]
+    deltas = array.array('I')
+
+    with _open_csv(csv_filename) as f:
+        f.readline()
+        first_tick = None
+        last_tick = None
+        for i, row in enumerate(csv.reader(f)):
+            tick = int(round(float(row[0]) * ticks_per_second))
+            if first_tick is None:
+                first_tick = last_tick = tick
+            deltas.append(tick - last_tick)
+            last_tick = tick
+
+            index, bit = i >> 3, 0x80 >> (i & 7)
+            for plane, value in zip(planes, row[1:]):
+                value = int(value)
+                if value == 1:
+                    plane[index] |= bit
+                elif value != 0:
+                    raise ValueError("Sample %d is not 0 or 1: %r" % (i, row))
+
+    if sys.byteorder != 'little':
+        deltas.byteswap()
+
+    with open(binary_filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, exponent, len(names),
+                            num_samples, first_tick or 0))
+        encoded_names = bytearray()
+        for name in names:
+            encoded = name.encode('utf-8')[:0xFF]
+            encoded_names += bytearray([len(encoded)]) + encoded
+        padding = _pad4(HEADER.size + len(encoded_names))
+        padding -= (HEADER.size + len(encoded_names))
+        f.write(encoded_names + bytearray(padding))
+        f.write(deltas.tobytes())
+        for plane in planes:
+            f.write(plane)
+
+
+def _pad4(offset):
+    return (offset + 3) & ~3
+
+
+def _open_csv(filename):
+    opener = gzip.open if filename.endswith('.gz') else open
+    return opener(filename, 'rt', encoding='utf-8', newline='')
+
+
+def _find_columns(f, names):
+    '''Read the heading line and return the column indexes of +names+'''
+    headings = [ col.strip() for col in f.readline().split(',') ]
+    return [ headings.index(name) for name in names ]
@@ -1,12 +1,20 @@
 
-class Enum(object):
+class _EnumMeta(type):
+    '''Builds an index of an Enum subclass's values to their names when
+    the class is created so get_name doesn't have to search for them'''
+    def __init__(klass, name, bases, namespace):
+        super(_EnumMeta, klass).__init__(name, bases, namespace)
+        klass._NAMES = {}
+        for k, v in namespace.items():
+            if isinstance(v, int) and not k.startswith('_'):
+                klass._NAMES.setdefault(v, k)
+
+
+class Enum(object, metaclass=_EnumMeta):
     '''Abstract'''
     @classmethod
     def get_name(klass, value):
-        for k, v in klass.__dict__.items():
-            if v == value:
-                return k
-        return None
+        return klass._NAMES.get(value)
 
 class OperationModes(Enum):
     UNKNOWN = 0
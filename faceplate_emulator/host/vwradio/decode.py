@@ -1,18 +1,38 @@
 # -*- coding: utf-8 -*-
 
-import csv
-import gzip
+import collections
+import hashlib
+import multiprocessing
+import os
+import struct
 import sys
+from vwradio import captures
 from vwradio import faceplates
+from vwradio.avrclient import (UPD_DIRTY_NONE, UPD_DIRTY_DISPLAY,
+    UPD_DIRTY_PICTOGRAPH, UPD_DIRTY_CHARGEN, UPD_DIRTY_LED)
+
+try:
+    import numpy
+except ImportError: # optional, speeds up decoding analyzer captures
+    numpy = None
+
+# RAM area dirty flags in addition to the UPD_DIRTY_* from the AVR firmware
+UPD_DIRTY_KEY_DATA = 1<<4 # not in the firmware, which never writes key data
+UPD_DIRTY_ALL = (UPD_DIRTY_DISPLAY | UPD_DIRTY_PICTOGRAPH | UPD_DIRTY_CHARGEN |
+                 UPD_DIRTY_LED | UPD_DIRTY_KEY_DATA)
 
 class Upd16432b(object):
     '''Emulates the NEC uPD16432B.  Processes SPI command packets
     and updates internal RAM areas as the uPD16432B would.'''
 
-    def __init__(self, stdout=None):
+    def __init__(self, stdout=None, verbose=True):
+        '''+stdout+ receives a trace of each command processed.  If
+        +verbose+ is false, nothing is traced and the trace text is never
+        built, which is much faster when only the RAM state is needed.'''
         if stdout is None:
             stdout = sys.stdout
         self.stdout = stdout
+        self.verbose = verbose
 
         self.display_ram = bytearray(0x19)
         self.pictograph_ram = bytearray(0x08)
@@ -21,15 +41,18 @@ class Upd16432b(object):
         self.key_data_ram = bytearray(4)
 
         self.current_ram = None
+        self.current_dirty_flag = UPD_DIRTY_NONE
         self.address = 0
         self.increment = False
+        self.dirty_flags = UPD_DIRTY_NONE # bitfield of RAM areas changed
 
     def process(self, spi_command):
         '''Process an SPI command packet, which is an arbitrary number of
         bytes received while the uPD16432B was selected with STB.  The
         first byte is the command, any successive bytes are data.'''
         spi_command = bytearray(spi_command)
-        self._print_spi_command(spi_command)
+        if self.verbose:
+            self._print_spi_command(spi_command)
 
         # No SPI bytes were received while STB was asserted
         if len(spi_command) == 0:
@@ -52,7 +75,9 @@ class Upd16432b(object):
         # Process data bytes
         if self.current_ram is not None:
             for byte in spi_command[1:]:
-                self.current_ram[self.address] = byte
+                if self.current_ram[self.address] != byte:
+                    self.current_ram[self.address] = byte
+                    self.dirty_flags |= self.current_dirty_flag
 
                 if self.increment:
                     self.address += 1
@@ -64,6 +89,8 @@ class Upd16432b(object):
                 self.address = 0
 
     def _process_display_setting(self, spi_command):
+        if not self.verbose:
+            return # only traced, does not change any state
         self._print("    Display Setting Command")
         cmd = spi_command[0]
 
@@ -89,21 +116,27 @@ class Upd16432b(object):
         if mode == 0:
             self._print("    0=Write to display RAM")
             self.current_ram = self.display_ram
+            self.current_dirty_flag = UPD_DIRTY_DISPLAY
         elif mode == 1:
             self._print("    1=Write to pictograph RAM")
             self.current_ram = self.pictograph_ram
+            self.current_dirty_flag = UPD_DIRTY_PICTOGRAPH
         elif mode == 2:
             self._print("    2=Write to chargen ram")
             self.current_ram = self.chargen_ram
+            self.current_dirty_flag = UPD_DIRTY_CHARGEN
         elif mode == 3:
             self._print("    3=Write to LED output latch")
             self.current_ram = self.led_ram
+            self.current_dirty_flag = UPD_DIRTY_LED
         elif mode == 4:
             self._print("    4=Read key data")
             self.current_ram = self.key_data_ram
+            self.current_dirty_flag = UPD_DIRTY_KEY_DATA
         else: # Unknown mode
             self._print("    ? Unknown mode ?")
             self.current_ram = None
+            self.current_dirty_flag = UPD_DIRTY_NONE
 
         if mode in (0, 1):
             # display ram or pictograph support increment flag
@@ -124,7 +157,8 @@ class Upd16432b(object):
         self._print("  Address Setting Command")
         cmd = spi_command[0]
         address = cmd & 0b00011111
-        self._print("    Address = %02x" % address)
+        if self.verbose:
+            self._print("    Address = %02x" % address)
 
         if self.current_ram is self.chargen_ram:
             # for chargen, address is character number (valid from 0 to 0x0F)
@@ -139,6 +173,8 @@ class Upd16432b(object):
             self.address = 0 # unknown ram area
 
     def _process_status(self, spi_command):
+        if not self.verbose:
+            return # only traced, does not change any state
         self._print("  Status command")
         cmd = spi_command[0]
         if (cmd & 32) == 0:
@@ -193,7 +229,8 @@ class Upd16432b(object):
             self._print(line)
 
     def _print(self, text):
-        self.stdout.write('%s\n' % text)
+        if self.verbose:
+            self.stdout.write('%s\n' % text)
 
 
 class Visualizer(object):
@@ -201,66 +238,125 @@ class Visualizer(object):
     uPD16432B emulator, then uses knowledge of the faceplate to draw what the
     faceplate would display.'''
 
-    def __init__(self, upd, faceplate):
+    def __init__(self, upd, faceplate, stdout=None, diff=False):
         '''+upd+ is a Upd16432b instance, which is a generic emulator that
         interprets commands and tracks state but does not have any details of
         a particular faceplate implementation such has how the LCD matrix or
         keys are wired.  +faceplate+ is a Faceplate instance, which provides
-        those details.'''
+        those details.  +stdout+ receives the visualization.  If +diff+ is
+        true, print_state prints only what changed since the last call.'''
+        if stdout is None:
+            stdout = sys.stdout
+        self.stdout = stdout
         self.upd = upd
         self.faceplate = faceplate
+        self.diff = diff
+        self._unprinted_flags = UPD_DIRTY_ALL # everything on the first call
+        self._printed_decodes = {}
+        self._chargen_data = [None] * 0x10
+        self._chargen_glyphs = [None] * 0x10
 
     def print_state(self):
+        '''Print the RAM areas of the uPD16432B, draw them, and decode them.
+        In diff mode, only the RAM areas flagged as dirty by the uPD16432B
+        and the decoded fields that changed since the last call are printed,
+        and the dirty flags are cleared.  Returns true if anything printed.'''
+        if self.diff:
+            dirty_flags = self.upd.dirty_flags | self._unprinted_flags
+            self.upd.dirty_flags = UPD_DIRTY_NONE
+            self._unprinted_flags = UPD_DIRTY_NONE
+        else:
+            dirty_flags = UPD_DIRTY_ALL
+        printed = False
+
         # dump ram as hex
-        self._print('Key Data RAM: ' + _hexdump(self.upd.key_data_ram))
-        self._print('Chargen RAM: ' + _hexdump(self.upd.chargen_ram))
-        self._print('Pictograph RAM: ' + _hexdump(self.upd.pictograph_ram))
-        self._print('Display RAM: ' + _hexdump(self.upd.display_ram))
-        self._print('LED Output Latch: 0x%02x' % self.upd.led_ram[0])
+        dumps = (
+            (UPD_DIRTY_KEY_DATA, 'Key Data RAM', self.upd.key_data_ram),
+            (UPD_DIRTY_CHARGEN, 'Chargen RAM', self.upd.chargen_ram),
+            (UPD_DIRTY_PICTOGRAPH, 'Pictograph RAM', self.upd.pictograph_ram),
+            (UPD_DIRTY_DISPLAY, 'Display RAM', self.upd.display_ram),
+            )
+        for flag, title, ram in dumps:
+            if dirty_flags & flag:
+                self._print('%s: %s' % (title, _hexdump(ram)))
+                printed = True
+        if dirty_flags & UPD_DIRTY_LED:
+            self._print('LED Output Latch: 0x%02x' % self.upd.led_ram[0])
+            printed = True
 
         # draw characters as bitmaps
-        self._print('Drawn Chargen RAM:')
-        for line in self.draw_chargen_ram():
-            self._print('  ' + line)
-        self._print('Drawn Display RAM:')
-        for line in self.draw_display_ram():
-            self._print('  ' + line)
+        if dirty_flags & UPD_DIRTY_CHARGEN:
+            self._print('Drawn Chargen RAM:')
+            for line in self.draw_chargen_ram():
+                self._print('  ' + line)
+            printed = True
+        if (dirty_flags & UPD_DIRTY_DISPLAY) or (
+                (dirty_flags & UPD_DIRTY_CHARGEN) and self._displays_chargen()):
+            self._print('Drawn Display RAM:')
+            for line in self.draw_display_ram():
+                self._print('  ' + line)
+            printed = True
 
         # decode raw bytes into equivalent ascii, pictograph names, etc.
-        self._print('Decoded Display RAM: %r' % self.decode_display_ram())
-        self._print('Decoded Pictographs: %r' % self.decode_pictograph_names())
-        self._print('Decoded Keys Pressed: %r' % self.decode_key_names())
+        decodes = (
+            (UPD_DIRTY_DISPLAY, 'Decoded Display RAM',
+                self.decode_display_ram),
+            (UPD_DIRTY_PICTOGRAPH, 'Decoded Pictographs',
+                self.decode_pictograph_names),
+            (UPD_DIRTY_KEY_DATA, 'Decoded Keys Pressed',
+                self.decode_key_names),
+            )
+        for flag, title, decode in decodes:
+            if dirty_flags & flag:
+                decoded = decode()
+                if self.diff and (self._printed_decodes.get(title) == decoded):
+                    continue
+                self._print('%s: %r' % (title, decoded))
+                self._printed_decodes[title] = decoded
+                printed = True
+        return printed
+
+    def _displays_chargen(self):
+        '''Returns true if any visible character is from chargen RAM'''
+        for address in self.faceplate.VISIBLE_DISPLAY_ADDRESSES:
+            if self.upd.display_ram[address] < 0x10:
+                return True
+        return False
 
     def draw_display_ram(self):
-        data = []
+        glyphs = []
         for address in self.faceplate.VISIBLE_DISPLAY_ADDRESSES:
             char_code = self.upd.display_ram[address]
-            data.extend(self._read_char_data(char_code))
-        return self._draw_chars(data, self.faceplate.VISIBLE_DISPLAY_ADDRESSES)
+            glyphs.append(self._read_char_glyph(char_code))
+        return self._draw_glyphs(glyphs,
+                                 self.faceplate.VISIBLE_DISPLAY_ADDRESSES)
 
     def draw_chargen_ram(self):
-        return self._draw_chars(self.upd.chargen_ram, range(0x10))
+        return self._draw_glyphs(self._read_chargen_glyphs(), range(0x10))
 
-    def _draw_chars(self, data, addresses):
+    def _draw_glyphs(self, glyphs, addresses):
         heading = ''.join(['0x%02x:  ' % a for a in addresses])
         lines = [heading]
-
         for row in range(7):
-            line = ''
-            for charnum in range(len(addresses)):
-                byte = data[(charnum * 7) + row]
-                line += (format(byte, '#010b')[5:].
-                          replace('0', u'·').replace('1', u'▊') + '  ')
-            lines.append(line)
+            lines.append(''.join([ glyph[row] for glyph in glyphs ]))
         return lines
 
-    def _read_char_data(self, char_code):
+    def _read_char_glyph(self, char_code):
         if char_code < 0x10:
-            charset = self.upd.chargen_ram
-        else:
-            charset = self.faceplate.ROM_CHARSET
-        offset = char_code * 7
-        return charset[offset:offset+7]
+            return self._read_chargen_glyphs()[char_code]
+        return _rom_glyphs(self.faceplate)[char_code]
+
+    def _read_chargen_glyphs(self):
+        '''Returns the glyphs of the 16 programmable characters.  Only the
+        characters whose chargen RAM bytes changed since the last call are
+        drawn again.'''
+        for char_code in range(0x10):
+            offset = char_code * 7
+            data = bytes(self.upd.chargen_ram[offset:offset+7])
+            if self._chargen_data[char_code] != data:
+                self._chargen_data[char_code] = data
+                self._chargen_glyphs[char_code] = _draw_glyph(data)
+        return self._chargen_glyphs
 
     def decode_display_ram(self):
         decoded = ''
@@ -281,14 +377,244 @@ class Visualizer(object):
         return [ self.faceplate.get_key_name(k) for k in keys ]
 
     def _print(self, text):
-        print(text)
+        self.stdout.write('%s\n' % text)
+
+
+# each possible byte of character data drawn as a row of 5 pixels
+_GLYPH_ROWS = tuple([ format(byte, '#010b')[5:].replace('0', u'·').
+                      replace('1', u'▊') + '  ' for byte in range(0x100) ])
+
+def _draw_glyph(data):
+    '''Draw 7 bytes of character data as a tuple of 7 rows'''
+    return tuple([ _GLYPH_ROWS[byte] for byte in data ])
+
+_rom_glyphs_by_faceplate = {}
+
+def _rom_glyphs(faceplate):
+    '''Returns the glyphs of all 256 characters in the faceplate's ROM
+    charset, which are drawn only once per faceplate class'''
+    klass = faceplate.__class__
+    glyphs = _rom_glyphs_by_faceplate.get(klass)
+    if glyphs is None:
+        charset = faceplate.ROM_CHARSET
+        glyphs = tuple([ _draw_glyph(charset[offset:offset+7])
+                         for offset in range(0, 256 * 7, 7) ])
+        _rom_glyphs_by_faceplate[klass] = glyphs
+    return glyphs
 
 
 def _hexdump(list_of_bytes):
     return '[%s]' % ', '.join([ '0x%02x' % x for x in list_of_bytes ])
 
 
-def parse_analyzer_file(filename, emulator, visualizer):
+def parse_analyzer_file(filename, emulator, visualizer, stdout=None,
+                        cache=None):
+    if stdout is None:
+        stdout = sys.stdout
+    for spi_command in read_spi_commands(filename, cache):
+        # process command
+        emulator.process(spi_command)
+        if emulator.verbose:
+            stdout.write('\n')
+        # print state
+        if visualizer.print_state():
+            stdout.write('\n')
+
+
+def parse_analyzer_directory(dirname, outdir, faceplate_class,
+                             processes=None, cache=None, diff=False):
+    '''Decode every capture in +dirname+ using a pool of +processes+
+    worker processes (default: one per CPU).  Each capture is decoded by
+    its own Upd16432b and Visualizer and the output is written to a file
+    in +outdir+ named after it, e.g. "cd-rev.csv.gz" -> "cd-rev.txt".
+    Captures that would get the same name, like "cd-rev.csv" and
+    "cd-rev.vwcap", keep their extensions, e.g. "cd-rev.csv.txt".
+    Returns a list of the output filenames, sorted by capture filename.
+    +cache+ is an optional SpiCommandCache shared by the workers.  If +diff+
+    is true, commands are not traced and only changes are visualized.'''
+    stems = [] # (capture basename, basename without its extension)
+    for basename in sorted(os.listdir(dirname)):
+        for extension in captures.EXTENSIONS:
+            if basename.endswith(extension):
+                stems.append((basename, basename[:-len(extension)]))
+                break
+    stem_counts = collections.Counter([ stem for basename, stem in stems ])
+
+    jobs = []
+    for basename, stem in stems:
+        if stem_counts[stem] > 1:
+            stem = basename
+        jobs.append((os.path.join(dirname, basename),
+                     os.path.join(outdir, stem + '.txt'),
+                     faceplate_class, cache, diff))
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_parse_analyzer_file_job, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _parse_analyzer_file_job(job):
+    filename, outname, faceplate_class, cache, diff = job
+    with open(outname, 'w', encoding='utf-8') as stdout:
+        emulator = Upd16432b(stdout=stdout, verbose=not diff)
+        visualizer = Visualizer(emulator, faceplate_class(), stdout=stdout,
+                                diff=diff)
+        parse_analyzer_file(filename, emulator, visualizer, stdout=stdout,
+                            cache=cache)
+    return outname
+
+
+_CACHE_LENGTH = struct.Struct('<I')
+
+class SpiCommandCache(object):
+    '''On-disk cache of the SPI command packets decoded from captures.
+    Entries are keyed by a hash of the capture's contents, so a capture
+    that is renamed or converted to another format is decoded again but
+    one that is unchanged is not.  When the entries exceed +max_size+
+    bytes, the least recently used ones are deleted.'''
+
+    VERSION = 1 # change if decoding changes to invalidate old entries
+
+    def __init__(self, dirname=None, max_size=256 * 1024 * 1024):
+        if dirname is None:
+            dirname = os.path.join(os.path.expanduser('~'), '.cache',
+                                   'vwradio', 'spi_commands')
+        self.dirname = dirname
+        self.max_size = max_size
+        self._failed = False # True after an error writing the cache
+
+    def make_key(self, filename):
+        sha1 = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(0x10000), b''):
+                sha1.update(block)
+        return 'v%d-%s' % (self.VERSION, sha1.hexdigest())
+
+    def get(self, key):
+        '''Return the list of SPI commands for +key+, or None if the key
+        is not in the cache'''
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path, None) # mark as recently used
+        except OSError: # not cached or evicted by another process
+            return None
+
+        spi_commands = []
+        offset = 0
+        while offset < len(data):
+            length, = _CACHE_LENGTH.unpack_from(data, offset)
+            offset += _CACHE_LENGTH.size
+            spi_commands.append(bytearray(data[offset:offset+length]))
+            offset += length
+        return spi_commands
+
+    def put(self, key, spi_commands):
+        for spi_command in self.filling(key, spi_commands):
+            pass
+
+    def filling(self, key, spi_commands):
+        '''Yield from the iterable +spi_commands+ while writing each one
+        to the cache under +key+, so a long capture is not held in memory.
+        Nothing is cached if the iterable is not read to the end.  If the
+        cache can't be written, a warning is printed once and the commands
+        are still yielded.'''
+        path = self._path(key)
+        tmpname = '%s.%d.tmp' % (path, os.getpid())
+        f = None
+        if not self._failed:
+            try:
+                os.makedirs(self.dirname, exist_ok=True)
+                f = open(tmpname, 'wb')
+            except OSError as exc:
+                self._fail(exc)
+        try:
+            for spi_command in spi_commands:
+                if f is not None:
+                    try:
+                        f.write(_CACHE_LENGTH.pack(len(spi_command)))
+                        f.write(spi_command)
+                    except OSError as exc:
+                        f = self._discard(f, tmpname, exc)
+                yield spi_command
+            if f is not None:
+                try:
+                    f.close()
+                    os.replace(tmpname, path)
+                    self._evict()
+                except OSError as exc:
+                    f = self._discard(f, tmpname, exc)
+        except BaseException: # includes GeneratorExit if closed early
+            if f is not None:
+                self._discard(f, tmpname)
+            raise
+
+    def _discard(self, f, tmpname, exc=None):
+        '''Close and remove a partly written entry.  Returns None.'''
+        for cleanup in (f.close, lambda: os.remove(tmpname)):
+            try:
+                cleanup()
+            except OSError:
+                pass
+        if exc is not None:
+            self._fail(exc)
+
+    def _fail(self, exc):
+        '''Stop using the cache after an error writing it'''
+        if not self._failed:
+            sys.stderr.write("Warning: Not caching SPI commands: %s\n" % exc)
+        self._failed = True
+
+    def _evict(self):
+        entries = []
+        for basename in os.listdir(self.dirname):
+            if basename.endswith('.tmp'): # being written by another process
+                continue
+            path = os.path.join(self.dirname, basename)
+            try:
+                st = os.stat(path)
+            except OSError: # deleted by another process
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total_size = sum([ size for mtime, size, path in entries ])
+        for mtime, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError: # deleted by another process
+                pass
+            total_size -= size
+
+    def _path(self, key):
+        return os.path.join(self.dirname, key)
+
+
+def read_spi_commands(filename, cache=None):
+    '''Read a logic analyzer capture of the uPD16432B SPI bus and return
+    an iterable of SPI command packets (bytearray), one for each time STB
+    was asserted and released.  The NumPy engine is used if NumPy is
+    installed, otherwise each row is decoded in a Python loop.  If +cache+
+    is a SpiCommandCache, it is checked first and filled on a miss.'''
+    if cache is not None:
+        key = cache.make_key(filename)
+        spi_commands = cache.get(key)
+        if spi_commands is not None:
+            return iter(spi_commands)
+        return cache.filling(key, read_spi_commands(filename))
+    if numpy is None:
+        return _read_spi_commands_loop(filename)
+    return _read_spi_commands_numpy(filename)
+
+
+def _read_spi_commands_loop(filename):
     spi_command = bytearray()
     byte = 0
     bit = 0
@@ -296,17 +622,7 @@ def parse_analyzer_file(filename, emulator, visualizer):
     old_stb = 0
     old_clk = 0
 
-    opener = gzip.open if filename.endswith('.gz') else open
-    with opener(filename, 'r') as f:
-        lines = f.read().decode('utf-8').splitlines()
-
-    headings = [ col.strip() for col in lines.pop(0).split(',') ]
-    reader = csv.DictReader(lines, headings)
-
-    for row in reader:
-        stb = int(row['STB'])
-        dat = int(row['DAT'])
-        clk = int(row['CLK'])
+    for stb, dat, clk in captures.read_rows(filename, ('STB', 'DAT', 'CLK')):
 
         # strobe low->high starts session
         if (old_stb == 0) and (stb == 1):
@@ -327,12 +643,7 @@ def parse_analyzer_file(filename, emulator, visualizer):
 
         # strobe high->low ends session
         if (old_stb == 1) and (stb == 0):
-            # process command
-            emulator.process(spi_command)
-            print('')
-            # print state
-            visualizer.print_state()
-            print('')
+            yield spi_command
             # prepare for next comnand
             spi_command = bytearray()
             byte = 0
@@ -342,21 +653,111 @@ def parse_analyzer_file(filename, emulator, visualizer):
         old_clk = clk
 
 
-def main():
-    if len(sys.argv) != 3:
-        sys.stderr.write("Usage: %s <4|5> <filename>\n" % sys.argv[0])
-        sys.exit(1)
+def _read_spi_commands_numpy(filename, chunk_size=0x10000):
+    previous = (0, 0, 0) # stb, dat, clk of the last row of the previous chunk
+    session = None # bits received so far if a session is in progress
+
+    for samples in captures.read_chunks(filename, ('STB', 'DAT', 'CLK'),
+                                        chunk_size):
+        stb, dat, clk = samples.T
 
-    if sys.argv[1] == '4':
-        faceplate = faceplates.Premium4()
+        # strobe low->high starts session, high->low ends session
+        stb_rises = _find_edges(stb, previous[0], 0, 1)
+        stb_falls = _find_edges(stb, previous[0], 1, 0)
+
+        # clock low->high latches data from radio to lcd
+        clk_rises = _find_edges(clk, previous[2], 0, 1)
+        bits = (dat[clk_rises] == 1).astype(numpy.uint8)
+
+        previous = samples[-1].tolist()
+
+        # session continued from the previous chunk
+        if session is not None:
+            if len(stb_falls) == 0: # still in progress after this chunk
+                session = numpy.concatenate((session, bits))
+                continue
+            last = numpy.searchsorted(clk_rises, stb_falls[0], 'right')
+            yield _pack_bits(numpy.concatenate((session, bits[:last])))
+            session = None
+            stb_falls = stb_falls[1:]
+
+        # strobe edges alternate, so each fall now ends the session started
+        # by the rise at the same index.  clock edges on the same rows as
+        # the strobe edges belong to the session.
+        firsts = numpy.searchsorted(clk_rises, stb_rises, 'left')
+        lasts = numpy.searchsorted(clk_rises, stb_falls, 'right')
+        for first, last in zip(firsts.tolist(), lasts.tolist()):
+            yield _pack_bits(bits[first:last])
+
+        # session still in progress at the end of this chunk
+        if len(stb_rises) > len(stb_falls):
+            session = bits[firsts[-1]:]
+
+
+def _pack_bits(bits):
+    '''Pack an array of bits, MSB first, into a bytearray.  An incomplete
+    byte at the end is discarded.'''
+    count = (len(bits) // 8) * 8
+    return bytearray(numpy.packbits(bits[:count]).tobytes())
+
+
+def _find_edges(samples, previous_sample, old, new):
+    '''Return the indexes of the samples that changed from +old+ in the
+    previous sample to +new+.  +previous_sample+ is the sample before the
+    first one.'''
+    previous = numpy.concatenate(([previous_sample], samples[:-1]))
+    return numpy.flatnonzero((previous == old) & (samples == new))
+
+
+def usage():
+    exe = sys.argv[0]
+    sys.stderr.write("Usage: %s [--diff] [--no-cache] <4|5> <filename>\n"
+                     % exe)
+    sys.stderr.write("       %s batch [--diff] [--no-cache] <4|5> "
+                     "<directory> <output directory>\n" % exe)
+    sys.stderr.write("       %s convert <filename.csv[.gz]> "
+                     "<filename.vwcap>\n" % exe)
+    sys.exit(1)
+
+
+def _faceplate_class(arg):
+    if arg == '4':
+        return faceplates.Premium4
     else:
-        faceplate = faceplates.Premium5()
+        return faceplates.Premium5
 
-    filename = sys.argv[2]
 
-    emulator = Upd16432b()
-    visualizer = Visualizer(emulator, faceplate)
-    parse_analyzer_file(filename, emulator, visualizer)
+def main():
+    args = sys.argv[1:]
+    diff = '--diff' in args
+    if diff:
+        args.remove('--diff')
+    no_cache = '--no-cache' in args
+    if no_cache:
+        args.remove('--no-cache')
+    cache = None if no_cache else SpiCommandCache()
+
+    if (len(args) == 3) and (args[0] == 'convert') and not (diff or no_cache):
+        captures.convert(args[1], args[2])
+        return
+    if (len(args) == 4) and (args[0] == 'batch'):
+        faceplate_class = _faceplate_class(args[1])
+        outnames = parse_analyzer_directory(args[2], args[3],
+                                            faceplate_class,
+                                            cache=cache,
+                                            diff=diff)
+        for outname in outnames:
+            sys.stdout.write("%s\n" % outname)
+        return
+    if len(args) != 2:
+        usage()
+
+    faceplate = _faceplate_class(args[0])()
+    filename = args[1]
+
+    emulator = Upd16432b(verbose=not diff)
+    visualizer = Visualizer(emulator, faceplate, diff=diff)
+    parse_analyzer_file(filename, emulator, visualizer, cache=cache)
 
 
 if __name__ == '__main__':
@@ -3,7 +3,72 @@ from vwradio import charsets
 from vwradio.constants import Keys, Pictographs
 
 
-class Faceplate(object):
+class _FaceplateMeta(type):
+    '''Builds reverse indexes of a Faceplate subclass's tables when the
+    class is created so they don't have to be searched on every call'''
+    def __init__(klass, name, bases, namespace):
+        super(_FaceplateMeta, klass).__init__(name, bases, namespace)
+        # Keys.* as key, uPD16432B byte/bit as value
+        klass._KEY_BYTE_BITS = {}
+        for byte_bit, key in klass.KEYS.items():
+            klass._KEY_BYTE_BITS.setdefault(key, byte_bit)
+        # ASCII char as key, first equiv uPD16432B byte as value
+        klass._CHAR_CODES = {}
+        for code, char in klass.CHARACTERS.items():
+            klass._CHAR_CODES.setdefault(char, code)
+        # uPD16432B byte position and value as indexes, Keys.* as values
+        klass._KEY_DECODE_TABLES = _build_decode_tables(klass.KEYS, 4)
+        # uPD16432B byte position and value as indexes, Pictographs.* as values
+        klass._PICTOGRAPH_DECODE_TABLES = _build_decode_tables(
+            klass.PICTOGRAPHS, 8)
+
+
+def _build_decode_tables(byte_bits, num_bytes):
+    '''Build a table for each byte position that has an entry for each
+    of the 256 possible values of the byte.  The entry is a tuple of the
+    things (Keys.*, Pictographs.*) set by the bits in that value, in bit
+    order.  If any bit does not map to a thing, the entry is instead the
+    number of the lowest such bit.'''
+    tables = []
+    for bytenum in range(num_bytes):
+        table = []
+        for byte in range(0x100):
+            things = []
+            for bitnum in range(8):
+                if byte & (2**bitnum):
+                    thing = byte_bits.get((bytenum, bitnum))
+                    if thing is None:
+                        things = bitnum
+                        break
+                    things.append(thing)
+            if isinstance(things, list):
+                things = tuple(things)
+            table.append(things)
+        tables.append(tuple(table))
+    return tuple(tables)
+
+
+def _decode_bytes(data, tables, description):
+    decoded = []
+    for bytenum, byte in enumerate(data):
+        if bytenum < len(tables):
+            things = tables[bytenum][byte]
+        elif byte == 0:
+            things = ()
+        else: # no bits are known past the end of the tables
+            things = _lowest_bitnum(byte)
+        if isinstance(things, int):
+            msg = 'Unrecognized %s at byte %d, bit %d'
+            raise ValueError(msg % (description, bytenum, things))
+        decoded.extend(things)
+    return decoded
+
+
+def _lowest_bitnum(byte):
+    return (byte & -byte).bit_length() - 1
+
+
+class Faceplate(object, metaclass=_FaceplateMeta):
     '''Abstract'''
     # uPD16432B display RAM addresses visible on screen in left-to-right order
     VISIBLE_DISPLAY_ADDRESSES = ()
@@ -21,30 +86,17 @@ class Faceplate(object):
         uPD16432B key scan data.  Encode an empty list for no keys pressed.'''
         key_data = [0, 0, 0, 0]
         for key_pressed in keys_pressed:
-            found = False
-            for byte_bit, key in self.KEYS.items():
-                if key == key_pressed:
-                    bytenum, bitnum = byte_bit
-                    key_data[bytenum] |= (2**bitnum)
-                    found = True
-                    break
-            if not found:
+            byte_bit = self._KEY_BYTE_BITS.get(key_pressed)
+            if byte_bit is None:
                 raise ValueError('Key %d not found' % key_pressed)
+            bytenum, bitnum = byte_bit
+            key_data[bytenum] |= (2**bitnum)
         return tuple(key_data)
 
     def decode_keys(self, key_data, as_names=False):
         '''Decode four bytes of uPD16432B key scan data to a list of
         keys (Keys.*) pressed, or an empty list if nothing pressed'''
-        keys = []
-        for bytenum, byte in enumerate(key_data):
-            for bitnum in range(8):
-                if byte & (2**bitnum):
-                    key = self.KEYS.get((bytenum, bitnum))
-                    if key is None:
-                        msg = 'Unrecognized key at byte %d, bit %d'
-                        raise ValueError(msg % (bytenum, bitnum))
-                    keys.append(key)
-        return keys
+        return _decode_bytes(key_data, self._KEY_DECODE_TABLES, 'key')
 
     def get_key_name(self, key):
         '''Get the string name of a key from a Keys.* constant'''
@@ -53,16 +105,8 @@ class Faceplate(object):
     def decode_pictographs(self, pictograph_data):
         '''Decode eight bytes of uPD16432B pictograph data to a list of
         pictographs (Pictographs.*) displayed, or an empty list if none.'''
-        pictographs = []
-        for bytenum, byte in enumerate(pictograph_data):
-            for bitnum in range(8):
-                if byte & (2**bitnum):
-                    pictograph = self.PICTOGRAPHS.get((bytenum, bitnum))
-                    if pictograph is None:
-                        msg = 'Unrecognized pictograph at byte %d, bit %d'
-                        raise ValueError(msg % (bytenum, bitnum))
-                    pictographs.append(pictograph)
-        return pictographs
+        return _decode_bytes(pictograph_data, self._PICTOGRAPH_DECODE_TABLES,
+                             'pictograph')
 
     def get_pictograph_name(self, pictograph):
         '''Get the string name of a pictograph from a Pictographs.* constant'''
@@ -73,10 +117,7 @@ class Faceplate(object):
         uPD16432B display (65)'''
         if char in string.digits:
             return ord(char)
-        for key, value in self.CHARACTERS.items():
-            if value == char:
-                return key
-        return ord(char)
+        return self._CHAR_CODES.get(char, ord(char))
 
 
 class Premium4(Faceplate):
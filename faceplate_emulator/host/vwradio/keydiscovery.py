@@ -0,0 +1,143 @@
+'''Discovers what the radio does for each bit of uPD16432B key data.
+
+Each key data value is loaded into the emulated uPD16432B as if a key was
+held on the faceplate, and the LCD is read once the display has settled
+with the key down and again with it up.  Instead of waiting a fixed time
+for the radio to react, the display is watched for changes with
+Client.emulated_upd_read_display_changes.  Results are saved to a JSON
+checkpoint file after each value so an interrupted run can be resumed.
+Runs on several radios can split the values with shard().
+'''
+
+import json
+import os
+import time
+
+from vwradio.avrclient import wait_for_display_change
+from vwradio.constants import Keys
+
+# key data that puts the radio into a state discovery can't recover from,
+# with the reason it is skipped
+HAZARDOUS_KEY_DATA = {
+    (0, 0, 0, 0x40): 'initial',
+    (0, 0, 0x02, 0): 'scan',
+    (0, 0, 0x20, 0): 'code',
+    (0, 0x10, 0, 0): 'bal',
+    (0, 0, 0, 0x80): 'no code',
+    }
+
+# keys hit to put the display into a known state
+RESET_KEYS = (Keys.MODE_AM, Keys.MODE_FM, Keys.PRESET_1)
+
+
+def single_bit_key_data():
+    '''Return the 32 key data values with one bit set, starting with the
+    lowest bit of the last byte'''
+    key_datas = []
+    for bitnum in range(32):
+        keycode = 1 << bitnum
+        key_datas.append(tuple([ (keycode >> (8 * i)) & 0xFF
+                                 for i in range(3, -1, -1) ]))
+    return key_datas
+
+
+def shard(key_datas, index, count):
+    '''Return the key data values tried by run +index+ of +count+ runs'''
+    return key_datas[index::count]
+
+
+def key_data_hex(key_data):
+    return ''.join([ '%02x' % byte for byte in key_data ])
+
+
+class KeyDiscovery(object):
+    REACTION_TIMEOUT = 20.0 # seconds to wait for the display to change
+    SETTLE_SECS = 0.25 # display is settled after no changes for this long
+
+    def __init__(self, client, checkpoint_filename=None,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.client = client
+        self.checkpoint_filename = checkpoint_filename
+        self.clock = clock
+        self.sleep = sleep
+        self.results = {} # key_data_hex() as key, {'down':, 'up':} as value
+        if checkpoint_filename and os.path.exists(checkpoint_filename):
+            with open(checkpoint_filename, 'r') as f:
+                self.results = json.load(f)['results']
+
+    def run(self, key_datas, report=None):
+        '''Try each of +key_datas+ that has no result yet and is not
+        hazardous.  Calls report(key_data, result) after each one, where
+        result is a dict of the LCD text with the key 'down' and 'up', or
+        {'skipped': reason}.  A result also has 'unsettled': True if the
+        display was still changing when it was read.  Returns the results.'''
+        baseline = None
+        for key_data in key_datas:
+            key_data = tuple(key_data)
+            reason = HAZARDOUS_KEY_DATA.get(key_data)
+            if reason is not None:
+                result = {'skipped': reason}
+            elif key_data_hex(key_data) in self.results:
+                continue
+            else:
+                if baseline is None:
+                    baseline = self.reset()
+                result = self.try_key_data(key_data)
+                if ((result['down'] != baseline) or
+                        (result['up'] != baseline) or
+                        result.get('unsettled')):
+                    baseline = None # reset before trying the next one
+                self.results[key_data_hex(key_data)] = result
+                self.save()
+            if report is not None:
+                report(key_data, result)
+        return self.results
+
+    def reset(self):
+        '''Hit keys to put the display into a known state and return the
+        text on the LCD, or None if the display did not settle'''
+        for key in RESET_KEYS:
+            self.client.hit_key(key)
+        if not self.wait_until_settled():
+            return None
+        return self.client.read_lcd()
+
+    def try_key_data(self, key_data):
+        self.client.emulated_upd_read_display_changes() # forget old changes
+        self.client.emulated_upd_load_key_data(key_data)
+        settled = True
+        if self.wait_for_change(self.REACTION_TIMEOUT):
+            settled = self.wait_until_settled()
+        down = self.client.read_lcd()
+        self.client.emulated_upd_load_key_data([0, 0, 0, 0])
+        self.sleep(self.SETTLE_SECS)
+        settled = self.wait_until_settled() and settled
+        up = self.client.read_lcd()
+        result = {'down': down, 'up': up}
+        if not settled:
+            result['unsettled'] = True
+        return result
+
+    def wait_for_change(self, timeout):
+        '''See avrclient.wait_for_display_change()'''
+        return wait_for_display_change(self.client, timeout,
+                                       self.clock, self.sleep)
+
+    def wait_until_settled(self):
+        '''Return True once the display has not changed for SETTLE_SECS,
+        or False if it is still changing after REACTION_TIMEOUT seconds'''
+        deadline = self.clock() + self.REACTION_TIMEOUT
+        while self.wait_for_change(self.SETTLE_SECS):
+            if self.clock() >= deadline:
+                return False
+        return True
+
+    def save(self):
+        '''Write the results to the checkpoint file.  The file is replaced
+        in one step so an interrupted write leaves the last checkpoint.'''
+        if not self.checkpoint_filename:
+            return
+        tmp_filename = self.checkpoint_filename + '.tmp'
+        with open(tmp_filename, 'w') as f:
+            json.dump({'results': self.results}, f, indent=2, sort_keys=True)
+        os.replace(tmp_filename, self.checkpoint_filename)
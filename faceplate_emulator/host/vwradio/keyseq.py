@@ -0,0 +1,312 @@
+'''Plays scripted sequences of key hits on the radio.
+
+A sequence is written as text with one step per line.  A '#' starts a
+comment.  The steps are:
+
+  hit MODE_FM                   hit a key (a Keys.* name)
+  hit PRESET_2 x6               hit a key 6 times
+  hit PRESET_3 PRESET_4         hit several keys in order
+  hit TUNE_UP press 3           hold the key down for 3 seconds
+  hit SCAN release 0.5          leave 0.5 seconds after releasing it
+  sleep 0.5                     do nothing for 0.5 seconds
+  wait tuner_band == FM2        wait for a RadioState condition
+  wait tuner_freq >= 1000 timeout 10
+
+A key is held for 0.15 seconds and then released for 0.15 seconds unless
+the hit says otherwise.  A wait compares a RadioState attribute to a
+number or to a name from the constants for that attribute
+(OperationModes, DisplayModes, TunerBands), and fails if the condition
+is not met within 5 seconds unless a timeout is given.
+
+compile_steps() merges hits in a row that have the same timing when that
+lets the AVR hit them with fewer CMD_HIT_KEYS commands.  Waits only dump
+the radio state when the radio has changed the display.  Player records
+how long each step took.
+'''
+
+import operator
+import time
+
+from vwradio.avrclient import (
+    HIT_KEYS_MAX_KEYS, HIT_KEYS_MAX_REPEAT, RadioState, wait_for_radio_state)
+from vwradio.constants import DisplayModes, Keys, OperationModes, TunerBands
+
+DEFAULT_PRESS_SECS = 0.15
+DEFAULT_RELEASE_SECS = 0.15
+DEFAULT_WAIT_TIMEOUT = 5.0
+MAX_HIT_SECS = 65.535 # press and release times are sent in 16-bit ms
+
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    }
+
+# RadioState attribute as key, constants class of its values as value
+NAMED_VALUES = {
+    'operation_mode': OperationModes,
+    'display_mode': DisplayModes,
+    'tuner_band': TunerBands,
+    }
+
+
+class SequenceError(Exception):
+    pass
+
+
+def _format_secs(secs):
+    return ('%.3f' % secs).rstrip('0').rstrip('.')
+
+
+class Hit(object):
+    def __init__(self, key_codes, press_secs=DEFAULT_PRESS_SECS,
+                 release_secs=DEFAULT_RELEASE_SECS, repeat=1):
+        self.key_codes = list(key_codes)
+        self.press_secs = press_secs
+        self.release_secs = release_secs
+        self.repeat = repeat
+
+    def play(self, player):
+        player.client.hit_keys(self.key_codes, self.press_secs,
+                               self.release_secs, self.repeat)
+
+    def timing(self):
+        return (self.press_secs, self.release_secs)
+
+    def expanded_key_codes(self):
+        '''Key codes in the order they are hit, each hit once'''
+        return [ key_code for key_code in self.key_codes
+                          for i in range(self.repeat) ]
+
+    def __str__(self):
+        words = ['hit'] + [ Keys.get_name(key_code) or str(key_code)
+                            for key_code in self.key_codes ]
+        if self.repeat != 1:
+            words.append('x%d' % self.repeat)
+        if self.press_secs != DEFAULT_PRESS_SECS:
+            words += ['press', _format_secs(self.press_secs)]
+        if self.release_secs != DEFAULT_RELEASE_SECS:
+            words += ['release', _format_secs(self.release_secs)]
+        return ' '.join(words)
+
+
+class Sleep(object):
+    def __init__(self, secs):
+        self.secs = secs
+
+    def play(self, player):
+        player.sleep(self.secs)
+
+    def __str__(self):
+        return 'sleep %s' % _format_secs(self.secs)
+
+
+class Wait(object):
+    def __init__(self, name, op, value, timeout=DEFAULT_WAIT_TIMEOUT):
+        if op not in OPERATORS:
+            raise ValueError("Unknown operator %r" % op)
+        self.name = name
+        self.op = op
+        self.value = value
+        self.timeout = timeout
+
+    def test(self, state):
+        return OPERATORS[self.op](getattr(state, self.name), self.value)
+
+    def play(self, player):
+        if player.wait_for(self.test, self.timeout) is None:
+            raise SequenceError("Timeout waiting for %s" % self)
+
+    def __str__(self):
+        value = self.value
+        if self.name in NAMED_VALUES:
+            value = NAMED_VALUES[self.name].get_name(value) or value
+        words = ['wait', self.name, self.op, str(value)]
+        if self.timeout != DEFAULT_WAIT_TIMEOUT:
+            words += ['timeout', _format_secs(self.timeout)]
+        return ' '.join(words)
+
+
+def parse(text):
+    '''Parse a sequence written as text and return a list of steps'''
+    steps = []
+    for line_num, line in enumerate(text.splitlines(), 1):
+        words = line.split('#', 1)[0].split()
+        if not words:
+            continue
+        try:
+            parser = _PARSERS.get(words[0])
+            if parser is None:
+                raise ValueError("Unknown step %r" % words[0])
+            steps.append(parser(words[1:]))
+        except ValueError as exc:
+            raise SequenceError("Line %d: %s" % (line_num, exc))
+    return steps
+
+
+def _parse_hit(words):
+    key_codes = []
+    options = {}
+    words = list(words)
+    while words:
+        word = words.pop(0)
+        if word in ('press', 'release'):
+            if not words:
+                raise ValueError("%r needs a number of seconds" % word)
+            secs = float(words.pop(0))
+            if not (0 <= secs <= MAX_HIT_SECS):
+                raise ValueError("%r time %s is not 0-%s seconds" %
+                    (word, secs, _format_secs(MAX_HIT_SECS)))
+            options[word + '_secs'] = secs
+        elif word.startswith('x') and word[1:].isdigit():
+            repeat = int(word[1:])
+            if repeat not in range(1, HIT_KEYS_MAX_REPEAT + 1):
+                raise ValueError("Repeat count %d is not 1-%d" %
+                    (repeat, HIT_KEYS_MAX_REPEAT))
+            options['repeat'] = repeat
+        else:
+            key_codes.append(_parse_key(word))
+    if not key_codes:
+        raise ValueError("No keys to hit")
+    return Hit(key_codes, **options)
+
+
+def _parse_key(name):
+    key_code = getattr(Keys, name, None)
+    if (not name.isupper()) or (not isinstance(key_code, int)):
+        raise ValueError("Unknown key %r" % name)
+    return key_code
+
+
+def _parse_sleep(words):
+    if len(words) != 1:
+        raise ValueError("sleep needs a number of seconds")
+    return Sleep(float(words[0]))
+
+
+def _parse_wait(words):
+    if len(words) not in (3, 5) or (len(words) == 5 and
+                                    words[3] != 'timeout'):
+        raise ValueError("wait needs <name> <op> <value> [timeout <secs>]")
+    name, op, value = words[:3]
+    if name not in _RADIO_STATE_NAMES:
+        raise ValueError("Unknown radio state %r" % name)
+    if value.lstrip('-').isdigit():
+        value = int(value)
+    elif isinstance(getattr(NAMED_VALUES.get(name), value, None), int):
+        value = getattr(NAMED_VALUES[name], value)
+    else:
+        raise ValueError("Unknown value %r for %s" % (value, name))
+    timeout = DEFAULT_WAIT_TIMEOUT
+    if len(words) == 5:
+        timeout = float(words[4])
+    return Wait(name, op, value, timeout)
+
+
+_PARSERS = {
+    'hit': _parse_hit,
+    'sleep': _parse_sleep,
+    'wait': _parse_wait,
+    }
+
+_RADIO_STATE_NAMES = frozenset(RadioState.__slots__)
+
+
+def compile_steps(steps):
+    '''Return the steps with each run of hits that have the same timing
+    rewritten as the hits that the client can send with the fewest
+    CMD_HIT_KEYS commands.  A run is left as it is unless rewriting it
+    saves commands, so its steps are still timed separately.'''
+    compiled = []
+    hits = [] # run of hits with the same timing
+    for step in steps:
+        if hits and not (isinstance(step, Hit) and
+                         step.timing() == hits[0].timing()):
+            compiled += _compile_hits(hits)
+            hits = []
+        if isinstance(step, Hit):
+            hits.append(step)
+        else:
+            compiled.append(step)
+    compiled += _compile_hits(hits)
+    return compiled
+
+
+def _compile_hits(hits):
+    '''Return the hits needing the fewest commands out of: +hits+ as they
+    are, the keys hit the same number of times in a row grouped with a
+    repeat count, and every key hit once in order'''
+    if len(hits) < 2:
+        return list(hits)
+    timing = hits[0].timing()
+    key_codes = []
+    for hit in hits:
+        key_codes += hit.expanded_key_codes()
+    candidates = [list(hits), _grouped_hits(key_codes, *timing),
+                  [Hit(key_codes, *timing)]]
+    return min(candidates, key=num_commands) # first wins a tie
+
+
+def _grouped_hits(key_codes, press_secs, release_secs):
+    '''Return Hits of +key_codes+ in order.  CMD_HIT_KEYS repeats every
+    key it is given the same number of times, so each key hit several
+    times in a row is sent once with a repeat count, and keys in a row
+    with the same count share one Hit.'''
+    runs = [] # [key_code, count]
+    for key_code in key_codes:
+        if runs and runs[-1][0] == key_code and runs[-1][1] < HIT_KEYS_MAX_REPEAT:
+            runs[-1][1] += 1
+        else:
+            runs.append([key_code, 1])
+    hits = []
+    for key_code, count in runs:
+        if hits and hits[-1].repeat == count:
+            hits[-1].key_codes.append(key_code)
+        else:
+            hits.append(Hit([key_code], press_secs, release_secs, count))
+    return hits
+
+
+def num_commands(steps):
+    '''Return the number of CMD_HIT_KEYS commands needed to send the hits
+    in +steps+ (not counting checks for the hits being done)'''
+    return sum([ (len(step.key_codes) + HIT_KEYS_MAX_KEYS - 1) //
+                 HIT_KEYS_MAX_KEYS for step in steps if isinstance(step, Hit) ])
+
+
+class Player(object):
+    def __init__(self, client, clock=time.monotonic, sleep=time.sleep):
+        self.client = client
+        self.clock = clock
+        self.sleep = sleep
+
+    def play(self, steps, report=None):
+        '''Compile and play +steps+ and return a list of (step, seconds)
+        for each compiled step.  Calls report(step, seconds) after each
+        one.  Raises SequenceError if a wait times out.'''
+        timings = []
+        for step in compile_steps(steps):
+            start = self.clock()
+            step.play(self)
+            secs = self.clock() - start
+            timings.append((step, secs))
+            if report is not None:
+                report(step, secs)
+        return timings
+
+    def wait_for(self, predicate, timeout):
+        '''See avrclient.wait_for_radio_state()'''
+        return wait_for_radio_state(self.client, predicate, timeout,
+                                    self.clock, self.sleep)
+
+
+def format_timings(timings):
+    '''Return a report of the (step, seconds) from Player.play()'''
+    lines = [ '%8.3f s  %s' % (secs, step) for step, secs in timings ]
+    total = sum([ secs for step, secs in timings ])
+    lines.append('%8.3f s  total, %d CMD_HIT_KEYS commands' %
+        (total, num_commands([ step for step, secs in timings ])))
+    return '\n'.join(lines)
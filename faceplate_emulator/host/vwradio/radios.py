@@ -1,7 +1,73 @@
+import collections
+import re
 from vwradio.constants import OperationModes, DisplayModes, TunerBands
 
+# Patterns that classify a display and the Radio method that parses it, in
+# order of precedence.  Each pattern matches at fixed positions from the
+# start of the display and may only use non-capturing groups.
+_DISPLAY_RULES = (
+    (r' {11}\Z',                    None), # blank
+    (r'     DIAG  \Z',              '_parse_diag'),
+    (r'.{6}(?:MIN|MAX)',            '_parse_volume'),
+    (r'[0-9] ',                     '_parse_safe'),
+    (r'    .{5}  ',                 '_parse_safe'),
+    (r'    NO CODE\Z',              '_parse_safe'),
+    (r'    INITIAL\Z',              '_parse_initial'),
+    (r'    MONSOON\Z',              '_parse_monsoon'),
+    (r'BAS',                        '_parse_sound_bass'),
+    (r'TRE',                        '_parse_sound_treble'),
+    (r'MID',                        '_parse_sound_midrange'),
+    (r'BAL',                        '_parse_sound_balance'),
+    (r'FAD',                        '_parse_sound_fade'),
+    (r'SET|TAPE SKIP',              '_parse_set'),
+    (r'FER|RAD|VER|Ver',            '_parse_test'),
+    (r'.(?:[0-9]{3}|[0-9]{1,2}\Z)',  '_parse_test'), # short displays too
+    (r'TAP|    NO TAPE\Z',          '_parse_tape'),
+    (r'CD|.{4}CD',                  '_parse_cd'),
+    (r'CHK|CUE|REV',                '_parse_cd'),
+    (r'NO  CHANGER\Z|NO  MAGAZIN\Z|    NO DISC\Z', '_parse_cd'),
+    (r'.{8}(?:MHZ|MHz)',            '_parse_tuner_fm'),
+    (r'.{8}(?:KHZ|kHz)',            '_parse_tuner_am'),
+    (r'',                           '_parse_unknown'),
+    )
+
+# One regex that tries each rule in order.  Each rule is the only capturing
+# group in its alternative, so match.lastindex is the rule number plus one.
+_DISPLAY_CLASSIFIER = re.compile(
+    '|'.join([ '(%s)' % pattern for pattern, handler in _DISPLAY_RULES ]
+             ).encode('ascii'), re.DOTALL)
+_DISPLAY_HANDLERS = tuple([ handler for pattern, handler in _DISPLAY_RULES ])
+
+
+class ChangeEvent(object):
+    '''Emitted by Radio.parse when an attribute such as operation_mode or
+    tuner_freq changes.  +name+ is the attribute name.'''
+
+    def __init__(self, name, old, new):
+        self.name = name
+        self.old = old
+        self.new = new
+
+    def __repr__(self):
+        return '<%s: %s %r -> %r>' % (self.__class__.__name__, self.name,
+                                      self.old, self.new)
+
+    def __eq__(self, other):
+        if not isinstance(other, ChangeEvent):
+            return NotImplemented
+        return self.__dict__ == other.__dict__
+
+    __hash__ = None # mutable, compared by value
+
+
 class Radio(object):
-    def __init__(self):
+    def __init__(self, parse_cache_size=256):
+        # display -> {attribute name: value} assigned by parsing it, for
+        # displays whose parse does not depend on the current state
+        self._parse_cache = collections.OrderedDict()
+        self._parse_cache_size = parse_cache_size
+        self._observers = [] # (callback, set of names or None for all)
+
         self.operation_mode = OperationModes.UNKNOWN
         self.display_mode = DisplayModes.UNKNOWN
         self.safe_code = 1000
@@ -28,52 +94,58 @@ class Radio(object):
         self.test_signal_strength = 0 # Premium 5 only, 0 to 0xFFFF
 
     def parse(self, display):
-        if display == b' ' * 11:
-            pass # blank
-        elif display == b"     DIAG  ":
-            self._parse_diag(display)
-        elif display[6:9] in (b"MIN", b"MAX"):
-            self._parse_volume(display)
-        elif display[0:1].isdigit() and display[1:2] == b" ":
-            self._parse_safe(display)
-        elif display[0:4] == b"    " and display[9:11] == b"  ":
-            self._parse_safe(display)
-        elif display == b"    NO CODE":
-            self._parse_safe(display)
-        elif display == b"    INITIAL":
-            self._parse_initial(display)
-        elif display == b"    MONSOON":
-            self._parse_monsoon(display)
-        elif display[0:3] == b"BAS":
-            self._parse_sound_bass(display)
-        elif display[0:3] == b"TRE":
-            self._parse_sound_treble(display)
-        elif display[0:3] == b"MID":
-            self._parse_sound_midrange(display)
-        elif display[0:3] == b"BAL":
-            self._parse_sound_balance(display)
-        elif display[0:3] == b"FAD":
-            self._parse_sound_fade(display)
-        elif display[0:3] == b"SET" or display[0:9] == b"TAPE SKIP":
-            self._parse_set(display)
-        elif display[0:3] in (b"FER", b"RAD", b"VER", b"Ver"):
-            self._parse_test(display)
-        elif display[1:4].isdigit():
-            self._parse_test(display)
-        elif display[0:3] == b"TAP" or display == b"    NO TAPE":
-            self._parse_tape(display)
-        elif display[0:2] == b"CD" or display[4:6] == b"CD":
-            self._parse_cd(display)
-        elif display[0:3] in (b"CHK", b"CUE", b"REV"):
-            self._parse_cd(display)
-        elif display in (b"NO  CHANGER", b"NO  MAGAZIN", b"    NO DISC"):
-            self._parse_cd(display)
-        elif display[8:11] in (b"MHZ", b"MHz"):
-            self._parse_tuner_fm(display)
-        elif display[8:11] in (b"KHZ", b"kHz"):
-            self._parse_tuner_am(display)
-        else:
-            self._parse_unknown(display)
+        key = bytes(display) # bytearray displays are not hashable
+        delta = self._parse_cache.get(key)
+        if delta is not None:
+            self._parse_cache.move_to_end(key)
+            self._apply(delta)
+            return
+
+        match = _DISPLAY_CLASSIFIER.match(display)
+        handler = _DISPLAY_HANDLERS[match.lastindex - 1]
+        recorder = _ParseRecorder(self)
+        try:
+            if handler is not None: # None for blank
+                getattr(recorder, handler)(display)
+        finally:
+            # attributes assigned before an unrecognized display raises
+            # are kept, but the display is not cached
+            self._apply(recorder._delta)
+
+        if self._parse_cache_size and not recorder._reads_state:
+            self._parse_cache[key] = recorder._delta
+            if len(self._parse_cache) > self._parse_cache_size:
+                self._parse_cache.popitem(last=False)
+
+    def add_observer(self, callback, names=None):
+        '''Call +callback+ with a ChangeEvent for each attribute that
+        changes when a display is parsed, or only for the attributes in
+        +names+ if given.  Events are sent after all attributes have been
+        updated for the display.'''
+        if names is not None:
+            names = frozenset(names)
+        self._observers.append((callback, names))
+
+    def remove_observer(self, callback):
+        self._observers = [ (cb, names) for cb, names in self._observers
+                            if cb != callback ]
+
+    def _apply(self, delta):
+        if not self._observers:
+            self.__dict__.update(delta)
+            return
+
+        events = []
+        for name, new in delta.items():
+            old = self.__dict__[name]
+            if old != new:
+                events.append(ChangeEvent(name, old, new))
+        self.__dict__.update(delta)
+
+        for event in events:
+            for callback, names in list(self._observers):
+                if names is None or event.name in names:
+                    callback(event)
 
     def _parse_safe(self, display):
         self.display_mode = DisplayModes.SHOWING_OPERATION
@@ -388,3 +460,26 @@ class Radio(object):
 
     def _parse_unknown(self, display):
         raise ValueError("Unrecognized: %r" % display)
+
+
+class _ParseRecorder(Radio):
+    '''A copy of a Radio's state that records the attributes assigned by
+    a parse method and whether the method read any state that it had not
+    assigned itself (e.g. the current band when an FM scan is displayed)'''
+
+    def __init__(self, radio):
+        object.__setattr__(self, '_delta', {})
+        object.__setattr__(self, '_reads_state', False)
+        for name, value in radio.__dict__.items():
+            if not name.startswith('_'):
+                object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        self._delta[name] = value
+        object.__setattr__(self, name, value)
+
+    def __getattribute__(self, name):
+        if not name.startswith('_'):
+            if name not in object.__getattribute__(self, '_delta'):
+                object.__setattr__(self, '_reads_state', True)
+        return object.__getattribute__(self, name)
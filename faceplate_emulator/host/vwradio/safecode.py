@@ -0,0 +1,99 @@
+'''Enters the SAFE code on a Premium 4 or Premium 5 radio.
+
+In SAFE entry mode the radio shows a four digit code that starts at 1000.
+Each of the preset keys 1-4 advances one digit, wrapping from 9 to 0, and
+holding TUNE_UP submits the code.  SafeCodeEntry works out how many times
+each preset key must be pressed from the code on the display and has the
+AVR press them back to back with Client.hit_keys.  Instead of sleeping for fixed times, it waits for the
+radio's display to change (see Client.emulated_upd_read_display_changes)
+and only then dumps the radio state to check it.
+'''
+
+import time
+
+from vwradio.avrclient import wait_for_radio_state
+from vwradio.constants import Keys, OperationModes
+
+DIGIT_KEYS = (Keys.PRESET_1, Keys.PRESET_2, Keys.PRESET_3, Keys.PRESET_4)
+SAFE_MODES = (OperationModes.SAFE_ENTRY, OperationModes.SAFE_LOCKED,
+              OperationModes.SAFE_NO_CODE)
+
+
+class SafeCodeError(Exception):
+    pass
+
+
+def presses_for_code(current_code, code):
+    '''Return the number of times each preset key must be pressed to
+    change +current_code+ on the display to +code+'''
+    current_digits = '%04d' % current_code
+    digits = '%04d' % code
+    return [ (int(want) - int(have)) % 10
+             for have, want in zip(current_digits, digits) ]
+
+
+class SafeCodeEntry(object):
+    PRESS_SECS = 0.05 # key held and released for this long per press
+    SUBMIT_KEY = Keys.TUNE_UP
+    SUBMIT_SECS = 3.0 # the radio needs the submit key held
+    DIGITS_TIMEOUT = 2.0 # seconds for the display to show the code
+    MAX_ATTEMPTS = 3 # to correct the code if the radio missed presses
+
+    def __init__(self, client, clock=time.monotonic, sleep=time.sleep):
+        self.client = client
+        self.clock = clock
+        self.sleep = sleep
+
+    def unlock(self, code, timeout=None):
+        '''Enter +code+ and return the RadioState once the radio is out of
+        SAFE mode.  If the radio is locked after too many wrong codes,
+        waits up to +timeout+ seconds (forever if None) for it to ask for
+        a code.  Raises SafeCodeError if the code is not accepted.'''
+        if code not in range(10000):
+            raise ValueError("SAFE code %r is not 0000-9999" % code)
+
+        state = self.wait_for(lambda state:
+            state.operation_mode not in (OperationModes.UNKNOWN,
+                                         OperationModes.SAFE_LOCKED),
+            timeout)
+        if state is None:
+            raise SafeCodeError("Timeout waiting for SAFE code entry")
+        if state.operation_mode == OperationModes.SAFE_NO_CODE:
+            raise SafeCodeError("Radio has no SAFE code")
+        if state.operation_mode != OperationModes.SAFE_ENTRY:
+            return state # already unlocked
+
+        for attempt in range(self.MAX_ATTEMPTS):
+            self.enter_digits(state.safe_code, code)
+            state = self.wait_for(lambda state: state.safe_code == code,
+                                  self.DIGITS_TIMEOUT)
+            if state is not None:
+                break
+            state = self.client.radio_state_dump()
+            if state.operation_mode != OperationModes.SAFE_ENTRY:
+                raise SafeCodeError("Radio left SAFE code entry while "
+                    "entering the code")
+        else:
+            raise SafeCodeError("Radio shows %04d, not %04d" %
+                (state.safe_code, code))
+
+        self.client.hit_key(self.SUBMIT_KEY, secs=self.SUBMIT_SECS)
+        state = self.wait_for(lambda state:
+            state.operation_mode != OperationModes.SAFE_ENTRY,
+            self.DIGITS_TIMEOUT)
+        if (state is None) or (state.operation_mode in SAFE_MODES):
+            raise SafeCodeError("SAFE code %04d was not accepted" % code)
+        return state
+
+    def enter_digits(self, current_code, code):
+        '''Press the preset keys to change +current_code+ to +code+'''
+        presses = presses_for_code(current_code, code)
+        keys = [ key for key, count in zip(DIGIT_KEYS, presses)
+                     for i in range(count) ]
+        if keys:
+            self.client.hit_keys(keys, self.PRESS_SECS, self.PRESS_SECS)
+
+    def wait_for(self, predicate, timeout=None):
+        '''See avrclient.wait_for_radio_state()'''
+        return wait_for_radio_state(self.client, predicate, timeout,
+                                    self.clock, self.sleep)
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3 -u
+import sys
+from vwradio import avrclient
+from vwradio import keyseq
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.stderr.write("Usage: playkeys.py <sequence file>\n")
+        sys.exit(1)
+    with open(sys.argv[1], 'r') as f:
+        try:
+            steps = keyseq.parse(f.read())
+        except keyseq.SequenceError as exc:
+            sys.stderr.write("%s: %s\n" % (sys.argv[1], exc))
+            sys.exit(1)
+
+    def report(step, secs):
+        print('%8.3f s  %s' % (secs, step))
+
+    client = avrclient.make_client()
+    client.set_auto_key_passthru(False)
+    try:
+        timings = keyseq.Player(client).play(steps, report)
+        print(keyseq.format_timings(timings).splitlines()[-1])
+    except keyseq.SequenceError as exc:
+        sys.stderr.write("%s\n" % exc)
+        sys.exit(1)
+    finally:
+        client.set_auto_key_passthru(True)
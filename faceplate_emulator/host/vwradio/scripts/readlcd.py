@@ -4,7 +4,6 @@ from vwradio.avrclient import make_client
 
 client = make_client()
 
-while True:
-    text = client.read_lcd()
+for text in client.watch_lcd():
     sys.stdout.write("\r" + text)
     sys.stdout.flush()
@@ -1,47 +1,38 @@
 #!/usr/bin/env python3 -u
 import sys
 from vwradio import avrclient
-from vwradio.constants import Keys, OperationModes, TunerBands
+from vwradio.constants import TunerBands
+from vwradio.tuning import Tuner, TuningError
 
-if __name__ == '__main__':
-    client = avrclient.make_client()
-    client.set_auto_key_passthru(False)
-
-    desired_freq = int(float(sys.argv[1]) * 10)
-    if (desired_freq & 1) != 1:
-        sys.stderr.write("Frequency must be odd\n")
-        sys.exit(1)
-    if (desired_freq < 879) or (desired_freq > 1079):
-        sys.stderr.write("Frequency not in range of 87.9 - 107.9\n")
-        sys.exit(1)
+USAGE = '''Usage: tunefm.py [fm1|fm2|am] <frequency>
 
-    # put radio into fm1
-    state = client.radio_state_dump()
-    while state.operation_mode != OperationModes.TUNER_PLAYING:
-        client.hit_key(Keys.MODE_FM)
-        state = client.radio_state_dump()
-    while state.tuner_band != TunerBands.FM1:
-        client.hit_key(Keys.MODE_FM)
-        state = client.radio_state_dump()
+FM frequencies are in MHz (87.9 - 107.9), AM frequencies in kHz (530 - 1710).
+The band defaults to fm1.
+'''
 
-    # hold tune up or tune down until close to desired frequency
-    if state.tuner_freq > desired_freq:
-        key = Keys.TUNE_DOWN
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if len(args) == 1:
+        args.insert(0, 'fm1')
+    bands = {'fm1': TunerBands.FM1, 'fm2': TunerBands.FM2,
+             'am': TunerBands.AM}
+    if (len(args) != 2) or (args[0].lower() not in bands):
+        sys.stderr.write(USAGE)
+        sys.exit(1)
+    band = bands[args[0].lower()]
+    if band == TunerBands.AM:
+        desired_freq = int(args[1])
     else:
-        key = Keys.TUNE_UP
-    client.load_keys([key])
-    while abs(state.tuner_freq - desired_freq) > 4:
-        state = client.radio_state_dump()
-    client.load_keys([])
+        desired_freq = int(round(float(args[1]) * 10))
 
-    # single-press tune up or tune down until desired frequency reached
-    while (state.tuner_freq != desired_freq):
-        client.hit_key(key)
-        state = client.radio_state_dump()
-        if state.tuner_freq > desired_freq:
-            key = Keys.TUNE_DOWN
-        else:
-            key = Keys.TUNE_UP
+    client = avrclient.make_client()
+    client.set_auto_key_passthru(False)
+    try:
+        Tuner(client).tune(band, desired_freq)
+    except (ValueError, TuningError) as exc:
+        sys.stderr.write("%s\n" % exc)
+        sys.exit(1)
+    finally:
+        client.set_auto_key_passthru(True)
 
     sys.stdout.write("%s\n" % client.read_lcd())
-    client.set_auto_key_passthru(True)
@@ -0,0 +1,28 @@
+from vwradio import avrclient
+from vwradio import avrsim
+
+
+class FakeRadioClient(avrclient.Client):
+    '''Client for a simulated AVR attached to a fake radio.  Subclasses
+    change the display with show() as the radio would.  Time only passes
+    in sleep().'''
+
+    def __init__(self):
+        self.avr = avrsim.SimulatedAvr()
+        avrclient.Client.__init__(self, avrsim.SimulatedSerial(self.avr))
+        self.now = 0.0
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.now += secs
+
+    def show(self, text):
+        '''Send display RAM showing +text+ from the radio to the AVR'''
+        faceplate = self.avr.faceplate
+        ram = [0x20] * 0x19
+        for address, char in zip(faceplate.VISIBLE_DISPLAY_ADDRESSES, text):
+            ram[address] = faceplate.char_code(char)
+        self.avr.radio_send_command([0x40]) # data setting: display ram
+        self.avr.radio_send_command([0x80] + ram) # address setting + data
@@ -0,0 +1,128 @@
+import asyncio
+import collections
+import socket
+import unittest
+
+from vwradio import aioclient
+from vwradio import avrclient
+
+
+class SocketSerial(object):
+    '''One end of a socket pair used as a non-blocking serial port'''
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.sock.setblocking(False)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    @property
+    def in_waiting(self):
+        return 0 # unknown, read one byte at a time
+
+    def read(self, size):
+        try:
+            return self.sock.recv(size)
+        except BlockingIOError:
+            return b''
+
+    def write(self, data):
+        self.sock.sendall(data)
+
+
+class FakeAvr(object):
+    '''Reads commands from the other end of the socket pair and answers
+    echo commands, ACKs any other command, and never answers commands in
+    +ignored_commands+'''
+
+    def __init__(self, loop, sock, ignored_commands=()):
+        self.sock = sock
+        self.sock.setblocking(False)
+        self.ignored_commands = ignored_commands
+        self.commands = []
+        self._rx = bytearray()
+        loop.add_reader(sock.fileno(), self._on_readable)
+
+    def _on_readable(self):
+        self._rx += self.sock.recv(4096)
+        while self._rx and len(self._rx) >= 1 + self._rx[0]:
+            command = self._rx[1:1+self._rx[0]]
+            del self._rx[:1+len(command)]
+            self.commands.append(command)
+            if command[0] in self.ignored_commands:
+                continue
+            elif command[0] == avrclient.CMD_ECHO:
+                reply = [avrclient.ERROR_OK] + list(command[1:])
+            elif command[0] == avrclient.CMD_SET_LED and command[1] > 1:
+                reply = [avrclient.ERROR_BAD_ARGS_VALUE]
+            else:
+                reply = [avrclient.ERROR_OK]
+            self.sock.sendall(bytearray([len(reply)] + reply))
+
+
+class TestAsyncClient(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.client_sock, avr_sock = socket.socketpair()
+        self.avr = FakeAvr(self.loop, avr_sock,
+                           ignored_commands=[avrclient.CMD_SET_RUN_MODE])
+        self.client = aioclient.AsyncClient(SocketSerial(self.client_sock),
+                                            timeout=0.2, loop=self.loop)
+
+    def tearDown(self):
+        self.client.close()
+        self.loop.remove_reader(self.avr.sock.fileno())
+        self.client_sock.close()
+        self.avr.sock.close()
+        self.loop.close()
+
+    def gather(self, *coros, **kwargs):
+        async def gather():
+            return await asyncio.gather(*coros, **kwargs)
+        return self.loop.run_until_complete(gather())
+
+    def test_concurrent_commands_get_their_own_replies(self):
+        replies = self.gather(
+            *[ self.client.echo([i] * i) for i in range(1, 30) ])
+        self.assertEqual(replies,
+            [ bytearray([i] * i) for i in range(1, 30) ])
+
+    def test_nak_raises_only_for_its_command(self):
+        results = self.gather(
+            self.client.echo([1]),
+            self.client.set_led(9, True),
+            self.client.echo([2]),
+            return_exceptions=True)
+        self.assertEqual(results[0], bytearray([1]))
+        self.assertIn("NAK", str(results[1]))
+        self.assertEqual(results[2], bytearray([2]))
+
+    def test_timeout(self):
+        with self.assertRaises(Exception) as cm:
+            self.gather(self.client.set_run_mode(avrclient.RUN_MODE_RUNNING))
+        self.assertIn("Timeout", str(cm.exception))
+
+    def test_command_after_timeout_succeeds(self):
+        with self.assertRaises(Exception):
+            self.gather(self.client.set_run_mode(avrclient.RUN_MODE_RUNNING))
+        self.assertEqual(self.gather(self.client.echo([1]),
+                                     self.client.echo([2])),
+                         [bytearray([1]), bytearray([2])])
+        self.assertEqual(self.client._pending, collections.deque())
+
+    def test_binds_to_running_loop(self):
+        self.client.close()
+        self.client = aioclient.AsyncClient(SocketSerial(self.client_sock))
+        self.assertEqual(self.gather(self.client.echo([1])),
+                         [bytearray([1])])
+
+    def test_limits_bytes_in_flight(self):
+        self.gather(*[ self.client.radio_state_reset() for i in range(100) ])
+        self.assertEqual(len(self.avr.commands), 100)
+
+    def test_faceplate_upd_send_commands(self):
+        self.gather(self.client.faceplate_upd_send_commands([[0x40], [0x80, 1]]))
+        cmd = avrclient.CMD_FACEPLATE_UPD_SEND_COMMAND
+        self.assertEqual(self.avr.commands,
+            [bytearray([cmd, 0x40]), bytearray([cmd, 0x80, 1])])
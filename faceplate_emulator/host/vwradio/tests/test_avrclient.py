@@ -0,0 +1,154 @@
+import unittest
+
+from vwradio import avrclient
+from vwradio import faceplates
+
+
+class FakeSerial(object):
+    '''Answers each command written to it like the AVR would: echo
+    commands are echoed and any other command is ACKed, except commands
+    in +nak_commands+ which receive ERROR_BAD_COMMAND'''
+
+    def __init__(self, nak_commands=()):
+        self.nak_commands = nak_commands
+        self.writes = []
+        self._rx = bytearray()
+
+    def write(self, data):
+        data = bytearray(data)
+        self.writes.append(data)
+        while data:
+            length = data[0]
+            command, data = data[1:1+length], data[1+length:]
+            if command[0] in self.nak_commands:
+                reply = [avrclient.ERROR_BAD_COMMAND]
+            elif command[0] == avrclient.CMD_ECHO:
+                reply = [avrclient.ERROR_OK] + list(command[1:])
+            else:
+                reply = [avrclient.ERROR_OK]
+            self._rx += bytearray([len(reply)] + reply)
+
+    def flush(self):
+        pass
+
+    @property
+    def in_waiting(self):
+        return len(self._rx)
+
+    def read(self, size):
+        data, self._rx = self._rx[:size], self._rx[size:]
+        return bytes(data)
+
+
+class TestClientPipeline(unittest.TestCase):
+    def test_writes_commands_at_once_and_matches_replies(self):
+        ser = FakeSerial()
+        client = avrclient.Client(ser)
+        replies = client.pipeline([
+            [avrclient.CMD_ECHO, 1, 2],
+            [avrclient.CMD_SET_LED, avrclient.LED_GREEN, 1],
+            [avrclient.CMD_ECHO, 3],
+            ])
+        self.assertEqual(ser.writes, [bytearray([
+            3, avrclient.CMD_ECHO, 1, 2,
+            3, avrclient.CMD_SET_LED, avrclient.LED_GREEN, 1,
+            2, avrclient.CMD_ECHO, 3])])
+        self.assertEqual(replies, [
+            bytearray([avrclient.ERROR_OK, 1, 2]),
+            bytearray([avrclient.ERROR_OK]),
+            bytearray([avrclient.ERROR_OK, 3]),
+            ])
+
+    def test_reports_naks_per_command_after_reading_all_replies(self):
+        ser = FakeSerial(nak_commands=[avrclient.CMD_SET_LED])
+        client = avrclient.Client(ser)
+        commands = [
+            [avrclient.CMD_SET_LED, 9, 1],
+            [avrclient.CMD_ECHO, 1],
+            [avrclient.CMD_SET_LED, 9, 0],
+            ]
+        try:
+            client.pipeline(commands)
+            self.fail("PipelineError not raised")
+        except avrclient.PipelineError as exc:
+            self.assertEqual(exc.failed, [0, 2])
+            self.assertEqual(exc.replies[1],
+                bytearray([avrclient.ERROR_OK, 1]))
+        self.assertEqual(ser.in_waiting, 0)
+
+    def test_ignore_error_returns_naks(self):
+        ser = FakeSerial(nak_commands=[avrclient.CMD_SET_LED])
+        client = avrclient.Client(ser)
+        replies = client.pipeline([[avrclient.CMD_SET_LED, 9, 1]],
+                                  ignore_error=True)
+        self.assertEqual(replies, [bytearray([avrclient.ERROR_BAD_COMMAND])])
+
+    def test_splits_writes_to_fit_avr_buffers(self):
+        ser = FakeSerial()
+        client = avrclient.Client(ser)
+        commands = [[avrclient.CMD_RADIO_STATE_DUMP]] * 10
+        replies = client.pipeline(commands)
+        self.assertEqual(len(replies), 10)
+        # 4 replies of up to 54 bytes fit in the AVR's tx buffer
+        self.assertEqual([ len(w) for w in ser.writes ], [8, 8, 4])
+
+    def test_faceplate_upd_send_commands(self):
+        ser = FakeSerial()
+        client = avrclient.Client(ser)
+        client.faceplate_upd_send_commands([[0x40], [0x80, 1, 2]])
+        cmd = avrclient.CMD_FACEPLATE_UPD_SEND_COMMAND
+        self.assertEqual(ser.writes,
+            [bytearray([2, cmd, 0x40, 4, cmd, 0x80, 1, 2])])
+
+
+class TestClientReadLcd(unittest.TestCase):
+    def encode_display_ram(self, faceplate, text):
+        ram = bytearray([0x20] * 0x19)
+        for address, char in zip(faceplate.VISIBLE_DISPLAY_ADDRESSES, text):
+            ram[address] = faceplate.char_code(char)
+        return ram
+
+    def test_decodes_with_configured_faceplate(self):
+        for faceplate in (faceplates.Premium4(), faceplates.Premium5()):
+            client = avrclient.Client(FakeSerial(), faceplate=faceplate)
+            ram = self.encode_display_ram(faceplate, "FM1  891MHZ")
+            self.assertEqual(client._decode_lcd(ram), "FM1  891MHZ")
+
+    def test_unknown_char_codes_decode_as_question_marks(self):
+        faceplate = faceplates.Premium5()
+        client = avrclient.Client(FakeSerial(), faceplate=faceplate)
+        ram = self.encode_display_ram(faceplate, "FM1")
+        ram[faceplate.VISIBLE_DISPLAY_ADDRESSES[1]] = 0
+        self.assertEqual(client._decode_lcd(ram), "F?1        ")
+
+
+class TestStates(unittest.TestCase):
+    def test_radio_state_decodes_signed_and_16_bit_fields(self):
+        data = bytearray(52)
+        data[3:5] = [0x39, 0x05] # safe_code 1337
+        data[5] = 0xFE # sound_bass -2
+        data[15:17] = [0x7B, 0x03] # tuner_freq 891
+        data[19:30] = b'FM1  891MHZ'
+        state = avrclient.RadioState(data)
+        self.assertEqual(state.safe_code, 1337)
+        self.assertEqual(state.sound_bass, -2)
+        self.assertEqual(state.tuner_freq, 891)
+        self.assertEqual(state.display, b'FM1  891MHZ')
+        self.assertEqual(state, avrclient.RadioState(data))
+
+    def test_upd_emulator_state_splits_ram_areas(self):
+        data = bytearray(range(151))
+        state = avrclient.UpdEmulatorState(data)
+        self.assertEqual(state.increment, True)
+        self.assertEqual(state.display_ram, data[5:30])
+        self.assertEqual(state.chargen_ram, data[38:150])
+        self.assertEqual(state.led_ram, data[150:151])
+
+
+class TestHitKeys(unittest.TestCase):
+    def test_hit_keys_commands_split_long_sequences(self):
+        commands = avrclient._hit_keys_commands(list(range(1, 21)),
+                                                0.1, 0.25, 2)
+        self.assertEqual(commands[0][:6],
+            [avrclient.CMD_HIT_KEYS, 100, 0, 250, 0, 2])
+        self.assertEqual([ len(c) - 6 for c in commands ], [16, 4])
@@ -0,0 +1,103 @@
+import unittest
+
+import serial # pyserial
+
+from vwradio import avrclient
+from vwradio import avrsim
+from vwradio.constants import Keys, OperationModes, TunerBands
+from vwradio.faceplates import Premium4
+
+
+class TestSimulatedAvr(unittest.TestCase):
+    def setUp(self):
+        self.avr = avrsim.SimulatedAvr()
+        self.client = avrclient.Client(avrsim.SimulatedSerial(self.avr))
+
+    def send_display_from_radio(self, text):
+        faceplate = self.avr.faceplate
+        addresses = faceplate.VISIBLE_DISPLAY_ADDRESSES
+        char_codes = [ faceplate.char_code(c) for c in text ]
+        ram = [0x20] * 0x19
+        for address, char_code in zip(addresses, char_codes):
+            ram[address] = char_code
+        self.avr.radio_send_command([0x40]) # data setting: display ram
+        self.avr.radio_send_command([0x80] + ram) # address setting + data
+
+    def test_display_from_radio_updates_radio_state(self):
+        self.send_display_from_radio("FM1  891MHZ")
+        state = self.client.radio_state_dump()
+        self.assertEqual(state.operation_mode, OperationModes.TUNER_PLAYING)
+        self.assertEqual(state.tuner_band, TunerBands.FM1)
+        self.assertEqual(state.tuner_freq, 891)
+
+    def test_display_from_radio_passes_thru_to_faceplate(self):
+        self.send_display_from_radio("FM1  891MHZ")
+        state = self.client.faceplate_upd_dump_state()
+        self.assertEqual(state.display_ram, self.avr.emulated_upd.display_ram)
+
+    def test_display_from_radio_is_ignored_when_stopped(self):
+        self.client.set_run_mode(avrclient.RUN_MODE_STOPPED)
+        self.send_display_from_radio("FM1  891MHZ")
+        state = self.client.radio_state_dump()
+        self.assertEqual(state.operation_mode, OperationModes.UNKNOWN)
+
+    def test_load_keys_sets_key_data_sent_to_radio(self):
+        self.client.set_auto_key_passthru(False)
+        self.client.load_keys([Keys.PRESET_1])
+        self.assertEqual(tuple(self.avr.upd_tx_key_data),
+                         Premium4().encode_keys([Keys.PRESET_1]))
+
+    def test_hit_keys_presses_then_releases(self):
+        self.client.set_auto_key_passthru(False)
+        self.client.hit_keys([Keys.PRESET_1], press_secs=60, wait=False)
+        self.assertEqual(tuple(self.avr.upd_tx_key_data),
+                         Premium4().encode_keys([Keys.PRESET_1]))
+        press_time, release_time, end_time, key_data = self.avr._hits[0]
+        self.avr._hits[0] = (press_time - 60, release_time - 60,
+                             end_time - 60, key_data)
+        self.assertTrue(self.client.hit_keys_busy())
+        self.assertEqual(tuple(self.avr.upd_tx_key_data), (0, 0, 0, 0))
+
+    def test_faceplate_keys_pass_thru_to_radio(self):
+        key_data = Premium4().encode_keys([Keys.SCAN])
+        self.avr.faceplate_key_data[:] = bytearray(key_data)
+        self.assertEqual(self.client.read_keys(), [Keys.SCAN])
+        self.client.echo([]) # any command lets the main loop run
+        self.assertEqual(tuple(self.avr.upd_tx_key_data), key_data)
+
+    def test_display_changes_survive_main_loop(self):
+        self.send_display_from_radio("FM1  891MHZ")
+        self.client.echo([]) # main loop clears its own dirty flags
+        dirty_flags, display_ram = \
+            self.client.emulated_upd_read_display_changes()
+        self.assertTrue(dirty_flags & avrclient.UPD_DIRTY_DISPLAY)
+        self.assertEqual(display_ram, self.avr.emulated_upd.display_ram)
+        self.assertEqual(self.client.emulated_upd_read_display_changes(),
+                         (avrclient.UPD_DIRTY_NONE, None))
+
+    def test_watch_lcd_yields_only_changed_text(self):
+        self.send_display_from_radio("FM1  891MHZ")
+        watcher = self.client.watch_lcd(interval=0)
+        self.assertEqual(next(watcher).strip(), "FM1  891MHZ")
+        self.send_display_from_radio("FM1  891MHZ") # same text again
+        self.send_display_from_radio("FM1  895MHZ")
+        self.assertEqual(next(watcher).strip(), "FM1  895MHZ")
+
+    def test_incomplete_command_times_out(self):
+        self.client.send([avrclient.CMD_ECHO, 1, 2])
+        self.client.serial.write(bytearray([5]))
+        self.avr._last_rx_time -= avrsim.COMMAND_TIMEOUT + 1
+        self.assertEqual(self.client.echo([3]), bytearray([3]))
+
+
+class TestOpenPty(unittest.TestCase):
+    def test_client_talks_to_simulated_avr_over_pty(self):
+        name = avrsim.open_pty()
+        ser = serial.Serial(port=name, baudrate=115200, timeout=2)
+        try:
+            client = avrclient.Client(ser)
+            self.assertEqual(client.echo([1, 2, 3]), bytearray([1, 2, 3]))
+            state = client.emulated_upd_dump_state()
+            self.assertEqual(state.ram_area, avrclient.UPD_RAM_NONE)
+        finally:
+            ser.close()
@@ -0,0 +1,138 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from vwradio import captures
+
+class _CaptureTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _write_csv(self, lines, basename='capture.csv.gz'):
+        filename = os.path.join(self.tempdir, basename)
+        opener = gzip.open if filename.endswith('.gz') else open
+        with opener(filename, 'wt') as f:
+            f.write('Time[s], STB, DAT, CLK\n')
+            for line in lines:
+                f.write(line + '\n')
+        return filename
+
+    def _convert(self, csv_filename):
+        binary_filename = os.path.join(self.tempdir, 'capture.vwcap')
+        captures.convert(csv_filename, binary_filename)
+        return binary_filename
+
+
+class TestReadRows(_CaptureTestCase):
+    def test_reads_named_columns_from_csv(self):
+        for basename in ('capture.csv', 'capture.csv.gz'):
+            filename = self._write_csv(['0.000000000000000, 0, 1, 1',
+                                        '0.000001000000000, 1, 0, 1',
+                                        '0.000002000000000, 1, 1, 0'],
+                                       basename=basename)
+            rows = list(captures.read_rows(filename, ('CLK', 'STB')))
+            self.assertEqual(rows, [(1, 0), (1, 1), (0, 1)])
+
+    def test_reads_named_columns_from_binary(self):
+        filename = self._write_csv(['0.000000000000000, 0, 1, 1',
+                                    '0.000001000000000, 1, 0, 1',
+                                    '0.000002000000000, 1, 1, 0'])
+        filename = self._convert(filename)
+        rows = list(captures.read_rows(filename, ('CLK', 'STB')))
+        self.assertEqual(rows, [(1, 0), (1, 1), (0, 1)])
+
+    def test_raises_for_unknown_column(self):
+        filename = self._write_csv(['0.000000000000000, 0, 1, 1'])
+        with self.assertRaises(ValueError):
+            list(captures.read_rows(filename, ('CS',)))
+        filename = self._convert(filename)
+        with self.assertRaises(ValueError):
+            list(captures.read_rows(filename, ('CS',)))
+
+
+@unittest.skipIf(captures.numpy is None, 'numpy not installed')
+class TestReadChunks(_CaptureTestCase):
+    def test_binary_chunks_match_csv_chunks(self):
+        lines = [ '%.15f, %d, %d, %d' % (i * 1e-6, i & 1, (i >> 1) & 1,
+                                         (i * 7) % 3 == 0)
+                  for i in range(37) ]
+        csv_filename = self._write_csv(lines)
+        binary_filename = self._convert(csv_filename)
+        names = ('DAT', 'STB')
+        for chunk_size in (1, 8, 9, 16, 1000):
+            csv_chunks = list(captures.read_chunks(csv_filename, names,
+                                                   chunk_size))
+            binary_chunks = list(captures.read_chunks(binary_filename, names,
+                                                      chunk_size))
+            self.assertEqual(
+                [ r for c in binary_chunks for r in c.tolist() ],
+                [ r for c in csv_chunks for r in c.tolist() ])
+            for chunk in binary_chunks:
+                self.assertEqual(chunk.shape[1], 2)
+                self.assertTrue(len(chunk) <= max(chunk_size, 8))
+
+
+class TestBinaryCapture(_CaptureTestCase):
+    def test_convert_preserves_names_and_samples(self):
+        filename = self._write_csv(['0.008453000000000, 1, 1, 1',
+                                    '0.008467600000000, 1, 0, 1',
+                                    '0.008469600000000, 1, 0, 0'])
+        filename = self._convert(filename)
+        with captures.BinaryCapture(filename) as capture:
+            self.assertEqual(capture.channel_names, ['STB', 'DAT', 'CLK'])
+            self.assertEqual(capture.num_samples, 3)
+            self.assertEqual(capture.exponent, -9)
+            timestamps = list(capture.read_timestamps())
+            rows = list(capture.read_rows(('STB', 'DAT', 'CLK')))
+        expected = [0.0084530, 0.0084676, 0.0084696]
+        for timestamp, expected_timestamp in zip(timestamps, expected):
+            self.assertAlmostEqual(timestamp, expected_timestamp, places=12)
+        self.assertEqual(rows, [(1, 1, 1), (1, 0, 1), (1, 0, 0)])
+
+    def test_convert_uses_coarser_resolution_for_long_gaps(self):
+        filename = self._write_csv(['0.000000000000000, 0, 0, 0',
+                                    '10.000000000000000, 1, 1, 1'])
+        filename = self._convert(filename)
+        with captures.BinaryCapture(filename) as capture:
+            self.assertEqual(capture.exponent, -8)
+            timestamps = list(capture.read_timestamps())
+        self.assertAlmostEqual(timestamps[1], 10.0)
+
+    def test_convert_empty_capture(self):
+        filename = self._convert(self._write_csv([]))
+        with captures.BinaryCapture(filename) as capture:
+            self.assertEqual(capture.num_samples, 0)
+            self.assertEqual(list(capture.read_rows(('STB',))), [])
+
+    def test_convert_raises_for_timestamps_out_of_order(self):
+        filename = self._write_csv(['0.000002000000000, 0, 0, 0',
+                                    '0.000001000000000, 1, 1, 1'])
+        with self.assertRaises(ValueError):
+            self._convert(filename)
+
+    def test_convert_raises_for_sample_not_0_or_1(self):
+        filename = self._write_csv(['0.000000000000000, 0, 2, 0'])
+        with self.assertRaises(ValueError):
+            self._convert(filename)
+
+    def test_raises_for_file_that_is_not_binary_capture(self):
+        filename = os.path.join(self.tempdir, 'bad.vwcap')
+        for data in (b'', b'x' * 100):
+            with open(filename, 'wb') as f:
+                f.write(data)
+            with self.assertRaises(ValueError):
+                captures.BinaryCapture(filename)
+
+    def test_raises_for_truncated_binary_capture(self):
+        filename = self._convert(
+            self._write_csv(['0.000000000000000, 0, 0, 0']))
+        with open(filename, 'rb') as f:
+            data = f.read()
+        with open(filename, 'wb') as f:
+            f.write(data[:-1])
+        with self.assertRaises(ValueError):
+            captures.BinaryCapture(filename)
@@ -0,0 +1,32 @@
+import unittest
+from vwradio.constants import (
+    DisplayModes,
+    Enum,
+    Keys,
+    OperationModes,
+    Pictographs,
+    TunerBands,
+    )
+
+class TestEnum(unittest.TestCase):
+    def test_get_name_returns_name_of_every_value(self):
+        for klass in (OperationModes, DisplayModes, TunerBands, Keys,
+                      Pictographs):
+            for name, value in klass.__dict__.items():
+                if not name.startswith('_') and isinstance(value, int):
+                    self.assertEqual(klass.get_name(value), name)
+
+    def test_get_name_returns_none_for_unknown_value(self):
+        self.assertEqual(Keys.get_name(255), None)
+        self.assertEqual(Keys.get_name('PRESET_1'), None)
+
+    def test_get_name_looks_only_in_its_own_class(self):
+        self.assertEqual(TunerBands.get_name(TunerBands.AM), 'AM')
+        self.assertEqual(TunerBands.get_name(Keys.POWER), None)
+
+    def test_get_name_works_for_new_subclass(self):
+        class Colors(Enum):
+            RED = 1
+            GREEN = 2
+        self.assertEqual(Colors.get_name(2), 'GREEN')
+        self.assertEqual(Enum.get_name(2), None)
@@ -1,7 +1,16 @@
+import contextlib
+import gzip
 import itertools
+import os
+import random
+import shutil
+import tempfile
 import unittest
 from io import StringIO
-from vwradio.decode import Upd16432b
+from vwradio import captures
+from vwradio import decode
+from vwradio.decode import Upd16432b, Visualizer
+from vwradio.faceplates import Premium4
 
 class TestUpd16432b(unittest.TestCase):
     def test_ctor_initializes_ram_areas(self):
@@ -27,6 +36,34 @@ class TestUpd16432b(unittest.TestCase):
         emu = Upd16432b(stdout=StringIO())
         emu.process([]) # should not raise
 
+    def test_process_prints_trace_if_verbose(self):
+        stdout = StringIO()
+        emu = Upd16432b(stdout=stdout)
+        emu.process([0b01000000]) # data setting command
+        self.assertTrue("Data Setting Command" in stdout.getvalue())
+
+    def test_process_prints_nothing_if_not_verbose(self):
+        stdout = StringIO()
+        emu = Upd16432b(stdout=stdout, verbose=False)
+        spi_commands = ([0b00000111], [0b01000000], [0b10000011, 0x41, 0x42],
+                        [0b11001111])
+        for spi_command in spi_commands:
+            emu.process(spi_command)
+        self.assertEqual(stdout.getvalue(), '')
+
+    def test_process_changes_same_state_if_not_verbose(self):
+        verbose_emu = Upd16432b(stdout=StringIO())
+        quiet_emu = Upd16432b(stdout=StringIO(), verbose=False)
+        spi_commands = ([0b00000111], [0b01000000], [0b10000011, 0x41, 0x42],
+                        [0b01001010], [0b10000001] + list(range(7)),
+                        [0b01000001], [0b10000111, 0xff], [0b11001111])
+        for spi_command in spi_commands:
+            verbose_emu.process(spi_command)
+            quiet_emu.process(spi_command)
+            self.assertEqual(quiet_emu.dump_ram(), verbose_emu.dump_ram())
+            self.assertEqual(quiet_emu.address, verbose_emu.address)
+            self.assertEqual(quiet_emu.increment, verbose_emu.increment)
+
     # Data Setting Command
 
     def test_upd_data_setting_sets_display_ram_area_increment_off(self):
@@ -328,3 +365,419 @@ class TestUpd16432b(unittest.TestCase):
         self.assertEqual(emu.address, 0) # wrapped around
         self.assertEqual(emu.led_ram, data)
 
+
+
+def _make_spi_rows(spi_commands):
+    '''Make (stb, dat, clk) analyzer rows as the radio would send commands'''
+    rows = [(0, 1, 1)]
+    for spi_command in spi_commands:
+        rows.append((1, 1, 1))
+        for byte in spi_command:
+            for bitnum in range(7, -1, -1):
+                dat = (byte >> bitnum) & 1
+                rows.append((1, dat, 0))
+                rows.append((1, dat, 1))
+        rows.append((0, 1, 1))
+    return rows
+
+
+class TestReadSpiCommands(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _write_capture(self, rows, basename='capture.csv.gz'):
+        '''Write (stb, dat, clk) rows in the logic analyzer's CSV format'''
+        filename = os.path.join(self.tempdir, basename)
+        opener = gzip.open if filename.endswith('.gz') else open
+        with opener(filename, 'wt') as f:
+            f.write('Time[s], STB, DAT, CLK, DAT (2), BUS\n')
+            for i, (stb, dat, clk) in enumerate(rows):
+                f.write('%.15f, %d, %d, %d, 0, 0\n' % (i * 1e-6, stb, dat, clk))
+        return filename
+
+    def test_loop_reads_spi_commands(self):
+        spi_commands = [bytearray([0x40]), bytearray([0x80, 0x41, 0xff]),
+                        bytearray()]
+        filename = self._write_capture(_make_spi_rows(spi_commands))
+        decoded = list(decode._read_spi_commands_loop(filename))
+        self.assertEqual(decoded, spi_commands)
+
+    def test_loop_reads_uncompressed_capture(self):
+        spi_commands = [bytearray([0xcf, 0x01])]
+        filename = self._write_capture(_make_spi_rows(spi_commands),
+                                       basename='capture.csv')
+        decoded = list(decode._read_spi_commands_loop(filename))
+        self.assertEqual(decoded, spi_commands)
+
+    def test_loop_discards_incomplete_byte(self):
+        rows = _make_spi_rows([bytearray([0x40])])
+        rows[-1:-1] = [(1, 1, 0), (1, 1, 1)] # one extra bit before STB off
+        filename = self._write_capture(rows)
+        decoded = list(decode._read_spi_commands_loop(filename))
+        self.assertEqual(decoded, [bytearray([0x40])])
+
+    def test_loop_ignores_session_not_ended_by_stb(self):
+        rows = _make_spi_rows([bytearray([0x40]), bytearray([0x41])])
+        filename = self._write_capture(rows[:-1])
+        decoded = list(decode._read_spi_commands_loop(filename))
+        self.assertEqual(decoded, [bytearray([0x40])])
+
+    @unittest.skipIf(decode.numpy is None, 'numpy not installed')
+    def test_numpy_matches_loop_for_spi_commands(self):
+        spi_commands = [bytearray([0x40]), bytearray([0x80, 0x41, 0xff]),
+                        bytearray(), bytearray(range(32))]
+        rows = _make_spi_rows(spi_commands)
+        rows[-1:-1] = [(1, 1, 0), (1, 1, 1)] # incomplete byte
+        filename = self._write_capture(rows)
+        loop = list(decode._read_spi_commands_loop(filename))
+        vectorized = list(decode._read_spi_commands_numpy(filename))
+        self.assertEqual(vectorized, loop)
+
+    @unittest.skipIf(decode.numpy is None, 'numpy not installed')
+    def test_numpy_matches_loop_for_random_samples(self):
+        rand = random.Random(16432)
+        for basename in ('random.csv.gz', 'random.csv'):
+            rows = []
+            stb = 0
+            for i in range(5000):
+                if rand.random() < 0.02:
+                    stb ^= 1
+                rows.append((stb, rand.randint(0, 1), rand.randint(0, 1)))
+            filename = self._write_capture(rows, basename=basename)
+            loop = list(decode._read_spi_commands_loop(filename))
+            vectorized = list(decode._read_spi_commands_numpy(filename))
+            self.assertTrue(len(loop) > 0)
+            self.assertEqual(vectorized, loop)
+
+    @unittest.skipIf(decode.numpy is None, 'numpy not installed')
+    def test_numpy_handles_edges_on_first_row(self):
+        rows = [(1, 1, 1)] + _make_spi_rows([bytearray([0x55])])[2:]
+        filename = self._write_capture(rows)
+        loop = list(decode._read_spi_commands_loop(filename))
+        vectorized = list(decode._read_spi_commands_numpy(filename))
+        self.assertEqual(vectorized, loop)
+
+    @unittest.skipIf(decode.numpy is None, 'numpy not installed')
+    def test_numpy_matches_loop_across_chunk_boundaries(self):
+        spi_commands = [bytearray([0x40]), bytearray([0x80, 0x41, 0xff]),
+                        bytearray(), bytearray([0xcf])]
+        filename = self._write_capture(_make_spi_rows(spi_commands))
+        loop = list(decode._read_spi_commands_loop(filename))
+        for chunk_size in (1, 2, 3, 7, 16, 1000):
+            vectorized = list(decode._read_spi_commands_numpy(
+                filename, chunk_size=chunk_size))
+            self.assertEqual(vectorized, loop)
+
+    def test_loop_reads_binary_capture(self):
+        spi_commands = [bytearray([0x40]), bytearray([0x80, 0x41, 0xff])]
+        csv_filename = self._write_capture(_make_spi_rows(spi_commands))
+        binary_filename = os.path.join(self.tempdir, 'capture.vwcap')
+        captures.convert(csv_filename, binary_filename)
+        decoded = list(decode._read_spi_commands_loop(binary_filename))
+        self.assertEqual(decoded, spi_commands)
+
+    @unittest.skipIf(decode.numpy is None, 'numpy not installed')
+    def test_numpy_reads_binary_capture(self):
+        spi_commands = [bytearray([0x40]), bytearray([0x80, 0x41, 0xff]),
+                        bytearray(), bytearray(range(32))]
+        csv_filename = self._write_capture(_make_spi_rows(spi_commands))
+        binary_filename = os.path.join(self.tempdir, 'capture.vwcap')
+        captures.convert(csv_filename, binary_filename)
+        for chunk_size in (1, 8, 9, 64, 0x10000):
+            decoded = list(decode._read_spi_commands_numpy(
+                binary_filename, chunk_size=chunk_size))
+            self.assertEqual(decoded, spi_commands)
+
+
+class TestParseAnalyzerDirectory(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _write_capture(self, filename, spi_commands):
+        rows = _make_spi_rows(spi_commands)
+        opener = gzip.open if filename.endswith('.gz') else open
+        with opener(filename, 'wt') as f:
+            f.write('Time[s], STB, DAT, CLK\n')
+            for i, (stb, dat, clk) in enumerate(rows):
+                f.write('%.15f, %d, %d, %d\n' % (i * 1e-6, stb, dat, clk))
+
+    def test_decodes_each_capture_to_its_own_output_file(self):
+        capdir = os.path.join(self.tempdir, 'captures')
+        outdir = os.path.join(self.tempdir, 'out')
+        os.makedirs(capdir)
+        spi_commands_by_name = {
+            'b.csv.gz': [bytearray([0x40]), bytearray([0x8c, 0x46, 0x4d])],
+            'a.csv.gz': [bytearray([0x40]), bytearray([0x8c, 0x41, 0x4d])],
+            }
+        for basename, spi_commands in spi_commands_by_name.items():
+            self._write_capture(os.path.join(capdir, basename), spi_commands)
+        with open(os.path.join(capdir, 'notes.txt'), 'w') as f:
+            f.write('not a capture')
+
+        outnames = decode.parse_analyzer_directory(
+            capdir, outdir, Premium4, processes=2)
+
+        self.assertEqual(outnames, [os.path.join(outdir, 'a.txt'),
+                                    os.path.join(outdir, 'b.txt')])
+        for basename, outname in zip(('a.csv.gz', 'b.csv.gz'), outnames):
+            expected = StringIO()
+            emulator = Upd16432b(stdout=expected)
+            visualizer = Visualizer(emulator, Premium4(), stdout=expected)
+            decode.parse_analyzer_file(os.path.join(capdir, basename),
+                                       emulator, visualizer, stdout=expected)
+            with open(outname, encoding='utf-8') as f:
+                self.assertEqual(f.read(), expected.getvalue())
+
+    def test_captures_with_the_same_name_keep_their_extensions(self):
+        capdir = os.path.join(self.tempdir, 'captures')
+        outdir = os.path.join(self.tempdir, 'out')
+        os.makedirs(capdir)
+        for basename in ('a.csv.gz', 'b.csv', 'b.csv.gz'):
+            self._write_capture(os.path.join(capdir, basename),
+                                [bytearray([0x40])])
+
+        outnames = decode.parse_analyzer_directory(
+            capdir, outdir, Premium4, processes=2)
+
+        self.assertEqual(outnames, [os.path.join(outdir, 'a.txt'),
+                                    os.path.join(outdir, 'b.csv.txt'),
+                                    os.path.join(outdir, 'b.csv.gz.txt')])
+        self.assertEqual(sorted(os.listdir(outdir)),
+                         ['a.txt', 'b.csv.gz.txt', 'b.csv.txt'])
+
+
+class TestSpiCommandCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.cachedir = os.path.join(self.tempdir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _write_file(self, basename, data):
+        filename = os.path.join(self.tempdir, basename)
+        with open(filename, 'wb') as f:
+            f.write(data)
+        return filename
+
+    def test_make_key_depends_only_on_contents(self):
+        cache = decode.SpiCommandCache(self.cachedir)
+        key_a = cache.make_key(self._write_file('a.csv', b'abc'))
+        key_b = cache.make_key(self._write_file('b.csv', b'abc'))
+        key_c = cache.make_key(self._write_file('c.csv', b'abd'))
+        self.assertEqual(key_a, key_b)
+        self.assertNotEqual(key_a, key_c)
+
+    def test_get_returns_none_if_not_cached(self):
+        cache = decode.SpiCommandCache(self.cachedir)
+        self.assertEqual(cache.get('missing'), None)
+
+    def test_put_then_get_returns_spi_commands(self):
+        cache = decode.SpiCommandCache(self.cachedir)
+        spi_commands = [bytearray([0x40]), bytearray(), bytearray(range(256))]
+        cache.put('key', spi_commands)
+        self.assertEqual(cache.get('key'), spi_commands)
+        self.assertEqual(cache.get('other'), None)
+
+    def test_put_evicts_least_recently_used(self):
+        cache = decode.SpiCommandCache(self.cachedir, max_size=250)
+        for i, key in enumerate(('a', 'b')):
+            cache.put(key, [bytearray(96)])
+            path = os.path.join(self.cachedir, key)
+            os.utime(path, (1000 + i, 1000 + i))
+        cache.put('c', [bytearray(96)])
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('b'), [bytearray(96)])
+        self.assertEqual(cache.get('c'), [bytearray(96)])
+
+    def test_read_spi_commands_fills_cache_then_uses_it(self):
+        spi_commands = [bytearray([0x40]), bytearray([0x80, 0x41, 0xff])]
+        rows = _make_spi_rows(spi_commands)
+        lines = [ '%.15f, %d, %d, %d' % ((i * 1e-6,) + row)
+                  for i, row in enumerate(rows) ]
+        filename = self._write_file('capture.csv',
+            ('Time[s], STB, DAT, CLK\n' + '\n'.join(lines)).encode('utf-8'))
+        cache = decode.SpiCommandCache(self.cachedir)
+        key = cache.make_key(filename)
+
+        decoded = list(decode.read_spi_commands(filename, cache))
+        self.assertEqual(decoded, spi_commands)
+        self.assertEqual(cache.get(key), spi_commands)
+
+        cache.put(key, [bytearray([0xcf])]) # prove the cache is used
+        decoded = list(decode.read_spi_commands(filename, cache))
+        self.assertEqual(decoded, [bytearray([0xcf])])
+
+    def test_filling_still_yields_if_cache_cannot_be_written(self):
+        notadir = self._write_file('notadir', b'')
+        cache = decode.SpiCommandCache(os.path.join(notadir, 'cache'))
+        spi_commands = [bytearray([1]), bytearray([2])]
+        stderr = StringIO()
+        with contextlib.redirect_stderr(stderr):
+            for i in range(2):
+                self.assertEqual(list(cache.filling('key', spi_commands)),
+                                 spi_commands)
+        self.assertEqual(stderr.getvalue().count('Not caching'), 1)
+        self.assertEqual(cache.get('key'), None)
+
+    def test_filling_caches_nothing_if_not_read_to_end(self):
+        cache = decode.SpiCommandCache(self.cachedir)
+        filling = cache.filling('key', [bytearray([1]), bytearray([2])])
+        next(filling)
+        filling.close()
+        self.assertEqual(cache.get('key'), None)
+        self.assertEqual(os.listdir(self.cachedir), [])
+
+    def test_filling_writes_each_command_as_it_is_read(self):
+        cache = decode.SpiCommandCache(self.cachedir)
+        filling = cache.filling('key', [bytearray([1]), bytearray([2])])
+        next(filling)
+        tmpname, = os.listdir(self.cachedir) # being written
+        self.assertTrue(tmpname.endswith('.tmp'))
+        self.assertEqual(list(filling), [bytearray([2])])
+        self.assertEqual(os.listdir(self.cachedir), ['key'])
+        self.assertEqual(cache.get('key'), [bytearray([1]), bytearray([2])])
+
+
+class TestUpd16432bDirtyFlags(unittest.TestCase):
+    def test_ctor_initializes_dirty_flags(self):
+        emu = Upd16432b(stdout=StringIO())
+        self.assertEqual(emu.dirty_flags, decode.UPD_DIRTY_NONE)
+
+    def test_writing_changed_data_sets_dirty_flag_for_ram_area(self):
+        modes_and_flags = (
+            (0b00000000, decode.UPD_DIRTY_DISPLAY),
+            (0b00000001, decode.UPD_DIRTY_PICTOGRAPH),
+            (0b00000010, decode.UPD_DIRTY_CHARGEN),
+            (0b00000011, decode.UPD_DIRTY_LED),
+            (0b00000100, decode.UPD_DIRTY_KEY_DATA),
+        )
+        for mode, flag in modes_and_flags:
+            emu = Upd16432b(stdout=StringIO())
+            emu.process([0b01000000 | mode]) # data setting command
+            emu.process([0b10000000, 0x41]) # address setting command, data
+            self.assertEqual(emu.dirty_flags, flag)
+
+    def test_writing_unchanged_data_does_not_set_dirty_flag(self):
+        emu = Upd16432b(stdout=StringIO())
+        emu.process([0b01000000]) # data setting command: display ram
+        emu.process([0b10000000, 0x00, 0x00]) # same as initial ram
+        self.assertEqual(emu.dirty_flags, decode.UPD_DIRTY_NONE)
+
+    def test_writing_no_ram_area_does_not_set_dirty_flag(self):
+        emu = Upd16432b(stdout=StringIO())
+        emu.process([0b01000111]) # data setting command: invalid ram area
+        emu.process([0b10000000, 0x41])
+        self.assertEqual(emu.dirty_flags, decode.UPD_DIRTY_NONE)
+
+
+class TestVisualizer(unittest.TestCase):
+    def _make(self, diff):
+        stdout = StringIO()
+        emu = Upd16432b(stdout=StringIO(), verbose=False)
+        visualizer = Visualizer(emu, Premium4(), stdout=stdout, diff=diff)
+        return emu, visualizer, stdout
+
+    def _write_display(self, emu, text):
+        emu.process([0b01000000]) # data setting command: display ram
+        codes = [ Premium4().char_code(c) for c in text ]
+        emu.process([0b10000010] + codes[::-1]) # address 2, reversed
+
+    def test_print_state_prints_everything_if_not_diff(self):
+        emu, visualizer, stdout = self._make(diff=False)
+        for i in range(2):
+            stdout.seek(0)
+            stdout.truncate()
+            self.assertTrue(visualizer.print_state())
+            output = stdout.getvalue()
+            for title in ('Key Data RAM:', 'Chargen RAM:', 'Pictograph RAM:',
+                          'Display RAM:', 'LED Output Latch:',
+                          'Drawn Chargen RAM:', 'Drawn Display RAM:',
+                          'Decoded Display RAM:', 'Decoded Pictographs:',
+                          'Decoded Keys Pressed:'):
+                self.assertTrue(title in output)
+
+    def test_print_state_diff_prints_everything_first(self):
+        emu, visualizer, stdout = self._make(diff=True)
+        self.assertTrue(visualizer.print_state())
+        self.assertTrue('Chargen RAM:' in stdout.getvalue())
+        self.assertTrue('Decoded Keys Pressed:' in stdout.getvalue())
+
+    def test_print_state_diff_prints_nothing_if_unchanged(self):
+        emu, visualizer, stdout = self._make(diff=True)
+        visualizer.print_state()
+        stdout.seek(0)
+        stdout.truncate()
+        emu.process([0b11001111]) # status command changes no ram
+        self.assertFalse(visualizer.print_state())
+        self.assertEqual(stdout.getvalue(), '')
+
+    def test_print_state_diff_prints_only_changed_ram_area(self):
+        emu, visualizer, stdout = self._make(diff=True)
+        visualizer.print_state()
+        stdout.seek(0)
+        stdout.truncate()
+        self._write_display(emu, 'FM1  891MHZ')
+        self.assertTrue(visualizer.print_state())
+        output = stdout.getvalue()
+        self.assertTrue('Display RAM:' in output)
+        self.assertTrue('Drawn Display RAM:' in output)
+        self.assertTrue("Decoded Display RAM: 'FM1  891MHZ'" in output)
+        self.assertFalse('Chargen RAM:' in output)
+        self.assertFalse('Pictograph' in output)
+        self.assertFalse('Key' in output)
+        self.assertEqual(emu.dirty_flags, decode.UPD_DIRTY_NONE)
+
+    def test_print_state_diff_skips_decoded_field_if_unchanged(self):
+        emu, visualizer, stdout = self._make(diff=True)
+        self._write_display(emu, 'FM1  891MHZ')
+        visualizer.print_state()
+        stdout.seek(0)
+        stdout.truncate()
+        emu.process([0b01000000]) # data setting command: display ram
+        emu.process([0b10000000, 0x41]) # address 0 is not visible
+        self.assertTrue(visualizer.print_state())
+        output = stdout.getvalue()
+        self.assertTrue('Display RAM:' in output)
+        self.assertFalse('Decoded Display RAM:' in output)
+
+    def test_print_state_diff_redraws_display_using_changed_chargen(self):
+        emu, visualizer, stdout = self._make(diff=True)
+        emu.process([0b01000000]) # data setting command: display ram
+        emu.process([0b10000010, 0x00]) # show chargen character 0
+        visualizer.print_state()
+        stdout.seek(0)
+        stdout.truncate()
+        emu.process([0b01000010]) # data setting command: chargen ram
+        emu.process([0b10000000] + [0x1f] * 7) # character 0
+        visualizer.print_state()
+        output = stdout.getvalue()
+        self.assertTrue('Drawn Chargen RAM:' in output)
+        self.assertTrue('Drawn Display RAM:' in output)
+
+    def test_draw_display_ram_draws_rom_characters(self):
+        emu, visualizer, stdout = self._make(diff=False)
+        self._write_display(emu, 'A')
+        lines = visualizer.draw_display_ram()
+        self.assertEqual(lines[0].split()[-1], '0x02:') # rightmost
+        glyph = [ line[-7:-2] for line in lines[1:] ]
+        self.assertEqual(glyph, [u'··▊··', u'·▊·▊·', u'▊···▊', u'▊···▊',
+                                 u'▊▊▊▊▊', u'▊···▊', u'▊···▊'])
+
+    def test_draw_chargen_ram_redraws_changed_characters(self):
+        emu, visualizer, stdout = self._make(diff=False)
+        blank = visualizer.draw_chargen_ram()
+        self.assertEqual(blank[1], u'·····  ' * 16)
+        emu.process([0b01000010]) # data setting command: chargen ram
+        emu.process([0b10000001] + [0x11] * 7) # character 1
+        lines = visualizer.draw_chargen_ram()
+        for line in lines[1:]:
+            self.assertEqual(line, u'·····  ' + u'▊···▊  ' + u'·····  ' * 14)
+        emu.process([0b10000001] + [0x00] * 7) # character 1
+        self.assertEqual(visualizer.draw_chargen_ram(), blank)
@@ -0,0 +1,100 @@
+import unittest
+from vwradio.constants import Keys
+from vwradio.faceplates import Premium4, Premium5
+
+class _TestFaceplateMixin():
+    def test_encode_keys_empty_list_encodes_no_keys(self):
+        self.assertEqual(self.faceplate.encode_keys([]), (0, 0, 0, 0))
+
+    def test_encode_keys_encodes_each_key_at_its_byte_and_bit(self):
+        for (bytenum, bitnum), key in self.faceplate.KEYS.items():
+            key_data = [0, 0, 0, 0]
+            key_data[bytenum] = 1 << bitnum
+            self.assertEqual(self.faceplate.encode_keys([key]),
+                             tuple(key_data))
+
+    def test_encode_keys_round_trips_through_decode_keys(self):
+        keys = [Keys.PRESET_1, Keys.MODE_FM]
+        key_data = self.faceplate.encode_keys(keys)
+        self.assertEqual(sorted(self.faceplate.decode_keys(key_data)),
+                         sorted(keys))
+
+    def test_encode_keys_raises_for_key_not_on_faceplate(self):
+        with self.assertRaises(ValueError):
+            self.faceplate.encode_keys([Keys.NONE])
+
+    def test_decode_keys_no_bits_set_decodes_no_keys(self):
+        self.assertEqual(self.faceplate.decode_keys([0, 0, 0, 0]), [])
+
+    def test_decode_keys_decodes_in_byte_and_bit_order(self):
+        key_data = [0xff, 0xff, 0xff, 0xff]
+        for (bytenum, bitnum) in self._unknown_byte_bits(self.faceplate.KEYS, 4):
+            key_data[bytenum] &= ~(1 << bitnum)
+        expected = [ self.faceplate.KEYS[byte_bit]
+                     for byte_bit in sorted(self.faceplate.KEYS) ]
+        self.assertEqual(self.faceplate.decode_keys(key_data), expected)
+
+    def test_decode_keys_raises_for_unknown_bit(self):
+        for (bytenum, bitnum) in self._unknown_byte_bits(self.faceplate.KEYS, 4):
+            key_data = [0xff, 0xff, 0xff, 0xff]
+            for byte_bit in self._unknown_byte_bits(self.faceplate.KEYS, 4):
+                if byte_bit < (bytenum, bitnum):
+                    key_data[byte_bit[0]] &= ~(1 << byte_bit[1])
+            with self.assertRaises(ValueError) as context:
+                self.faceplate.decode_keys(key_data)
+            self.assertEqual(str(context.exception),
+                'Unrecognized key at byte %d, bit %d' % (bytenum, bitnum))
+
+    def test_decode_keys_raises_for_bit_past_known_bytes(self):
+        with self.assertRaises(ValueError) as context:
+            self.faceplate.decode_keys([0, 0, 0, 0, 0x04])
+        self.assertEqual(str(context.exception),
+            'Unrecognized key at byte 4, bit 2')
+
+    def test_decode_pictographs_decodes_in_byte_and_bit_order(self):
+        pictographs = self.faceplate.PICTOGRAPHS
+        data = [0] * 8
+        for bytenum, bitnum in pictographs:
+            data[bytenum] |= 1 << bitnum
+        expected = [ pictographs[byte_bit] for byte_bit in sorted(pictographs) ]
+        self.assertEqual(self.faceplate.decode_pictographs(data), expected)
+
+    def test_decode_pictographs_raises_for_unknown_bit(self):
+        bytenum, bitnum = self._unknown_byte_bits(self.faceplate.PICTOGRAPHS,
+                                                  8)[0]
+        data = [0] * 8
+        data[bytenum] = 1 << bitnum
+        with self.assertRaises(ValueError) as context:
+            self.faceplate.decode_pictographs(data)
+        self.assertEqual(str(context.exception),
+            'Unrecognized pictograph at byte %d, bit %d' % (bytenum, bitnum))
+
+    def _unknown_byte_bits(self, byte_bits, num_bytes):
+        return [ (bytenum, bitnum) for bytenum in range(num_bytes)
+                 for bitnum in range(8) if (bytenum, bitnum) not in byte_bits ]
+
+    def test_char_code_returns_ascii_for_digits(self):
+        for char in '0123456789':
+            self.assertEqual(self.faceplate.char_code(char), ord(char))
+
+    def test_char_code_returns_first_code_for_character(self):
+        for char in set(self.faceplate.CHARACTERS.values()):
+            if char in '0123456789':
+                continue
+            expected = [ code for code, c in
+                         self.faceplate.CHARACTERS.items() if c == char ][0]
+            self.assertEqual(self.faceplate.char_code(char), expected)
+
+    def test_char_code_returns_ascii_for_unknown_character(self):
+        self.assertEqual(self.faceplate.char_code(u'\x01'), 1)
+
+
+class TestPremium4(unittest.TestCase, _TestFaceplateMixin):
+    faceplate = Premium4()
+
+    def test_char_code_space_is_first_blank(self):
+        self.assertEqual(self.faceplate.char_code(' '), 0x10)
+
+
+class TestPremium5(unittest.TestCase, _TestFaceplateMixin):
+    faceplate = Premium5()
@@ -6,8 +6,10 @@ import unittest
 from vwradio.constants import DisplayModes, OperationModes, TunerBands, Keys, Pictographs
 from vwradio.faceplates import Premium4
 from vwradio import avrclient
+from vwradio import avrsim
 
-# only test against real hardware when asked
+# only test against real hardware when asked.  HARDWARE_TEST=simulated
+# tests against a simulated AVR instead.
 if 'HARDWARE_TEST' in os.environ:
     BaseTestCase = unittest.TestCase
 else:
@@ -18,7 +20,12 @@ class TestAvr(BaseTestCase):
 
     def setUp(self):
         if getattr(self, 'serial') is None:
-            self.serial = avrclient.make_serial()
+            if os.environ.get('HARDWARE_TEST') == 'simulated':
+                # state persists between tests like a real AVR
+                TestAvr.serial = avrsim.SimulatedSerial()
+                self.serial = TestAvr.serial
+            else:
+                self.serial = avrclient.make_serial()
         self.client = avrclient.Client(self.serial)
         self.client.set_run_mode(avrclient.RUN_MODE_STOPPED)
 
@@ -2003,3 +2010,66 @@ class TestAvr(BaseTestCase):
             )
         self.assertEqual(rx_bytes[0], avrclient.ERROR_OK)
         self.assertEqual(len(rx_bytes), 1)
+
+    # Hit keys command
+
+    def test_hit_keys_returns_error_for_bad_args_length(self):
+        for bad_args in ([], [0, 0, 0, 0], [0, 0, 0, 0, 1] + [0] * 17):
+            rx_bytes = self.client.command(
+                data=bytearray([avrclient.CMD_HIT_KEYS] + bad_args),
+                ignore_error=True
+                )
+            self.assertEqual(rx_bytes[0], avrclient.ERROR_BAD_ARGS_LENGTH)
+            self.assertEqual(len(rx_bytes), 1)
+
+    def test_hit_keys_returns_error_if_key_passthru_enabled(self):
+        self.client.set_auto_key_passthru(True)
+        rx_bytes = self.client.command(
+            data=bytearray([avrclient.CMD_HIT_KEYS, 0, 0, 0, 0, 1]),
+            ignore_error=True
+            )
+        self.assertEqual(rx_bytes[0], avrclient.ERROR_BLOCKED_BY_PASSTHRU)
+        self.assertEqual(len(rx_bytes), 1)
+        self.client.set_auto_key_passthru(False)
+
+    def test_hit_keys_returns_error_for_bad_key_code(self):
+        self.client.set_auto_key_passthru(False)
+        rx_bytes = self.client.command(
+            data=bytearray([avrclient.CMD_HIT_KEYS, 0, 0, 0, 0, 1, 0xFF]),
+            ignore_error=True
+            )
+        self.assertEqual(rx_bytes[0], avrclient.ERROR_BAD_ARGS_VALUE)
+        self.assertEqual(len(rx_bytes), 1)
+
+    def test_hit_keys_returns_error_for_zero_repeat(self):
+        self.client.set_auto_key_passthru(False)
+        rx_bytes = self.client.command(
+            data=bytearray([avrclient.CMD_HIT_KEYS, 0, 0, 0, 0, 0,
+                            Keys.PRESET_1]),
+            ignore_error=True
+            )
+        self.assertEqual(rx_bytes[0], avrclient.ERROR_BAD_ARGS_VALUE)
+        self.assertEqual(len(rx_bytes), 1)
+
+    def test_hit_keys_is_busy_until_keys_released(self):
+        self.client.set_auto_key_passthru(False)
+        self.client.hit_keys([Keys.PRESET_1, Keys.PRESET_2],
+                             press_secs=0.05, release_secs=0.05, wait=False)
+        self.assertTrue(self.client.hit_keys_busy())
+        rx_bytes = self.client.command(
+            data=bytearray([avrclient.CMD_HIT_KEYS, 0, 0, 0, 0, 1,
+                            Keys.PRESET_1]),
+            ignore_error=True
+            )
+        self.assertEqual(rx_bytes[0], avrclient.ERROR_BUSY)
+        self.assertEqual(len(rx_bytes), 1)
+        time.sleep(0.25)
+        self.assertFalse(self.client.hit_keys_busy())
+
+    def test_hit_keys_waits_until_keys_released(self):
+        self.client.set_auto_key_passthru(False)
+        start = time.monotonic()
+        self.client.hit_keys([Keys.PRESET_1], press_secs=0.05,
+                             release_secs=0.05, repeat=2)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        self.assertFalse(self.client.hit_keys_busy())
@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from vwradio import avrclient
+from vwradio import keydiscovery
+from vwradio.tests.fakeradio import FakeRadioClient
+
+
+class ReactingRadioClient(FakeRadioClient):
+    '''Client for a fake radio that shows +reactions[key_data]+ while
+    that key data is held'''
+    BASELINE = 'FM11 891MHZ'
+
+    def __init__(self, reactions, fail_after=None):
+        FakeRadioClient.__init__(self)
+        self.set_auto_key_passthru(False)
+        self.reactions = reactions
+        self.fail_after = fail_after
+        self.tried = []
+        self.keys_hit = []
+
+    def hit_key(self, key, secs=0.15):
+        self.keys_hit.append(key)
+        self.show(self.BASELINE)
+
+    def emulated_upd_load_key_data(self, key_bytes):
+        avrclient.Client.emulated_upd_load_key_data(self, key_bytes)
+        key_data = tuple(key_bytes)
+        if key_data in self.reactions:
+            self.show(self.reactions[key_data])
+        elif any(key_data):
+            if len(self.tried) == self.fail_after:
+                raise Exception("Timeout")
+            self.tried.append(key_data)
+
+
+class BlinkingRadioClient(ReactingRadioClient):
+    '''Client for a radio whose display blinks every BLINK_SECS for as
+    long as any key data is held'''
+    BLINK_SECS = 0.1
+
+    def __init__(self):
+        ReactingRadioClient.__init__(self, {})
+        self.held = False
+        self.blink = None
+
+    def emulated_upd_load_key_data(self, key_bytes):
+        ReactingRadioClient.emulated_upd_load_key_data(self, key_bytes)
+        self.held = any(key_bytes)
+
+    def emulated_upd_read_display_changes(self):
+        blink = int(self.now / self.BLINK_SECS) % 2
+        if self.held and (blink != self.blink):
+            self.blink = blink
+            self.show('PRESET 1' if blink else '')
+        return ReactingRadioClient.emulated_upd_read_display_changes(self)
+
+
+class TestKeyDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.tmpdir, 'keys.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_discovery(self, client):
+        return keydiscovery.KeyDiscovery(client, self.checkpoint,
+                                         clock=client.clock,
+                                         sleep=client.sleep)
+
+    def test_single_bit_key_data(self):
+        key_datas = keydiscovery.single_bit_key_data()
+        self.assertEqual(len(key_datas), 32)
+        self.assertEqual(key_datas[0], (0, 0, 0, 1))
+        self.assertEqual(key_datas[31], (0x80, 0, 0, 0))
+
+    def test_shards_split_key_data(self):
+        key_datas = keydiscovery.single_bit_key_data()
+        shards = [ keydiscovery.shard(key_datas, i, 3) for i in range(3) ]
+        self.assertEqual(sorted(sum(shards, [])), sorted(key_datas))
+
+    def test_records_reactions_and_skips_hazards(self):
+        client = ReactingRadioClient({(0, 0, 0, 0x01): 'PRESET 1'})
+        reports = []
+        results = self.make_discovery(client).run(
+            [(0, 0, 0, 0x01), (0, 0, 0, 0x40), (0, 0, 0, 0x02)],
+            lambda key_data, result: reports.append((key_data, result)))
+        self.assertEqual(results['00000001'],
+                         {'down': 'PRESET 1   ', 'up': 'PRESET 1   '})
+        self.assertEqual(results['00000002'],
+                         {'down': 'FM11 891MHZ', 'up': 'FM11 891MHZ'})
+        self.assertNotIn('00000040', results)
+        self.assertEqual(reports[1], ((0, 0, 0, 0x40), {'skipped': 'initial'}))
+        # no reaction waits REACTION_TIMEOUT, a reaction waits much less
+        self.assertLess(client.now, 25)
+
+    def test_display_that_never_settles_is_recorded_as_unsettled(self):
+        client = BlinkingRadioClient()
+        discovery = self.make_discovery(client)
+        results = discovery.run([(0, 0, 0, 0x01)])
+        self.assertEqual(results['00000001']['unsettled'], True)
+        self.assertLess(client.now, 2 * discovery.REACTION_TIMEOUT)
+
+    def test_resets_only_after_a_reaction(self):
+        client = ReactingRadioClient({(0, 0, 0, 0x01): 'PRESET 1'})
+        self.make_discovery(client).run(
+            [(0, 0, 0, 0x01), (0, 0, 0, 0x02), (0, 0, 0, 0x04)])
+        self.assertEqual(len(client.keys_hit),
+                         2 * len(keydiscovery.RESET_KEYS))
+
+    def test_resumes_from_checkpoint(self):
+        key_datas = keydiscovery.single_bit_key_data()[:4]
+        client = ReactingRadioClient({}, fail_after=2)
+        with self.assertRaises(Exception):
+            self.make_discovery(client).run(key_datas)
+
+        client = ReactingRadioClient({})
+        results = self.make_discovery(client).run(key_datas)
+        self.assertEqual(client.tried, key_datas[2:])
+        self.assertEqual(len(results), 4)
@@ -0,0 +1,162 @@
+import unittest
+
+from vwradio import keyseq
+from vwradio.constants import Keys, OperationModes, TunerBands
+
+
+class FakeState(object):
+    def __init__(self, operation_mode, tuner_band):
+        self.operation_mode = operation_mode
+        self.tuner_band = tuner_band
+
+
+class FakeClient(object):
+    '''A radio where MODE_FM switches between FM1 and FM2 and MODE_AM
+    selects AM.  Time only passes in sleep() and hit_keys().'''
+    def __init__(self):
+        self.now = 0.0
+        self.commands = []
+        self.state = FakeState(OperationModes.TUNER_PLAYING, TunerBands.FM1)
+        self.display_changed = False
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.now += secs
+
+    def hit_keys(self, key_codes, press_secs, release_secs, repeat):
+        self.commands.append((list(key_codes), repeat))
+        for key_code in key_codes:
+            for i in range(repeat):
+                self.now += press_secs + release_secs
+                if key_code == Keys.MODE_AM:
+                    self.state.tuner_band = TunerBands.AM
+                elif key_code == Keys.MODE_FM:
+                    if self.state.tuner_band == TunerBands.FM1:
+                        self.state.tuner_band = TunerBands.FM2
+                    else:
+                        self.state.tuner_band = TunerBands.FM1
+                self.display_changed = True
+
+    def emulated_upd_read_display_changes(self):
+        changed, self.display_changed = self.display_changed, False
+        return (int(changed), None)
+
+    def radio_state_dump(self):
+        return self.state
+
+
+class TestParse(unittest.TestCase):
+    def test_parses_steps_and_prints_them_back(self):
+        text = '''
+            # select fm2
+            hit MODE_AM
+            hit MODE_FM x2 press 0.1
+            hit TUNE_UP press 3
+            sleep 0.5
+            wait tuner_band == FM2 timeout 2 # comment
+            wait tuner_freq >= 1000
+            '''
+        steps = keyseq.parse(text)
+        self.assertEqual([ str(step) for step in steps ], [
+            'hit MODE_AM',
+            'hit MODE_FM x2 press 0.1',
+            'hit TUNE_UP press 3',
+            'sleep 0.5',
+            'wait tuner_band == FM2 timeout 2',
+            'wait tuner_freq >= 1000',
+            ])
+        self.assertEqual(steps[4].value, TunerBands.FM2)
+
+    def test_errors_name_the_line(self):
+        for text in ('hit NOT_A_KEY', 'wait tuner_band = FM2',
+                     'wait not_a_field == 1', 'wait tuner_band == FM3',
+                     'sleep', 'jump 1', 'hit SCAN x0', 'hit SCAN x256',
+                     'hit SCAN press 65.6', 'hit SCAN release -1'):
+            with self.assertRaises(keyseq.SequenceError) as cm:
+                keyseq.parse('hit MODE_FM\n' + text)
+            self.assertIn('Line 2', str(cm.exception))
+
+
+class TestCompile(unittest.TestCase):
+    def test_merges_hits_with_same_timing(self):
+        steps = keyseq.parse('''
+            hit PRESET_2 x3
+            hit PRESET_3 x3
+            hit PRESET_4 x3
+            hit TUNE_UP press 3
+            ''')
+        compiled = keyseq.compile_steps(steps)
+        self.assertEqual([ str(step) for step in compiled ],
+            ['hit PRESET_2 PRESET_3 PRESET_4 x3', 'hit TUNE_UP press 3'])
+        self.assertEqual(keyseq.num_commands(compiled), 2)
+
+    def test_expands_repeats_when_counts_differ(self):
+        steps = keyseq.parse('hit PRESET_2 x2\nhit PRESET_3')
+        compiled = keyseq.compile_steps(steps)
+        self.assertEqual(len(compiled), 1)
+        self.assertEqual(compiled[0].key_codes,
+            [Keys.PRESET_2, Keys.PRESET_2, Keys.PRESET_3])
+        self.assertEqual(compiled[0].repeat, 1)
+
+    def test_groups_keys_by_repeat_count(self):
+        steps = keyseq.parse('hit PRESET_1 x20\nhit PRESET_2 x10\n'
+                             'hit PRESET_3 x10\nhit PRESET_4 x30')
+        compiled = keyseq.compile_steps(steps)
+        self.assertEqual([ str(step) for step in compiled ],
+            ['hit PRESET_1 x20', 'hit PRESET_2 PRESET_3 x10',
+             'hit PRESET_4 x30'])
+
+    def test_never_needs_more_commands(self):
+        for text in ('hit PRESET_2 x200\nhit PRESET_3',
+                     'hit PRESET_1 x255\nhit PRESET_1 x255',
+                     'hit PRESET_1 PRESET_2\nhit PRESET_2 PRESET_3',
+                     'hit PRESET_1 x6\nhit PRESET_2 x3\nhit PRESET_3 x9',
+                     'hit MODE_FM\n' * 40):
+            steps = keyseq.parse(text)
+            compiled = keyseq.compile_steps(steps)
+            self.assertLessEqual(keyseq.num_commands(compiled),
+                                 keyseq.num_commands(steps))
+            self.assertEqual(
+                sum([ step.expanded_key_codes() for step in compiled ], []),
+                sum([ step.expanded_key_codes() for step in steps ], []))
+
+    def test_hits_are_left_alone_unless_merging_saves_commands(self):
+        steps = keyseq.parse('hit PRESET_2 x200\nhit PRESET_3')
+        self.assertEqual([ str(step) for step in keyseq.compile_steps(steps) ],
+                         ['hit PRESET_2 x200', 'hit PRESET_3'])
+
+    def test_waits_are_not_merged(self):
+        steps = keyseq.parse('hit MODE_FM\nwait tuner_band == FM2\n'
+                             'hit MODE_FM')
+        self.assertEqual(len(keyseq.compile_steps(steps)), 3)
+
+
+class TestPlayer(unittest.TestCase):
+    def test_plays_and_times_steps(self):
+        client = FakeClient()
+        player = keyseq.Player(client, clock=client.clock,
+                               sleep=client.sleep)
+        timings = player.play(keyseq.parse('''
+            hit MODE_AM
+            hit MODE_FM
+            wait tuner_band == FM1
+            hit MODE_FM
+            wait tuner_band == FM2
+            '''))
+        self.assertEqual(client.commands,
+            [([Keys.MODE_AM, Keys.MODE_FM], 1), ([Keys.MODE_FM], 1)])
+        self.assertEqual(len(timings), 4)
+        self.assertAlmostEqual(timings[0][1], 0.6)
+        self.assertIn('total, 2 CMD_HIT_KEYS commands',
+                      keyseq.format_timings(timings))
+
+    def test_wait_timeout_raises(self):
+        client = FakeClient()
+        player = keyseq.Player(client, clock=client.clock,
+                               sleep=client.sleep)
+        with self.assertRaises(keyseq.SequenceError) as cm:
+            player.play(keyseq.parse('wait tuner_band == AM timeout 1'))
+        self.assertIn('wait tuner_band == AM', str(cm.exception))
+        self.assertGreaterEqual(client.now, 1)
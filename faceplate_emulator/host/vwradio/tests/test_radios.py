@@ -1,5 +1,5 @@
 import unittest
-from vwradio.radios import Radio
+from vwradio.radios import Radio, ChangeEvent
 from vwradio.constants import OperationModes, DisplayModes, TunerBands
 
 class TestRadio(unittest.TestCase):
@@ -801,3 +801,121 @@ class TestRadio(unittest.TestCase):
             OperationModes.TUNER_PLAYING)
         self.assertEqual(radio.display_mode,
             DisplayModes.SHOWING_OPERATION)
+
+    def test_unrecognized_display_raises(self):
+        for display in (b"???????????", b"", b"X"):
+            radio = Radio()
+            with self.assertRaises(ValueError):
+                radio.parse(display)
+
+    def test_display_rules_name_existing_parse_methods(self):
+        from vwradio.radios import _DISPLAY_RULES
+        for pattern, handler in _DISPLAY_RULES:
+            if handler is not None:
+                self.assertTrue(callable(getattr(Radio, handler)))
+
+    def test_parse_cache_reapplies_values_equal_to_current_state(self):
+        radio = Radio()
+        radio.tuner_freq = 891
+        radio.parse(b"FM1  891MHZ")
+        radio.tuner_freq = 1035
+        radio.tuner_preset = 5
+        radio.parse(b"FM1  891MHZ") # cached
+        self.assertEqual(radio.tuner_freq, 891)
+        self.assertEqual(radio.tuner_preset, 0)
+        self.assertEqual(radio.tuner_band, TunerBands.FM1)
+
+    def test_parse_cache_accepts_bytearray_displays(self):
+        radio = Radio()
+        radio.parse(bytearray(b"FM1  891MHZ"))
+        self.assertEqual(radio.tuner_freq, 891)
+        radio.tuner_freq = 1035
+        radio.parse(bytearray(b"FM1  891MHZ")) # cached
+        self.assertEqual(radio.tuner_freq, 891)
+        self.assertEqual(list(radio._parse_cache), [b"FM1  891MHZ"])
+
+    def test_parse_cache_skips_displays_that_depend_on_state(self):
+        radio = Radio()
+        radio.tuner_band = TunerBands.FM2
+        radio.parse(b"SCAN 879MHZ")
+        self.assertNotIn(b"SCAN 879MHZ", radio._parse_cache)
+        radio.tuner_band = TunerBands.AM
+        radio.parse(b"SCAN 879MHZ")
+        self.assertEqual(radio.tuner_band, TunerBands.FM1)
+
+    def test_parse_cache_skips_unrecognized_displays(self):
+        radio = Radio()
+        with self.assertRaises(ValueError):
+            radio.parse(b"BAS  ?????")
+        self.assertEqual(radio.display_mode,
+            DisplayModes.ADJUSTING_SOUND_BASS)
+        self.assertEqual(len(radio._parse_cache), 0)
+
+    def test_parse_cache_evicts_least_recently_used(self):
+        radio = Radio(parse_cache_size=2)
+        radio.parse(b"TAPE PLAY A")
+        radio.parse(b"TAPE PLAY B")
+        radio.parse(b"TAPE PLAY A")
+        radio.parse(b"TAPE  FF   ")
+        self.assertEqual(list(radio._parse_cache),
+            [b"TAPE PLAY A", b"TAPE  FF   "])
+
+
+class TestRadioObservers(unittest.TestCase):
+    def test_sends_events_for_changed_attributes(self):
+        radio = Radio()
+        events = []
+        radio.add_observer(events.append)
+        radio.parse(b"FM1  891MHZ")
+        self.assertEqual(events, [
+            ChangeEvent('display_mode',
+                DisplayModes.UNKNOWN, DisplayModes.SHOWING_OPERATION),
+            ChangeEvent('tuner_freq', 0, 891),
+            ChangeEvent('operation_mode',
+                OperationModes.UNKNOWN, OperationModes.TUNER_PLAYING),
+            ChangeEvent('tuner_band', TunerBands.UNKNOWN, TunerBands.FM1),
+            ])
+
+    def test_sends_no_events_for_a_repeated_display(self):
+        radio = Radio()
+        radio.parse(b"FM1  891MHZ")
+        events = []
+        radio.add_observer(events.append)
+        radio.parse(b"FM1  891MHZ")
+        self.assertEqual(events, [])
+        radio.parse(b"FM1  893MHZ")
+        self.assertEqual(events, [ChangeEvent('tuner_freq', 891, 893)])
+
+    def test_sends_only_events_for_names(self):
+        radio = Radio()
+        events = []
+        radio.add_observer(events.append, names=['safe_code'])
+        radio.parse(b"1    1234  ")
+        self.assertEqual(events, [ChangeEvent('safe_code', 1000, 1234)])
+
+    def test_state_is_updated_before_events_are_sent(self):
+        radio = Radio()
+        seen = []
+        radio.add_observer(lambda event: seen.append(
+            (radio.operation_mode, radio.tuner_freq)))
+        radio.parse(b"AM   540KHZ")
+        self.assertTrue(seen)
+        for state in seen:
+            self.assertEqual(state, (OperationModes.TUNER_PLAYING, 540))
+
+    def test_remove_observer(self):
+        radio = Radio()
+        events = []
+        radio.add_observer(events.append)
+        radio.remove_observer(events.append)
+        radio.parse(b"FM1  891MHZ")
+        self.assertEqual(events, [])
+
+    def test_change_event_compares_only_to_change_events(self):
+        event = ChangeEvent('tuner_freq', 891, 893)
+        self.assertEqual(event, ChangeEvent('tuner_freq', 891, 893))
+        self.assertNotEqual(event, ChangeEvent('tuner_freq', 891, 895))
+        self.assertNotEqual(event, None)
+        self.assertNotEqual(event, 'tuner_freq')
+        with self.assertRaises(TypeError):
+            hash(event)
@@ -0,0 +1,96 @@
+import unittest
+
+from vwradio import safecode
+from vwradio.constants import Keys, OperationModes
+from vwradio.tests.fakeradio import FakeRadioClient
+
+
+class SafeRadioClient(FakeRadioClient):
+    '''Client for a fake Premium 4 radio in SAFE mode.  Keys hit on the
+    radio change the display it sends to the AVR.'''
+
+    def __init__(self, code, display_code=1000, missed_presses=0,
+                 locks_after=None):
+        FakeRadioClient.__init__(self)
+        self.code = code
+        self.display_code = display_code
+        self.missed_presses = missed_presses
+        self.locks_after = locks_after # digit presses until radio locks
+        self.keys_hit = []
+        self.hit_keys_calls = 0
+        self.show("     %04d  " % display_code)
+
+    def hit_key(self, key, secs=0.15, repeat=1):
+        self.hit_keys([key], secs, secs, repeat)
+
+    def hit_keys(self, key_codes, press_secs=0.15, release_secs=0.15,
+                 repeat=1, wait=True):
+        self.hit_keys_calls += 1
+        for key in key_codes:
+            for i in range(repeat):
+                self._hit(key, press_secs + release_secs)
+
+    def _hit(self, key, secs):
+        self.keys_hit.append(key)
+        self.now += secs
+        if key in safecode.DIGIT_KEYS:
+            if self.locks_after is not None:
+                if self.locks_after == 0:
+                    self.show("1    SAFE  ")
+                    return
+                self.locks_after -= 1
+            if self.missed_presses:
+                self.missed_presses -= 1
+                return
+            digits = [ int(c) for c in '%04d' % self.display_code ]
+            index = safecode.DIGIT_KEYS.index(key)
+            digits[index] = (digits[index] + 1) % 10
+            self.display_code = int(''.join(map(str, digits)))
+            self.show("     %04d  " % self.display_code)
+        elif key == Keys.TUNE_UP:
+            if self.display_code == self.code:
+                self.show("FM1  891MHZ")
+            else:
+                self.show("1    SAFE  ")
+
+
+class TestSafeCodeEntry(unittest.TestCase):
+    def make_entry(self, client):
+        return safecode.SafeCodeEntry(client, clock=client.clock,
+                                      sleep=client.sleep)
+
+    def test_presses_for_code(self):
+        self.assertEqual(safecode.presses_for_code(1000, 1611), [0, 6, 1, 1])
+        self.assertEqual(safecode.presses_for_code(1000, 623), [9, 6, 2, 3])
+
+    def test_unlocks_with_minimum_presses(self):
+        client = SafeRadioClient(code=1611)
+        state = self.make_entry(client).unlock(1611)
+        self.assertEqual(state.operation_mode, OperationModes.TUNER_PLAYING)
+        self.assertEqual(client.keys_hit,
+            [Keys.PRESET_2] * 6 + [Keys.PRESET_3, Keys.PRESET_4,
+                                   Keys.TUNE_UP])
+        self.assertEqual(client.hit_keys_calls, 2) # digits, then submit
+
+    def test_corrects_missed_presses(self):
+        client = SafeRadioClient(code=1611, missed_presses=2)
+        state = self.make_entry(client).unlock(1611)
+        self.assertEqual(state.operation_mode, OperationModes.TUNER_PLAYING)
+        self.assertEqual(len(client.keys_hit), 11)
+
+    def test_wrong_code_raises(self):
+        client = SafeRadioClient(code=1611)
+        with self.assertRaises(safecode.SafeCodeError):
+            self.make_entry(client).unlock(1234)
+
+    def test_leaving_safe_entry_while_correcting_raises(self):
+        client = SafeRadioClient(code=1611, locks_after=3)
+        with self.assertRaises(safecode.SafeCodeError) as cm:
+            self.make_entry(client).unlock(1611)
+        self.assertIn("left SAFE code entry", str(cm.exception))
+
+    def test_already_unlocked(self):
+        client = SafeRadioClient(code=1611)
+        client.show("FM1  891MHZ")
+        self.make_entry(client).unlock(1611)
+        self.assertEqual(client.keys_hit, [])
@@ -0,0 +1,148 @@
+import unittest
+
+from vwradio import tuning
+from vwradio.constants import Keys, OperationModes, TunerBands
+
+
+class FakeState(object):
+    def __init__(self, operation_mode, tuner_band, tuner_freq):
+        self.operation_mode = operation_mode
+        self.tuner_band = tuner_band
+        self.tuner_freq = tuner_freq
+
+
+class FakeRadio(object):
+    '''A client for a radio whose tuner steps at +rate+ steps per second
+    after a tune key has been held for +delay+ seconds, and keeps stepping
+    for +lag+ seconds after it is released.  Time only passes in sleep()
+    and on each round trip to the AVR.'''
+    ROUND_TRIP = 0.005
+
+    def __init__(self, band=TunerBands.FM1, freq=879, rate=20.0,
+                 delay=0.3, lag=0.12):
+        self.band = band
+        self.freq = freq
+        self.rate = rate
+        self.delay = delay
+        self.lag = lag
+        self.now = 0.0
+        self.round_trips = 0
+        self.key_presses = 0
+        self.hits = 0
+        self._held = None # (key, time pressed)
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.now += secs
+
+    def _round_trip(self):
+        self.round_trips += 1
+        self.now += self.ROUND_TRIP
+
+    def _step(self, key, count):
+        band = tuning.BANDS[self.band]
+        sign = 1 if key == Keys.TUNE_UP else -1
+        self.freq += sign * count * band.step
+        self.freq = min(max(self.freq, band.low), band.high)
+
+    def _steps_held(self, key_time, until):
+        return max(0, int((until - key_time - self.delay) * self.rate))
+
+    def radio_state_dump(self):
+        self._round_trip()
+        freq = self.freq
+        if self._held is not None:
+            key, key_time = self._held
+            self._step(key, self._steps_held(key_time, self.now))
+            freq, self.freq = self.freq, freq
+        return FakeState(OperationModes.TUNER_PLAYING, self.band, freq)
+
+    def load_keys(self, keys):
+        self._round_trip()
+        if keys:
+            self.key_presses += 1
+            self._held = (keys[0], self.now)
+        elif self._held is not None:
+            key, key_time = self._held
+            self._held = None
+            if self.now - key_time < self.delay:
+                self._step(key, 1)
+            else:
+                self._step(key, self._steps_held(key_time,
+                                                 self.now + self.lag))
+
+    def hit_key(self, key, repeat=1):
+        self.hits += 1
+        for i in range(repeat):
+            self._hit(key)
+
+    def _hit(self, key):
+        self._round_trip()
+        self._round_trip()
+        self.key_presses += 1
+        if key == Keys.MODE_AM:
+            self.band = TunerBands.AM
+            self.freq = 530
+        elif key == Keys.MODE_FM:
+            if self.band == TunerBands.FM1:
+                self.band = TunerBands.FM2
+            else:
+                self.band = TunerBands.FM1
+            self.freq = 879
+        else:
+            self._step(key, 1)
+
+
+class TestTuner(unittest.TestCase):
+    def make_tuner(self, radio):
+        return tuning.Tuner(radio, clock=radio.clock, sleep=radio.sleep)
+
+    def test_tunes_far_frequency_with_few_presses(self):
+        radio = FakeRadio()
+        state = self.make_tuner(radio).tune(TunerBands.FM1, 1053)
+        self.assertEqual(state.tuner_freq, 1053)
+        self.assertEqual(radio.freq, 1053)
+        self.assertLess(radio.key_presses, 6)
+
+    def test_learns_rate_and_lag(self):
+        radio = FakeRadio(rate=40.0, lag=0.2)
+        tuner = self.make_tuner(radio)
+        tuner.tune(TunerBands.FM1, 1053)
+        tuner.tune(TunerBands.FM1, 901)
+        presses = radio.key_presses
+        tuner.tune(TunerBands.FM1, 1031)
+        self.assertEqual(radio.freq, 1031)
+        self.assertLess(radio.key_presses - presses, 4)
+        self.assertAlmostEqual(tuner.rate, 40.0, delta=8.0)
+
+    def test_near_frequency_uses_single_presses(self):
+        radio = FakeRadio(freq=891)
+        self.make_tuner(radio).tune(TunerBands.FM1, 885)
+        self.assertEqual(radio.freq, 885)
+        self.assertEqual(radio.key_presses, 3)
+        self.assertEqual(radio.hits, 1)
+
+    def test_selects_am_and_fm2(self):
+        radio = FakeRadio()
+        tuner = self.make_tuner(radio)
+        state = tuner.tune(TunerBands.AM, 1010)
+        self.assertEqual((state.tuner_band, state.tuner_freq),
+                         (TunerBands.AM, 1010))
+        state = tuner.tune(TunerBands.FM2, 975)
+        self.assertEqual((state.tuner_band, state.tuner_freq),
+                         (TunerBands.FM2, 975))
+
+    def test_band_not_selected_raises(self):
+        radio = FakeRadio()
+        radio.hit_key = lambda key, repeat=1: None # radio ignores keys
+        with self.assertRaises(tuning.TuningError):
+            self.make_tuner(radio).tune(TunerBands.AM, 1010)
+
+    def test_rejects_frequency_not_in_band(self):
+        tuner = self.make_tuner(FakeRadio())
+        for band, freq in ((TunerBands.FM1, 880), (TunerBands.FM1, 1081),
+                           (TunerBands.AM, 535), (TunerBands.UNKNOWN, 891)):
+            with self.assertRaises(ValueError):
+                tuner.tune(band, freq)
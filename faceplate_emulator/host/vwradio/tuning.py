@@ -0,0 +1,163 @@
+'''Tunes the radio to a frequency by pressing its keys.
+
+Holding TUNE_UP or TUNE_DOWN makes the radio step through the band at a
+roughly constant rate, and it keeps stepping for a short time after the
+key is released.  Tuner learns both from the tuner_freq changes it sees
+and releases the key when the radio is predicted to stop on or just
+short of the frequency wanted.  Any remaining steps are made with single
+presses, sent to the AVR as one hit with a repeat count and checked with
+one dump of the radio state after the last press.  The model is kept between calls, so later tunes need fewer
+round trips.
+'''
+
+import time
+
+from vwradio.avrclient import HIT_KEYS_MAX_REPEAT
+from vwradio.constants import Keys, OperationModes, TunerBands
+
+
+class TuningError(Exception):
+    pass
+
+
+class Band(object):
+    '''Frequencies a tuner band can be tuned to, in the units of
+    RadioState.tuner_freq'''
+    def __init__(self, low, high, step):
+        self.low = low
+        self.high = high
+        self.step = step
+
+    def __contains__(self, freq):
+        return ((self.low <= freq <= self.high) and
+                ((freq - self.low) % self.step) == 0)
+
+
+FM_BAND = Band(879, 1079, 2) # 87.9-107.9 MHz
+AM_BAND = Band(530, 1710, 10) # 530-1710 kHz
+
+BANDS = {
+    TunerBands.FM1: FM_BAND,
+    TunerBands.FM2: FM_BAND,
+    TunerBands.AM: AM_BAND,
+    }
+
+# key that selects each band, pressed until the band is selected
+BAND_KEYS = {
+    TunerBands.FM1: Keys.MODE_FM,
+    TunerBands.FM2: Keys.MODE_FM,
+    TunerBands.AM: Keys.MODE_AM,
+    }
+
+
+class Tuner(object):
+    # holding the key is only worth it for more than this many steps
+    MIN_HOLD_STEPS = 3
+    # initial guesses until the radio has been observed
+    INITIAL_RATE = 10.0 # steps per second while a tune key is held
+    INITIAL_LAG = 0.1 # seconds the radio keeps stepping after release
+    # weight given to each new observation of the rate and lag
+    SMOOTHING = 0.5
+    # longest time between dumps of the radio state while holding a key
+    MAX_POLL_INTERVAL = 0.25 # seconds
+    MAX_BAND_PRESSES = 6
+
+    def __init__(self, client, clock=time.monotonic, sleep=time.sleep):
+        self.client = client
+        self.clock = clock
+        self.sleep = sleep
+        self.rate = self.INITIAL_RATE
+        self.lag = self.INITIAL_LAG
+
+    def tune(self, band, freq):
+        '''Select +band+ (TunerBands.*) and tune to +freq+.  Returns the
+        final RadioState.'''
+        if band not in BANDS:
+            raise ValueError("Band %r is not FM1, FM2, or AM" % band)
+        if freq not in BANDS[band]:
+            raise ValueError("Frequency %r is not in band %s" %
+                (freq, TunerBands.get_name(band)))
+
+        state = self.select_band(band)
+        step = BANDS[band].step
+        steps = (freq - state.tuner_freq) // step
+        if abs(steps) > self.MIN_HOLD_STEPS:
+            state = self._hold(steps, step, freq)
+        while state.tuner_freq != freq:
+            state = self._press((freq - state.tuner_freq) // step)
+        return state
+
+    def select_band(self, band):
+        '''Press the band's mode key until the radio is playing it'''
+        key = BAND_KEYS[band]
+        state = self.client.radio_state_dump()
+        presses = 0
+        while ((state.operation_mode != OperationModes.TUNER_PLAYING) or
+               (state.tuner_band != band)):
+            if presses == self.MAX_BAND_PRESSES:
+                raise TuningError("Band %s not selected after %d presses" %
+                    (TunerBands.get_name(band), presses))
+            self.client.hit_key(key)
+            presses += 1
+            state = self.client.radio_state_dump()
+        return state
+
+    def _hold(self, steps, step, freq):
+        '''Hold the tune key and release it so the radio should stop
+        at +freq+, which is +steps+ away.  Returns the state once the
+        radio has stopped.'''
+        direction = 1 if steps > 0 else -1
+        key = Keys.TUNE_UP if direction > 0 else Keys.TUNE_DOWN
+        start_freq = freq - (steps * step)
+        rate = self.rate
+
+        # the delay before the first step varies, so the rate is measured
+        # from the time the first step was seen
+        first_time = first_freq = None
+        self.client.load_keys([key])
+        while True:
+            state = self.client.radio_state_dump()
+            now = self.clock()
+            if first_freq is None:
+                if state.tuner_freq != start_freq:
+                    first_time, first_freq = now, state.tuner_freq
+            else:
+                moved = (state.tuner_freq - first_freq) // step * direction
+                if (moved > 0) and (now > first_time):
+                    rate = moved / (now - first_time)
+
+            remaining = (freq - state.tuner_freq) // step * direction
+            # release when the steps taken during the lag would reach freq
+            delay = (remaining / rate) - self.lag
+            if delay <= 0:
+                break
+            self.sleep(min(delay, self.MAX_POLL_INTERVAL))
+        self.client.load_keys([])
+        released_freq = state.tuner_freq
+        if rate != self.rate:
+            self._learn_rate(rate)
+
+        # wait until two dumps in a row agree, then learn how far it went
+        self.sleep(self.lag)
+        state = self.client.radio_state_dump()
+        while True:
+            self.sleep(1.0 / rate)
+            settled = self.client.radio_state_dump()
+            if settled.tuner_freq == state.tuner_freq:
+                break
+            state = settled
+        coasted = (state.tuner_freq - released_freq) // step * direction
+        self._learn_lag(max(coasted, 0) / rate)
+        return state
+
+    def _press(self, steps):
+        '''Press the tune key once per step, then dump the state'''
+        key = Keys.TUNE_UP if steps > 0 else Keys.TUNE_DOWN
+        self.client.hit_key(key, repeat=min(abs(steps), HIT_KEYS_MAX_REPEAT))
+        return self.client.radio_state_dump()
+
+    def _learn_rate(self, rate):
+        self.rate += (rate - self.rate) * self.SMOOTHING
+
+    def _learn_lag(self, lag):
+        self.lag += (lag - self.lag) * self.SMOOTHING